@@ -0,0 +1,223 @@
+import csv
+import io
+import random
+
+import const.constants as c
+
+# ------------------ MIME TYPES ------------------
+PDF = "application/pdf"
+DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV = "text/csv"
+FOLDER = "application/vnd.google-apps.folder"
+GOOGLE_DOC = "application/vnd.google-apps.document"
+GOOGLE_SHEET = "application/vnd.google-apps.spreadsheet"
+
+EXTENSIONS = {PDF: ".pdf", DOCX: ".docx", XLSX: ".xlsx", CSV: ".csv", GOOGLE_DOC: "", GOOGLE_SHEET: ""}
+
+WORDS = (
+    "bar manager bartender inventory stock weekly report permit license health "
+    "sales check target hand weeks price list beers seltzers policy id wristband "
+    "organization chart metrics finance turnover rate certificate liquor abc ein "
+    "metro letter occupancy marketing social media lead roles titles sop"
+).split()
+
+
+# ------------------ SYNTHETIC DOCUMENTS ------------------
+def make_text(rng, n_lines, keywords=()):
+    """Random lines of vocabulary words, with the keywords spread through the text"""
+    lines = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14))) for _ in range(n_lines)]
+    for i, kw in enumerate(keywords):
+        lines[(i * 7) % len(lines)] += f" {kw}"
+    return lines
+
+
+def make_pdf(lines, lines_per_page=45):
+    """
+    Minimal text-only PDF (Helvetica, one content stream per page).
+    Good enough for pdfplumber to extract text, no external dependency needed.
+    """
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    n_pages = len(pages)
+    # object ids: 1 catalog, 2 pages, 3 font, then (page, content) pairs
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    for p, page_lines in enumerate(pages):
+        page_id, content_id = 4 + 2 * p, 5 + 2 * p
+        kids.append(f"{page_id} 0 R")
+        ops = ["BT", "/F1 10 Tf", "12 TL", "40 800 Td"]
+        for line in page_lines:
+            safe = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(f"({safe.encode('latin-1', 'replace').decode('latin-1')}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode()
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {n_pages} >>".encode()
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = out.tell()
+        out.write(b"%d 0 obj\n" % obj_id + objects[obj_id] + b"\nendobj\n")
+    xref_at = out.tell()
+    size = max(objects) + 1
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+    for obj_id in range(1, size):
+        out.write(b"%010d 00000 n \n" % offsets[obj_id])
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref_at))
+    return out.getvalue()
+
+
+def make_docx(lines, n_tables=1, table_rows=10, table_cols=4):
+    from docx import Document
+
+    doc = Document()
+    for line in lines:
+        doc.add_paragraph(line)
+    for t in range(n_tables):
+        table = doc.add_table(rows=table_rows, cols=table_cols)
+        for r, row in enumerate(table.rows):
+            for col, cell in enumerate(row.cells):
+                cell.text = f"T{t} R{r} C{col}" if r else f"Header {col}"
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def make_rows(rng, n_rows, n_cols, keywords=()):
+    header = ["Item", "Sale per check", "Target Stock on Hand in Weeks", "Turnover"] + [
+        f"Col {i}" for i in range(4, n_cols)
+    ]
+    header = header[:n_cols]
+    rows = [header]
+    for r in range(n_rows):
+        row = [rng.choice(WORDS).title()] + [round(rng.uniform(0, 500), 2) for _ in range(n_cols - 1)]
+        rows.append(row)
+    for i, kw in enumerate(keywords):
+        rows[1 + (i * 3) % max(n_rows, 1)][0] = kw
+    return rows
+
+
+def make_xlsx(rows_by_sheet):
+    """rows_by_sheet: {sheet_name: [[header...], [row...], ...]}"""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for name, rows in rows_by_sheet.items():
+        ws = wb.create_sheet(title=name[:31])
+        for row in rows:
+            ws.append(row)
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def make_csv(rows, encoding="utf-8"):
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue().encode(encoding, errors="replace")
+
+
+# ------------------ CORPUS ------------------
+def _folder_for(entry_folder):
+    folder_id = c.FOLDER_IDS.get(entry_folder)
+    if not folder_id or folder_id == "to_configure":
+        return c.FALLBACK_DRIVES[0]
+    return folder_id
+
+
+def _file_record(file_id, name, mime, content, text, parent, modified):
+    return {
+        "id": file_id,
+        "name": name,
+        "mimeType": mime,
+        "modifiedTime": modified,
+        "size": str(len(content)),
+        "parents": [parent],
+        "content": content,
+        "text": text,
+    }
+
+
+def build_corpus(scale=1, seed=7, doc_lines=40, sheet_rows=200):
+    """
+    Build an in-memory corpus that mirrors c.prompt_map (so the sample prompts find
+    something) plus `scale` x 50 filler files of every type.
+    Returns (folders, files) as lists of Drive-like dicts; files carry `content` (bytes)
+    and `text` (used to answer fullText queries).
+    """
+    rng = random.Random(seed)
+    folders = []
+    files = []
+
+    # folder tree: every configured folder + fallback drives as roots
+    roots = list(dict.fromkeys(c.FALLBACK_DRIVES + [
+        v for v in c.FOLDER_IDS.values() if v != "to_configure"
+    ]))
+    for i, folder_id in enumerate(roots):
+        folders.append({
+            "id": folder_id,
+            "name": f"Folder {i}",
+            "mimeType": FOLDER,
+            "parents": [] if folder_id in c.FALLBACK_DRIVES else [c.FALLBACK_DRIVES[-1]],
+        })
+
+    mimes = [PDF, DOCX, XLSX, CSV]
+    native = [GOOGLE_DOC, GOOGLE_SHEET]
+    counter = 0
+
+    def add(name, mime, parent, keywords):
+        nonlocal counter
+        counter += 1
+        lines = make_text(rng, doc_lines, keywords)
+        exports = None
+        if mime == PDF:
+            content = make_pdf(lines)
+        elif mime == DOCX:
+            content = make_docx(lines)
+        elif mime == GOOGLE_DOC:
+            # native files have no binary content, only exports
+            content = b""
+            exports = {"text/plain": "\n".join(lines).encode("utf-8"), PDF: make_pdf(lines)}
+        else:
+            rows = make_rows(rng, sheet_rows, 6, keywords)
+            lines = [" ".join(str(v) for v in row) for row in rows]
+            if mime == GOOGLE_SHEET:
+                content = b""
+                exports = {CSV: make_csv(rows), PDF: make_pdf(lines[:200])}
+            else:
+                content = make_xlsx({"Sheet1": rows}) if mime == XLSX else make_csv(rows)
+        modified = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00.000Z"
+        record = _file_record(
+            f"fake{counter:06d}", name + EXTENSIONS[mime], mime, content,
+            "\n".join(lines), parent, modified,
+        )
+        if exports:
+            # Drive reports no size for native files
+            record.pop("size")
+            record["exports"] = exports
+        files.append(record)
+
+    # files that match the prompt map (one per MIME type)
+    for key, entry in c.prompt_map.items():
+        query = entry["query"]
+        terms = query if isinstance(query, list) else [t.strip() for t in query.split(" OR ")]
+        title = " ".join(t for t in terms if t and t != "*") or key.title()
+        parent = _folder_for(entry["folder"])
+        for mime in mimes:
+            add(title, mime, parent, terms)
+
+    # filler
+    for _ in range(50 * scale):
+        name = " ".join(rng.choice(WORDS).title() for _ in range(rng.randint(2, 5)))
+        add(name, rng.choice(mimes + native), rng.choice(roots), ())
+
+    return folders, files
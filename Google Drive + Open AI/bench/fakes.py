@@ -0,0 +1,316 @@
+import re
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import httplib2
+
+
+# ------------------ DRIVE QUERY EVALUATOR ------------------
+_TOKEN_RE = re.compile(r"\s*(?:('(?:\\.|[^'\\])*')|(!=|<=|>=|=|<|>)|([()])|([A-Za-z_]+))")
+_KEYWORDS = {"and", "or", "not", "in", "contains", "true", "false"}
+
+
+def _tokenize(q):
+    tokens = []
+    pos = 0
+    q = q.strip()
+    while pos < len(q):
+        m = _TOKEN_RE.match(q, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"Invalid Drive query near: {q[pos:pos + 30]!r}")
+        string, op, paren, word = m.groups()
+        if string is not None:
+            tokens.append(("str", re.sub(r"\\(.)", r"\1", string[1:-1])))
+        elif op:
+            tokens.append(("op", op))
+        elif paren:
+            tokens.append((paren, paren))
+        else:
+            keyword = word.lower()
+            tokens.append(("word", keyword if keyword in _KEYWORDS else word))
+        pos = m.end()
+    return tokens
+
+
+class _QueryParser:
+    """Recursive-descent parser for the subset of the Drive `q` syntax used by search_drive"""
+
+    def __init__(self, q):
+        self.tokens = _tokenize(q)
+        self.i = 0
+
+    def peek(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else (None, None)
+
+    def take(self):
+        tok = self.peek()
+        self.i += 1
+        return tok
+
+    def parse(self):
+        node = self.expr()
+        if self.i != len(self.tokens):
+            raise ValueError(f"Unexpected token {self.peek()[1]!r}")
+        return node
+
+    def expr(self):
+        node = self.term()
+        while self.peek() == ("word", "or"):
+            self.take()
+            node = ("or", node, self.term())
+        return node
+
+    def term(self):
+        node = self.factor()
+        while self.peek() == ("word", "and"):
+            self.take()
+            node = ("and", node, self.factor())
+        return node
+
+    def factor(self):
+        kind, value = self.peek()
+        if (kind, value) == ("word", "not"):
+            self.take()
+            return ("not", self.factor())
+        if kind == "(":
+            self.take()
+            node = self.expr()
+            if self.take()[0] != ")":
+                raise ValueError("Missing ')'")
+            return node
+        if kind == "str":
+            self.take()
+            if self.take() != ("word", "in"):
+                raise ValueError("Expected 'in'")
+            _, field = self.take()
+            return ("in", field, value)
+        if kind == "word":
+            self.take()
+            field = value
+            kind2, op = self.take()
+            if (kind2, op) == ("word", "contains"):
+                return ("contains", field, self.take()[1])
+            if kind2 != "op":
+                raise ValueError(f"Expected operator after {field!r}")
+            return ("cmp", field, op, self.take()[1])
+        raise ValueError(f"Unexpected token {value!r}")
+
+
+def _matches(node, f):
+    kind = node[0]
+    if kind == "and":
+        return _matches(node[1], f) and _matches(node[2], f)
+    if kind == "or":
+        return _matches(node[1], f) or _matches(node[2], f)
+    if kind == "not":
+        return not _matches(node[1], f)
+    if kind == "in":
+        return node[2] in f.get(node[1], [])
+    if kind == "contains":
+        field, value = node[1], node[2].lower()
+        haystack = f.get("text", "") if field == "fullText" else f.get(field, "")
+        return value in haystack.lower()
+    _, field, op, value = node
+    actual = f.get(field, False)
+    if field == "trashed":
+        actual = str(actual).lower()
+    return {
+        "=": actual == value, "!=": actual != value,
+        "<": actual < value, "<=": actual <= value,
+        ">": actual > value, ">=": actual >= value,
+    }[op]
+
+
+# ------------------ FAKE DRIVE SERVICE ------------------
+class _Execute:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self, num_retries=0):
+        return self._fn()
+
+
+class _FakeHttp:
+    """Serves ranged GETs the way MediaIoBaseDownload expects"""
+
+    def __init__(self, service, content, call="get_media"):
+        self.service = service
+        self.content = content
+        self.call = call
+
+    def request(self, uri, method="GET", headers=None, **kwargs):
+        content = self.content
+        start, end = 0, len(content) - 1
+        rng = (headers or {}).get("range")
+        if rng:
+            a, b = rng.split("=", 1)[1].split("-")
+            start, end = int(a), min(int(b), len(content) - 1)
+        chunk = content[start:end + 1]
+        self.service._sleep(self.service.latency, len(chunk), self.call)
+        status = 206 if rng else 200
+        resp = httplib2.Response({"status": status, "content-range": f"bytes {start}-{end}/{len(content)}"})
+        return resp, chunk
+
+
+class _FakeFiles:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, q="", fields=None, pageToken=None, pageSize=None, **kwargs):
+        return _Execute(lambda: self.service._list(q, pageToken, pageSize or self.service.page_size))
+
+    def get(self, fileId, fields=None, **kwargs):
+        return _Execute(lambda: self.service._get(fileId))
+
+    def get_media(self, fileId, **kwargs):
+        f = self.service._files.get(fileId)
+        if f is None:
+            raise KeyError(f"File not found: {fileId}")
+        if f["mimeType"].startswith("application/vnd.google-apps."):
+            raise ValueError(f"fileNotDownloadable: use export for {f['mimeType']}")
+        return SimpleNamespace(
+            uri=f"fake://drive/files/{fileId}?alt=media",
+            headers={},
+            http=_FakeHttp(self.service, f["content"]),
+        )
+
+    def export_media(self, fileId, mimeType, **kwargs):
+        f = self.service._files.get(fileId)
+        if f is None:
+            raise KeyError(f"File not found: {fileId}")
+        if mimeType not in f.get("exports", {}):
+            raise ValueError(f"Export to {mimeType} not supported for {f['mimeType']}")
+        return SimpleNamespace(
+            uri=f"fake://drive/files/{fileId}/export?mimeType={mimeType}",
+            headers={},
+            http=_FakeHttp(self.service, f["exports"][mimeType], call="export_media"),
+        )
+
+
+class _FakeChanges:
+    def __init__(self, service):
+        self.service = service
+
+    def getStartPageToken(self, **kwargs):
+        return _Execute(lambda: self.service._start_page_token())
+
+
+class FakeDriveService:
+    """
+    In-memory stand-in for build('drive', 'v3', ...): same files().list/get/get_media/export_media
+    call shapes, configurable latency per call and bandwidth (bytes/s).
+    Counts every call in `calls` and the time spent "on the network" in `network_time`.
+    """
+
+    META_FIELDS = ("id", "name", "mimeType", "modifiedTime", "size", "parents")
+
+    def __init__(self, files, folders=(), latency=0.0, bandwidth=None, page_size=100):
+        self._files = {f["id"]: f for f in list(folders) + list(files)}
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.page_size = page_size
+        self.calls = Counter()
+        self.network_time = Counter()
+        self._lock = threading.Lock()
+        self._change_token = 1
+
+    def files(self):
+        return _FakeFiles(self)
+
+    def changes(self):
+        return _FakeChanges(self)
+
+    def touch(self, file_id, **fields):
+        """Modify a file (e.g. a new name or modifiedTime); moves the change token like Drive does"""
+        self._files[file_id].update(fields)
+        with self._lock:
+            self._change_token += 1
+
+    def _start_page_token(self):
+        self._sleep(self.latency, 0, "changes.getStartPageToken")
+        return {"startPageToken": str(self._change_token)}
+
+    def _sleep(self, latency, n_bytes, call):
+        delay = latency + (n_bytes / self.bandwidth if self.bandwidth else 0.0)
+        if delay:
+            time.sleep(delay)
+        with self._lock:
+            self.calls[call] += 1
+            self.network_time[call] += delay
+
+    def _meta(self, f):
+        return {k: f[k] for k in self.META_FIELDS if k in f}
+
+    def _list(self, q, page_token, page_size):
+        self._sleep(self.latency, 0, "files.list")
+        tree = _QueryParser(q).parse() if q else None
+        hits = [f for f in self._files.values() if tree is None or _matches(tree, f)]
+        start = int(page_token or 0)
+        page = hits[start:start + page_size]
+        response = {"files": [self._meta(f) for f in page]}
+        if start + page_size < len(hits):
+            response["nextPageToken"] = str(start + page_size)
+        return response
+
+    def _get(self, file_id):
+        self._sleep(self.latency, 0, "files.get")
+        if file_id not in self._files:
+            raise KeyError(f"File not found: {file_id}")
+        return self._meta(self._files[file_id])
+
+
+# ------------------ FAKE OPENAI ------------------
+def estimate_tokens(text):
+    # ~4 chars per token is close enough for English prompts
+    return max(1, len(text) // 4)
+
+
+class FakeOpenAI:
+    """
+    Stub with the client.chat.completions.create(...) shape used in helpers/analyzer.py.
+    Latency = base latency + per-output-token delay.
+    """
+
+    def __init__(self, latency=0.0, per_token=0.0, answer_tokens=60):
+        self.latency = latency
+        self.per_token = per_token
+        self.answer_tokens = answer_tokens
+        self.calls = Counter()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, stream=False, **kwargs):
+        prompt = "\n".join(m.get("content", "") for m in messages)
+        prompt_tokens = estimate_tokens(prompt)
+        with self._lock:
+            self.calls[model] += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += self.answer_tokens
+        if stream:
+            return self._stream(model)
+        answer = " ".join(["ok"] * self.answer_tokens)
+        time.sleep(self.latency + self.per_token * self.answer_tokens)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=answer))],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=self.answer_tokens,
+                total_tokens=prompt_tokens + self.answer_tokens,
+            ),
+        )
+
+    def _stream(self, model):
+        """Chunks shaped like ChatCompletionChunk: latency before the first, per_token between"""
+        time.sleep(self.latency)
+        for i in range(self.answer_tokens):
+            if i:
+                time.sleep(self.per_token)
+            yield SimpleNamespace(
+                model=model,
+                choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content="ok "))],
+            )
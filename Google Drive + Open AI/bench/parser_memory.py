@@ -0,0 +1,353 @@
+"""
+Parser memory/throughput regression suite on large synthetic inputs, generated locally:
+a long PDF, a DOCX with many tables, tall and wide XLSX workbooks, CSVs in several
+encodings, and extract_snippet over the large spreadsheets.
+
+    python bench/parser_memory.py                      # compare with bench/parser_baseline.json
+    python bench/parser_memory.py --scale 4 --cases pdf_large xlsx_tall
+    python bench/parser_memory.py --update-baseline    # after an intended change
+
+Each case runs in its own process (so memory kept by earlier cases doesn't count) and
+reports peak Python allocations (tracemalloc, separate pass because it slows parsing),
+peak RSS above the process baseline (sampled; catches lxml/C allocations tracemalloc
+can't see) and throughput (MB/s and pages/s, tables/s or rows/s). It exits with status 1
+when a case's peak memory grows past the baseline by more than --tolerance
+(and throughput with --check-throughput, off by default as it depends on the machine).
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+# helpers.analyzer builds an OpenAI client at import time; no call is made here
+os.environ.setdefault("OPENAI_API_KEY", "offline-bench")
+
+import helpers.analyzer as analyzer  # noqa: E402
+from bench.corpus import CSV, XLSX, make_csv, make_docx, make_pdf, make_rows, make_text, make_xlsx  # noqa: E402
+
+RESULTS_DIR = os.path.join(PROJECT_DIR, "bench", "results")
+BASELINE_PATH = os.path.join(PROJECT_DIR, "bench", "parser_baseline.json")
+NEEDLE = "ZZ-NEEDLE-4471"
+
+# non-ASCII values typical of menus/inventory exports, so each encoding actually matters
+ACCENTED = ["Café de olla", "Jalapeño poppers", "Piña colada", "Crème brûlée", "Añejo tequila",
+            "Señorita spritz", "Rosé", "Smörgåsbord", "€5 happy hour", "Naïve IPA"]
+
+
+# ------------------ RSS ------------------
+def rss_bytes():
+    """Current resident set size, or None where it can't be read"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class RssSampler:
+    """Peak RSS while the block runs, sampled every interval seconds from a thread"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.baseline = None
+        self.peak = None
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        value = rss_bytes()
+        if value is not None:
+            self.peak = value if self.peak is None else max(self.peak, value)
+
+    def __enter__(self):
+        self.baseline = rss_bytes()
+        self.peak = self.baseline
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._sample()
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def delta(self):
+        if self.baseline is None or self.peak is None:
+            return None
+        return self.peak - self.baseline
+
+
+# ------------------ CASES ------------------
+def _sheet_rows(rng, n_rows, n_cols, needle=False):
+    rows = make_rows(rng, n_rows, n_cols)
+    if needle:
+        rows[-1][0] = NEEDLE
+    return rows
+
+
+def _accented_rows(rng, n_rows):
+    rows = [["Date", "Item", "Description", "Qty", "Price"]]
+    for i in range(n_rows):
+        rows.append([f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}", rng.choice(ACCENTED), rng.choice(ACCENTED) + " special",
+                     rng.randint(1, 40), round(rng.uniform(2, 90), 2)])
+    return rows
+
+
+def _pdf_input(rng, scale):
+    pages = 25 * scale
+    return make_pdf(make_text(rng, pages * 45)), {"pages": pages}
+
+
+def _docx_input(rng, scale):
+    tables = 150 * scale
+    return make_docx(make_text(rng, 200 * scale), n_tables=tables, table_rows=20, table_cols=6), {"tables": tables}
+
+
+def _xlsx_tall_input(rng, scale):
+    rows = 20_000 * scale
+    return make_xlsx({"Data": _sheet_rows(rng, rows, 8, needle=True)}), {"rows": rows}
+
+
+def _xlsx_wide_input(rng, scale):
+    rows = 500 * scale
+    return make_xlsx({"Wide": _sheet_rows(rng, rows, 300, needle=True)}), {"rows": rows}
+
+
+def _csv_input(encoding, base_rows=50_000):
+    def make(rng, scale):
+        rows = base_rows * scale
+        data = _accented_rows(rng, rows)
+        data[-1][1] = NEEDLE
+        return make_csv(data, encoding=encoding), {"rows": rows}
+    return make
+
+
+def _rows_ok(out, units):
+    n = len(out) if hasattr(out, "columns") else sum(len(t) for t in out.get("tablas", []))
+    return n == units["rows"]
+
+
+def _snippet(mime):
+    import main_v4_prompts as app
+
+    def run(raw):
+        return app.extract_snippet(io.BytesIO(raw), mime, NEEDLE)
+    return run
+
+
+def _parse_docx(raw):
+    return {"texto": analyzer.read_docx_from_bytes(raw), "tablas": analyzer.read_tables_from_docx(raw)}
+
+
+def _parse_quiet(raw):
+    return analyzer.parse_file_bytes(raw, verbose=False)
+
+
+# name → (make_input(rng, scale) → (raw, units), parse(raw) → output, check(output, units) → ok)
+CASES = {
+    "pdf_large": (_pdf_input, analyzer.read_pdf_from_bytes,
+                  lambda out, u: out["texto"].count("\n") >= u["pages"]),
+    "docx_tables": (_docx_input, _parse_docx, lambda out, u: len(out["tablas"]) == u["tables"]),
+    "xlsx_tall": (_xlsx_tall_input, analyzer.read_excel_from_bytes, _rows_ok),
+    "xlsx_wide": (_xlsx_wide_input, analyzer.read_excel_from_bytes, _rows_ok),
+    "csv_utf8": (_csv_input("utf-8"), _parse_quiet, _rows_ok),
+    "csv_utf8_bom": (_csv_input("utf-8-sig"), _parse_quiet, _rows_ok),
+    "csv_latin1": (_csv_input("latin-1"), _parse_quiet, _rows_ok),
+    "csv_cp1252": (_csv_input("cp1252"), _parse_quiet, _rows_ok),
+    "csv_utf16": (_csv_input("utf-16"), _parse_quiet, _rows_ok),
+    "snippet_xlsx_tall": (_xlsx_tall_input, _snippet(XLSX), lambda out, u: NEEDLE in out),
+    "snippet_csv": (_csv_input("utf-8", base_rows=20_000), _snippet(CSV), lambda out, u: NEEDLE in out),
+}
+
+
+def run_case(name, scale, repeat, seed):
+    """Runs one case in this process; returns its metrics"""
+    make_input, parse, check = CASES[name]
+    raw, units = make_input(random.Random(seed), scale)
+    unit, count = next(iter(units.items()))
+
+    # timing pass (best of `repeat`); RSS comes from the first run, while freed memory
+    # has not yet been kept around by the allocator
+    best, rss_delta, ok = None, None, True
+    for i in range(max(1, repeat)):
+        with RssSampler() as sampler:
+            start = time.perf_counter()
+            out = parse(raw)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        if i == 0:
+            rss_delta = sampler.delta
+        ok = ok and bool(check(out, units))
+        del out
+
+    # Python allocations pass
+    tracemalloc.start()
+    out = parse(raw)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del out
+
+    mb = len(raw) / 1024 / 1024
+    return {
+        "input_mb": round(mb, 2),
+        "units": unit,
+        "count": count,
+        "seconds": round(best, 4),
+        "mb_per_s": round(mb / best, 2) if best else None,
+        "units_per_s": round(count / best, 1) if best else None,
+        "tracemalloc_peak_mb": round(peak / 1024 / 1024, 2),
+        "rss_peak_delta_mb": round(rss_delta / 1024 / 1024, 2) if rss_delta is not None else None,
+        # peak Python allocations per MB of input: how far a host is from running out on bigger files
+        "memory_per_input_mb": round(peak / len(raw), 2),
+        "ok": ok,
+    }
+
+
+def run_isolated(name, args):
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", name, "--scale", str(args.scale),
+           "--repeat", str(args.repeat), "--seed", str(args.seed)]
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=PROJECT_DIR)
+    if proc.returncode != 0:
+        return {"error": (proc.stderr.strip().splitlines() or ["failed"])[-1]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+# ------------------ REPORTING ------------------
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def compare_to_baseline(report, baseline, tolerance, min_delta_mb=2.0, check_throughput=False):
+    """List of human-readable regressions vs a previous report of the same scale"""
+    if baseline.get("meta", {}).get("scale") != report["meta"]["scale"]:
+        return [f"baseline was recorded at scale {baseline.get('meta', {}).get('scale')}, "
+                f"this run is scale {report['meta']['scale']}"]
+    regressions = []
+    for name, current in report["cases"].items():
+        previous = baseline.get("cases", {}).get(name)
+        if not previous or "error" in previous:
+            continue
+        if "error" in current:
+            regressions.append(f"{name}: {current['error']}")
+            continue
+        if not current["ok"]:
+            regressions.append(f"{name}: parsed output is incomplete")
+        for key in ("tracemalloc_peak_mb", "rss_peak_delta_mb"):
+            old, new = previous.get(key), current.get(key)
+            if old is not None and new is not None and new > old * (1 + tolerance) and new - old > min_delta_mb:
+                regressions.append(f"{name} {key}: {old} → {new}")
+        if check_throughput:
+            old, new = previous.get("mb_per_s"), current.get("mb_per_s")
+            if old and new and new < old / (1 + tolerance):
+                regressions.append(f"{name} mb_per_s: {old} → {new}")
+    return regressions
+
+
+def print_report(report):
+    print(f"\n🧪 Parser memory (scale {report['meta']['scale']})")
+    print(f"   {'case':<20}{'in MB':>8}{'s':>9}{'MB/s':>8}{'units/s':>18}{'py peak MB':>12}"
+          f"{'RSS +MB':>9}{'x input':>9}")
+    for name, r in report["cases"].items():
+        if "error" in r:
+            print(f"   {name:<20}⚠️ {r['error']}")
+            continue
+        units = f"{r['units_per_s']} {r['units']}"
+        flag = "" if r["ok"] else "  ⚠️ incomplete output"
+        print(f"   {name:<20}{r['input_mb']:>8}{r['seconds']:>9}{r['mb_per_s']:>8}{units:>18}"
+              f"{r['tracemalloc_peak_mb']:>12}{r['rss_peak_delta_mb'] if r['rss_peak_delta_mb'] is not None else '-':>9}"
+              f"{r['memory_per_input_mb']:>9}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parser memory/throughput regression suite")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), help="default: all")
+    parser.add_argument("--scale", type=int, default=1, help="input size multiplier")
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per case (best is kept)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="output JSON path (default: bench/results/parsers_<time>_<commit>.json)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="stored baseline to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="write this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative growth")
+    parser.add_argument("--min-delta-mb", type=float, default=2.0, help="ignore growth smaller than this")
+    parser.add_argument("--check-throughput", action="store_true", help="also fail on MB/s drops")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_case(args.worker, args.scale, args.repeat, args.seed)))
+        return 0
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": args.scale,
+        },
+        "cases": {},
+    }
+    for name in args.cases or CASES:
+        print(f"⏱️ {name}...", flush=True)
+        report["cases"][name] = run_isolated(name, args)
+
+    print_report(report)
+
+    out = args.out
+    if not out:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"parsers_{datetime.now():%Y%m%d_%H%M%S}_{commit}.json")
+    with open(out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2, ensure_ascii=False)
+    print(f"\n💾 Results saved to {out}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, ensure_ascii=False)
+        print(f"📌 Baseline updated: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nℹ️ No baseline at {args.baseline}; run with --update-baseline to store one")
+        return 0
+    with open(args.baseline, encoding="utf-8") as fh:
+        regressions = compare_to_baseline(report, json.load(fh), args.tolerance, args.min_delta_mb,
+                                          args.check_throughput)
+    if regressions:
+        print("\n❌ Regressions vs baseline:")
+        for r in regressions:
+            print(f"   - {r}")
+        return 1
+    print("\n✅ No regressions vs baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""
+Offline end-to-end benchmark: runs the sample prompts (c.user_prompts) through the
+same search → rank → snippet → download/parse → LLM flow as interactive_cli, against
+an in-memory fake Drive and a stub OpenAI client.
+
+    python bench/run_bench.py --scales 1 10 --drive-latency 0.05 --llm-latency 0.5
+    python bench/run_bench.py --baseline bench/results/<previous>.json
+
+Results are written as JSON (per-stage p50/p95, call counts, peak memory) so runs can
+be compared between commits; --baseline exits with status 1 on regressions.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+# helpers.analyzer builds an OpenAI client at import time; the stub replaces it below
+os.environ.setdefault("OPENAI_API_KEY", "offline-bench")
+
+import const.constants as c  # noqa: E402
+import helpers.analyzer as analyzer  # noqa: E402
+import main_v4_prompts as app  # noqa: E402
+from bench.corpus import build_corpus, CSV, XLSX  # noqa: E402
+from bench.fakes import FakeDriveService, FakeOpenAI  # noqa: E402
+from helpers.doc_cache import DocumentCache  # noqa: E402
+
+SPREADSHEET_TYPES = {CSV, XLSX, "application/vnd.ms-excel"}
+RESULTS_DIR = os.path.join(PROJECT_DIR, "bench", "results")
+
+
+# ------------------ TIMING ------------------
+def percentile(values, pct):
+    """Nearest-rank percentile (values need not be sorted)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+
+class StageTimer:
+    def __init__(self, quiet=True):
+        self.samples = defaultdict(list)
+        self.quiet = quiet
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        out = io.StringIO() if self.quiet else sys.stdout
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(out):
+                yield
+        finally:
+            self.samples[name].append(time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self.samples[name].append(seconds)
+
+    def summary(self):
+        return {
+            name: {
+                "count": len(v),
+                "total_ms": round(sum(v) * 1000, 3),
+                "p50_ms": round(percentile(v, 50) * 1000, 3),
+                "p95_ms": round(percentile(v, 95) * 1000, 3),
+                "max_ms": round(max(v) * 1000, 3),
+            }
+            for name, v in sorted(self.samples.items())
+        }
+
+
+# ------------------ PROMPT FLOW ------------------
+def run_prompt(prompt, service, timer, snippets=3, analyze=True):
+    """One pass of the interactive_cli flow for a prompt. Returns a small result record."""
+    record = {"prompt": prompt, "results": 0, "error": None}
+    try:
+        with timer.stage("interpret"):
+            query, folder, mime_filter, options, mode = app.interpret_prompt(prompt)
+
+        if options.get("duplicates"):
+            with timer.stage("duplicates"):
+                files = []
+                for f_id in c.FALLBACK_DRIVES:
+                    files.extend(app.list_files_recursive(f_id))
+                groups = app.group_near_duplicates(files, threshold=85)
+            record["results"] = len(groups)
+            return record
+
+        with timer.stage("search"):
+            results = app.search_drive(query, folder, mime_filter, mode)
+        if "min_size" in options:
+            results = [f for f in results if int(f.get("size", 0)) >= options["min_size"]]
+        record["results"] = len(results)
+        if not results:
+            return record
+
+        with timer.stage("rank"):
+            ranked = app.rank_results(results, query)
+
+        for score, item in ranked[:snippets]:
+            if item["mimeType"] in SPREADSHEET_TYPES:
+                with timer.stage("snippet"):
+                    raw = analyzer.download_file_bytes(service, item["id"])
+                    app.extract_snippet(io.BytesIO(raw), item["mimeType"], query)
+
+        if not analyze:
+            return record
+
+        docs = []
+        for score, item in ranked[:2]:
+            net_before = sum(service.network_time.values())
+            start = time.perf_counter()
+            with timer.stage("fetch"):
+                docs.append(analyzer.download_file_as_dataframe(
+                    service, item["id"], mime_type=item["mimeType"], modified_time=item.get("modifiedTime")
+                ))
+            elapsed = time.perf_counter() - start
+            net = sum(service.network_time.values()) - net_before
+            timer.add("download", net)
+            timer.add("parse", max(0.0, elapsed - net))
+
+        with timer.stage("llm_analyze"):
+            analyzer.ask_llm_about_dataframe(docs[0], prompt)
+        if len(docs) == 2:
+            with timer.stage("llm_compare"):
+                analyzer.compare_two_dataframes(docs[0], docs[1], prompt)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def run_scale(scale, args):
+    folders, files = build_corpus(scale=scale, seed=args.seed, doc_lines=args.doc_lines,
+                                  sheet_rows=args.sheet_rows)
+    prompts = list(c.user_prompts) * args.repeat
+
+    def fresh_backends():
+        service = FakeDriveService(files, folders, latency=args.drive_latency, bandwidth=args.bandwidth)
+        llm = FakeOpenAI(latency=args.llm_latency, per_token=args.llm_per_token)
+        app.init_drive_service(service)
+        analyzer.client = llm
+        analyzer.router.reset()
+        analyzer.usage_tracker.reset()
+        # memory-only and empty per pass, so runs don't depend on earlier runs' disk cache
+        analyzer.document_cache = DocumentCache(cache_dir=None, version=analyzer.PARSER_VERSION)
+        return service, llm
+
+    # --- latency pass ---
+    service, llm = fresh_backends()
+    timer = StageTimer(quiet=not args.verbose)
+    wall_start = time.perf_counter()
+    records = [run_prompt(p, service, timer, args.snippets, not args.no_analyze) for p in prompts]
+    wall = time.perf_counter() - wall_start
+
+    result = {
+        "corpus": {"files": len(files), "bytes": sum(len(f["content"]) for f in files)},
+        "wall_s": round(wall, 3),
+        "stages": timer.summary(),
+        "calls": {
+            "drive": dict(service.calls),
+            "llm": dict(llm.calls),
+            "llm_prompt_tokens": llm.prompt_tokens,
+            "llm_completion_tokens": llm.completion_tokens,
+        },
+        "llm_routes": analyzer.router.report(),
+        "llm_usage": analyzer.usage_tracker.summary()["totals"],
+        "errors": [r for r in records if r["error"]],
+        "prompts": records[:len(c.user_prompts)],
+    }
+
+    # --- memory pass (tracemalloc distorts timings, so it runs separately) ---
+    if not args.no_memory:
+        service, llm = fresh_backends()
+        tracemalloc.start()
+        for p in c.user_prompts:
+            run_prompt(p, service, StageTimer(), args.snippets, not args.no_analyze)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["peak_memory_bytes"] = peak
+    return result
+
+
+# ------------------ REPORTING ------------------
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def compare_to_baseline(report, baseline, tolerance, min_delta_ms=5.0):
+    """List of human-readable regressions vs a previous report"""
+    regressions = []
+    for scale, current in report["scales"].items():
+        previous = baseline.get("scales", {}).get(scale)
+        if not previous:
+            continue
+        for stage, stats in current["stages"].items():
+            old = previous["stages"].get(stage)
+            if not old:
+                continue
+            for key in ("p50_ms", "p95_ms"):
+                if stats[key] > old[key] * (1 + tolerance) and stats[key] - old[key] > min_delta_ms:
+                    regressions.append(f"scale {scale} {stage} {key}: {old[key]} → {stats[key]}")
+        for kind in ("drive", "llm"):
+            for call, n in current["calls"][kind].items():
+                old_n = previous["calls"][kind].get(call, 0)
+                if n > old_n:
+                    regressions.append(f"scale {scale} {kind} calls {call}: {old_n} → {n}")
+        old_peak, peak = previous.get("peak_memory_bytes"), current.get("peak_memory_bytes")
+        if old_peak and peak and peak > old_peak * (1 + tolerance):
+            regressions.append(f"scale {scale} peak memory: {old_peak} → {peak} bytes")
+    return regressions
+
+
+def print_report(report):
+    for scale, res in report["scales"].items():
+        print(f"\n📊 Scale {scale}: {res['corpus']['files']} files, wall {res['wall_s']} s")
+        print(f"   {'stage':<14}{'n':>6}{'p50 ms':>12}{'p95 ms':>12}")
+        for stage, s in res["stages"].items():
+            print(f"   {stage:<14}{s['count']:>6}{s['p50_ms']:>12}{s['p95_ms']:>12}")
+        print(f"   Drive calls: {res['calls']['drive']}")
+        print(f"   LLM calls: {res['calls']['llm']} | prompt tokens: {res['calls']['llm_prompt_tokens']}")
+        if "peak_memory_bytes" in res:
+            print(f"   Peak memory: {res['peak_memory_bytes'] / 1024 / 1024:.2f} MB")
+        if res["errors"]:
+            print(f"   ⚠️ {len(res['errors'])} prompt(s) failed, first: {res['errors'][0]['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10],
+                        help="corpus sizes (x50 filler files each)")
+    parser.add_argument("--repeat", type=int, default=1, help="run the prompt list N times")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--doc-lines", type=int, default=40)
+    parser.add_argument("--sheet-rows", type=int, default=200)
+    parser.add_argument("--drive-latency", type=float, default=0.0, help="seconds per Drive call")
+    parser.add_argument("--bandwidth", type=float, default=None, help="download bytes/s")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per LLM call")
+    parser.add_argument("--llm-per-token", type=float, default=0.0, help="seconds per output token")
+    parser.add_argument("--snippets", type=int, default=3, help="snippets per search (as in the CLI)")
+    parser.add_argument("--no-analyze", action="store_true", help="skip download/parse/LLM stages")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--out", help="output JSON path (default: bench/results/<time>_<commit>.json)")
+    parser.add_argument("--baseline", help="previous result JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own prints")
+    args = parser.parse_args(argv)
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "args": vars(args),
+        },
+        "scales": {},
+    }
+    for scale in args.scales:
+        report["scales"][str(scale)] = run_scale(scale, args)
+
+    print_report(report)
+
+    out = args.out
+    if not out:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d_%H%M%S}_{commit}.json")
+    with open(out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2, ensure_ascii=False)
+    print(f"\n💾 Results saved to {out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            regressions = compare_to_baseline(report, json.load(fh), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\n❌ Regressions vs baseline:")
+            for r in regressions:
+                print(f"   - {r}")
+            return 1
+        print("\n✅ No regressions vs baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+Tokens per table in LLM prompts: the compact serializer (helpers/table_prompt.py) against
+the raw head().to_csv() it replaces, on tables shaped like the ones the parsers produce
+(pdfplumber tables full of None, DOCX tables, tall/wide workbooks, CSV exports, a
+weekly inventory report with repeated values, a query-plan result).
+
+    python bench/table_tokens.py
+    python bench/table_tokens.py --rows 30 --min-saving 0.3
+
+Rows shown per table follow the analyzer (50 for a table, 10 per table of a document).
+"summary" is the part of the compact text spent on min/max/mean over the whole table,
+information the truncated to_csv never carried; "w/o sum" is the saving without it.
+Tokens are counted with tiktoken (o200k_base, the gpt-4o encoding) when it is installed,
+otherwise with the ~4 chars/token estimate used elsewhere.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+# helpers.analyzer builds an OpenAI client at import time; no call is made here
+os.environ.setdefault("OPENAI_API_KEY", "offline-bench")
+
+import helpers.analyzer as analyzer  # noqa: E402
+import helpers.table_prompt as table_prompt  # noqa: E402
+from bench.corpus import make_csv, make_docx, make_rows, make_text, make_xlsx  # noqa: E402
+from bench.parser_memory import ACCENTED, git_commit  # noqa: E402
+
+RESULTS_DIR = os.path.join(PROJECT_DIR, "bench", "results")
+
+
+# ------------------ TABLES ------------------
+def _pdf_table(rng):
+    """pdfplumber-style: positional columns, header in the first row, None gaps, spacer columns, line breaks"""
+    rows = [["Permit\nNumber", None, "Type", None, "Issued", "Expires", None, "Fee"]]
+    for i in range(40):
+        rows.append([f"23-{28400 + i}", None, rng.choice(["Liquor", "Health", "Beer", "Fire"]), None,
+                     f"2024-{1 + i % 12:02d}-15", f"2025-{1 + i % 12:02d}-14", None, f"${rng.choice([150, 250, 400])}.00"])
+        if i % 9 == 0:
+            rows.append([None] * 8)  # empty row between sections
+    return pd.DataFrame(rows)
+
+
+def _docx_tables(rng):
+    raw = make_docx(make_text(rng, 20), n_tables=3, table_rows=25, table_cols=6)
+    return analyzer.read_tables_from_docx(raw)
+
+
+def _xlsx_sales(rng):
+    return analyzer.read_excel_from_bytes(make_xlsx({"Sales": make_rows(rng, 2000, 8)}))
+
+
+def _xlsx_wide(rng):
+    return analyzer.read_excel_from_bytes(make_xlsx({"Wide": make_rows(rng, 300, 60)}))
+
+
+def _csv_export(rng):
+    rows = [["Date", "Item", "Description", "Qty", "Price"]]
+    for i in range(5000):
+        rows.append([f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}", rng.choice(ACCENTED), rng.choice(ACCENTED) + " special",
+                     rng.randint(1, 40), round(rng.uniform(2, 90), 2)])
+    return analyzer.parse_file_bytes(make_csv(rows), verbose=False)
+
+
+def _inventory_report(rng):
+    """Weekly stock report: one store, weeks and categories repeated down the rows, a mostly empty notes column"""
+    rows = []
+    for week in pd.date_range("2025-05-19", periods=12, freq="7D"):
+        for category in ("Beer", "Wine", "Spirits", "Mixers"):
+            for item in range(8):
+                on_hand = rng.randint(0, 60)
+                rows.append({"Store": "Nashville", "Week": week, "Category": category, "Item": f"{category} {item + 1}",
+                             "On hand": on_hand, "Par": 24, "Unit cost": rng.uniform(0.8, 40),
+                             "Weeks on hand": on_hand / 12, "Notes": "recount" if rng.random() < 0.02 else None})
+    return pd.DataFrame(rows)
+
+
+def _plan_result(rng):
+    return pd.DataFrame({"Category": ["Beer", "Wine", "Spirits", "Mixers"],
+                         "sum_Sales": [rng.uniform(1e3, 1e5) for _ in range(4)],
+                         "count": [rng.randint(10, 500) for _ in range(4)]})
+
+
+# name → (make(rng) → DataFrame or list of DataFrames, rows shown)
+CASES = {
+    "pdf_permits": (_pdf_table, 10),
+    "docx_tables": (_docx_tables, 10),
+    "xlsx_sales": (_xlsx_sales, 50),
+    "xlsx_wide": (_xlsx_wide, 50),
+    "csv_export": (_csv_export, 50),
+    "inventory_report": (_inventory_report, 50),
+    "plan_result": (_plan_result, 50),
+}
+
+
+# ------------------ MEASURE ------------------
+def measure(df, n_rows):
+    csv_text = df.head(n_rows).to_csv(index=False)
+    layouts = table_prompt.table_layouts(df, n_rows)
+    tokens = {name: table_prompt.count_tokens(text) for name, text in layouts.items()}
+    chosen = min(tokens, key=tokens.get)
+    baseline = table_prompt.count_tokens(csv_text)
+    # the numeric summary adds information the head() never had: reported apart
+    prefix = table_prompt.SUMMARY_NOTE.split("{")[0]
+    summary = "".join(line for line in layouts[chosen].splitlines() if line.startswith(prefix))
+    summary_tokens = table_prompt.count_tokens(summary) if summary else 0
+    return {
+        "shape": list(df.shape),
+        "rows_shown": n_rows,
+        "csv_tokens": baseline,
+        "compact_tokens": tokens[chosen],
+        "summary_tokens": summary_tokens,
+        "layout": chosen,
+        "layouts": tokens,
+        "saving": round(1 - tokens[chosen] / baseline, 3) if baseline else 0.0,
+        "saving_without_summary": round(1 - (tokens[chosen] - summary_tokens) / baseline, 3) if baseline else 0.0,
+    }
+
+
+def run(rows=None, seed=7):
+    report = {}
+    for name, (make, n_rows) in CASES.items():
+        tables = make(random.Random(seed))
+        tables = tables if isinstance(tables, list) else [tables]
+        for i, df in enumerate(tables):
+            key = name if len(tables) == 1 else f"{name}[{i}]"
+            report[key] = measure(df, rows or n_rows)
+    return report
+
+
+def print_report(report, tokenizer):
+    print(f"\n🧮 Tokens per table ({tokenizer})")
+    print(f"   {'table':<18}{'shape':>12}{'rows':>6}{'to_csv':>9}{'compact':>9}{'saving':>8}"
+          f"{'summary':>9}{'w/o sum':>9}  layout")
+    for name, r in report.items():
+        shape = f"{r['shape'][0]}x{r['shape'][1]}"
+        print(f"   {name:<18}{shape:>12}{r['rows_shown']:>6}{r['csv_tokens']:>9}{r['compact_tokens']:>9}"
+              f"{r['saving']:>8.0%}{r['summary_tokens']:>9}{r['saving_without_summary']:>9.0%}  {r['layout']}")
+    csv_total = sum(r["csv_tokens"] for r in report.values())
+    compact_total = sum(r["compact_tokens"] for r in report.values())
+    summary_total = sum(r["summary_tokens"] for r in report.values())
+    print(f"   {'total':<36}{csv_total:>9}{compact_total:>9}{1 - compact_total / csv_total:>8.0%}{summary_total:>9}"
+          f"{1 - (compact_total - summary_total) / csv_total:>9.0%}")
+    return csv_total, compact_total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tokens per table: compact serializer vs to_csv")
+    parser.add_argument("--rows", type=int, help="rows shown per table (default: as in the analyzer)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="output JSON path (default: bench/results/tables_<time>_<commit>.json)")
+    parser.add_argument("--min-saving", type=float, default=0.0, help="fail if the total saving is below this")
+    args = parser.parse_args(argv)
+
+    tokenizer = "tiktoken o200k_base" if table_prompt._ENCODING is not None else "estimate, ~4 chars/token"
+    tables = run(args.rows, args.seed)
+    csv_total, compact_total = print_report(tables, tokenizer)
+    saving = 1 - compact_total / csv_total
+
+    commit = git_commit()
+    report = {
+        "meta": {"commit": commit, "timestamp": datetime.now().isoformat(timespec="seconds"),
+                 "python": platform.python_version(), "tokenizer": tokenizer, "seed": args.seed},
+        "totals": {"csv_tokens": csv_total, "compact_tokens": compact_total, "saving": round(saving, 3)},
+        "tables": tables,
+    }
+    out = args.out
+    if not out:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"tables_{datetime.now():%Y%m%d_%H%M%S}_{commit}.json")
+    with open(out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2, ensure_ascii=False)
+    print(f"\n💾 Results saved to {out}")
+
+    if saving < args.min_saving:
+        print(f"\n❌ Total saving {saving:.0%} is below {args.min_saving:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,5 @@
+import os
+
 FOLDER_IDS = {
     "SOP › 5- Roles & Titles": "1JVuwFsOTjLX2DtiRKHM5mKzeXpj8pIYl",         #OK
     "SOP › Policies / ID": "to_configure",
@@ -14,6 +16,95 @@ FALLBACK_DRIVES = [
     "17kUIyMg19PJ_E0Pewo9PZZeLw9z2pxPD"
 ]
 
+# Storage backends (see helpers/storage.py). FOLDER_IDS / FALLBACK_DRIVES values are Drive
+# folder ids or "<root>:<path inside it>" for one of these local directories,
+# e.g. LOCAL_ROOTS = {"nas": "/mnt/nas/SOP"} and "SOP › 5- Roles & Titles": "nas:5- Roles & Titles"
+LOCAL_ROOTS = {}
+LOCAL_WATCH = True  # change notifications via watchdog when installed, otherwise mtime scans
+LOCAL_FULLTEXT_MAX_BYTES = 5 * 1024 * 1024  # plain-text files searched by content up to this size
+DRIVE_ENABLED = True  # False = local roots only (offline, no OAuth)
+
+
+# OAuth (see helpers/auth.py): one token file for every entry point, wherever it is run from
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN_PATH = os.path.join(PROJECT_DIR, "token.json")
+CLIENT_SECRET_PATH = os.path.join(PROJECT_DIR, "client_secret.json")
+TOKEN_REFRESH_MARGIN = 300  # seconds before expiry
+
+# Background prefetch of the top search results (see helpers/prefetch.py)
+PREFETCH_TOP_K = 2
+PREFETCH_MAX_FILE_BYTES = 20 * 1024 * 1024
+PREFETCH_MAX_BYTES = 50 * 1024 * 1024
+PREFETCH_BANDWIDTH = None  # bytes/s per download, None = unlimited
+
+# Parsed-document cache (see helpers/doc_cache.py); set DOC_CACHE_DIR = None for memory only
+DOC_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "drive-deep-search", "documents")
+DOC_CACHE_MAX_MEMORY_BYTES = 256 * 1024 * 1024
+
+# Map-reduce analysis of documents larger than one prompt (see helpers/mapreduce.py)
+LLM_CHUNK_TOKENS = 3000
+LLM_MAP_WORKERS = 4
+LLM_MAX_CHUNKS = None  # None = every chunk (LLM_JOB_BUDGET bounds the cost); a cap is stated in the answer
+
+# Model routing (see helpers/llm_router.py); prices in USD per 1M tokens, only used for the report
+LLM_ROUTES = {
+    "fast": {"model": "gpt-4o-mini", "prices": {"input": 0.15, "cached_input": 0.075, "output": 0.60}},
+    "strong": {"model": "gpt-4o", "prices": {"input": 2.50, "cached_input": 1.25, "output": 10.00}},
+}
+LLM_TASK_ROUTES = {
+    "analyze": "fast",    # one file, preview-sized prompt
+    "map": "fast",        # one chunk of a long document
+    "reduce": "strong",   # combining partial answers over a long document
+    "compare": "strong",  # two documents
+    "plan": "strong",     # query plan from a table schema (small prompt, must be right)
+    "phrase": "fast",     # answer from a locally computed query result
+}
+LLM_LONG_CONTEXT_TOKENS = 6000  # prompts above this go to LLM_LONG_CONTEXT_ROUTE
+LLM_LONG_CONTEXT_ROUTE = "strong"
+LLM_LATENCY_SAMPLES = 10000  # latencies kept per route for p50/p95 (bounded for the server)
+
+# Token/cost accounting and budgets (see helpers/usage.py); None = no limit
+LLM_SESSION_BUDGET = {"usd": None, "tokens": None}  # whole CLI/server process
+LLM_JOB_BUDGET = {"usd": 0.50, "tokens": None}  # one analyze/compare (map-reduce included)
+LLM_BUDGET_ACTION = "downgrade"  # "downgrade" to LLM_DOWNGRADE_ROUTE first, or "abort"
+LLM_DOWNGRADE_ROUTE = "fast"
+LLM_EXPECTED_COMPLETION_TOKENS = 500  # completion size assumed when checking a budget
+LLM_USAGE_EXPORT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "drive-deep-search", "llm_usage.json")
+
+# Query plans for tables (see helpers/query_plan.py): the LLM sees the schema, pandas runs the plan
+LLM_PLAN_MIN_ROWS = 50  # "auto" plans on tables longer than the 50-row preview
+LLM_PLAN_MAX_RESULT_ROWS = 50  # result rows sent back for the final answer
+
+# Tables in prompts (see helpers/table_prompt.py): compact layout instead of the raw head().to_csv()
+LLM_COMPACT_TABLES = True
+
+# Search/rank memo, invalidated by changes.getStartPageToken (see helpers/search_cache.py)
+SEARCH_CACHE_MAX_ITEMS = 256
+SEARCH_CACHE_POLL_SECONDS = 10
+SEARCH_CACHE_MAX_AGE = 3600
+SEARCH_CACHE_DRIVE_IDS = []  # shared drive ids whose changes should also invalidate
+
+# Multi-file jobs: download threads → parse processes → LLM calls (see helpers/pipeline.py)
+PIPELINE_DOWNLOAD_WORKERS = 8
+PIPELINE_PARSE_WORKERS = None  # None = one process per core
+PIPELINE_POOL_MIN_FILES = 8  # smaller jobs (e.g. compare) parse in threads, without starting processes
+PIPELINE_LLM_CONCURRENCY = 4
+PIPELINE_QUEUE_SIZE = 8
+
+# Content near-duplicates (see helpers/fingerprint.py)
+DUP_SIGNATURE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "drive-deep-search", "signatures.pkl")
+DUP_JACCARD_THRESHOLD = 0.8
+DUP_NUM_PERM = 128
+DUP_BANDS = 32
+DUP_SHINGLE_WORDS = 5
+DUP_MAX_FILE_BYTES = 20 * 1024 * 1024
+
+# Entity facet index: permits, amounts, dates, expirations (see helpers/facets.py)
+FACET_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".cache", "drive-deep-search", "facets.pkl")
+FACET_FOLDERS = FALLBACK_DRIVES
+FACET_EXPIRY_DAYS = 90  # "expiring soon"
+FACET_MAX_FILE_BYTES = 20 * 1024 * 1024
+
 
 prompt_map = {
         # === SOP › 5- Roles & Titles ===
@@ -151,4 +242,34 @@ prompt_map = {
             "query": "Duplicates",
             "folder": "All folders"
         }
-    }
\ No newline at end of file
+    }
+
+
+# Sample prompts used for manual checks (see main_v4_prompts.py) and by bench/run_bench.py
+user_prompts = [
+    "Open the bartender role description.",
+    "Find the Marketing / Social Media Lead responsibilities document.",
+    "Locate the bar manager SOP—even if ‘manager’ is misspelled.",
+    "Surface any SOP that mentions ‘checking IDs’.",
+    "Find documents with the heading ‘Proper Forms of ID Accepted’.",
+    "Open the Employee Organization Chart.",
+    "Pull the latest ABC Liquor License.",
+    "Open the Tennessee Reseller’s Certificate that expires 1-31-2025.",
+    "Locate our EIN letter/document.",
+    "Retrieve the ‘Metro liquor letter in lieu of certificate of occupancy’.",
+    "Do we have a current health permit image or PDF? Open it.",
+    "List every permit or license that expires in the next 90 days.",
+    "Open ‘Key Metrics to Track’.",
+    "Find the file that mentions ‘Bev-INCO rating’.",
+    "Locate the table where ‘Sale per check’ is set to $22.",
+    "Show all documents mentioning ‘inventory turnover rate’.",
+    "Open the Sculpture Hospitality weekly report for May 20–26, 2025.",
+    "Show files with the phrase ‘Target Stock on Hand in Weeks’.",
+    "Open the beverage price list image for beers and seltzers.",
+    "List the three most recent inventory or stock reports.",
+    "Show only Word docs (.docx) inside ‘5- Roles & Titles’.",
+    "Find any file larger than 0.5 MB in the permits directory.",
+    "Show duplicates or near-duplicates by title (e.g., ‘Key Metrics to Track’).",
+    "Show everything related to ID-checking policy, including attachments and images.",
+    "Locate any document that includes the permit numbers 23-28424 or 23-28425."
+]
@@ -1,42 +1,79 @@
 import io
-import os
+import json
+import threading
+import time
+from collections import deque
 import pandas as pd
 import zipfile
 import chardet
 import pdfplumber
-from googleapiclient.http import MediaIoBaseDownload
+from googleapiclient.http import DEFAULT_CHUNK_SIZE
 from docx import Document
 from openai import OpenAI
 
+import const.constants as c
+from helpers.diff import diff_any, format_delta
+from helpers.doc_cache import DocumentCache
+from helpers.excel import LazySheets, _header
+from helpers.llm_router import ModelRouter
+from helpers.mapreduce import ChunkCache, NO_INFO, document_tokens, estimate_tokens, map_reduce, split_document
+from helpers.query_plan import PlanError, describe_plan, execute_plan, parse_plan, schema_summary, validate_plan
+from helpers.storage import download_request
+from helpers.table_prompt import table_to_prompt
+from helpers.usage import BudgetExceeded, UsageTracker, token_counts
+
 # ------------------ OPENAI ------------------
 # 🔑 Inicializa OpenAI (usa tu API key)
 client = OpenAI()
 
 # ------------------ AUTHENTICATION ------------------
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 
-SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+from helpers.auth import get_credentials
 
-def get_credentials():
-    creds = None
-    if os.path.exists('../token.json'):
-        creds = Credentials.from_authorized_user_file('../token.json', SCOPES)
 
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file('../client_secret.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open('../token.json', 'w') as token:
-            token.write(creds.to_json())
-    return creds
+class ThreadLocalDriveService:
+    """
+    httplib2 (used by googleapiclient) is not thread-safe, so every thread
+    gets its own Drive client built once from the shared credentials
+    (helpers.auth refreshes them in the background for all clients).
+    """
+
+    def __init__(self, creds):
+        self.creds = creds
+        self._local = threading.local()
+
+    def _service(self):
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = build('drive', 'v3', credentials=self.creds, cache_discovery=False)
+            self._local.service = service
+        return service
+
+    def files(self):
+        return self._service().files()
+
+    def changes(self):
+        return self._service().changes()
+
+    def sheets_service(self):
+        service = getattr(self._local, "sheets", None)
+        if service is None:
+            service = build('sheets', 'v4', credentials=self.creds, cache_discovery=False)
+            self._local.sheets = service
+        return service
 
 
 # ------------------ PARSERS ------------------
+# Súbelo cuando cambie la lógica de extracción: invalida el caché de documentos parseados
+PARSER_VERSION = 2
+
+document_cache = DocumentCache(
+    cache_dir=c.DOC_CACHE_DIR,
+    max_memory_bytes=c.DOC_CACHE_MAX_MEMORY_BYTES,
+    version=PARSER_VERSION,
+)
+
 def read_docx_from_bytes(raw):
     """Lee todo el texto de un archivo DOCX"""
     doc = Document(io.BytesIO(raw))
@@ -68,32 +105,152 @@ def read_pdf_from_bytes(raw):
             # tablas
             for table in page.extract_tables():
                 tables.append(pd.DataFrame(table))
+            # pdfplumber guarda los objetos parseados de cada página: sin esto la memoria
+            # crece con el número de páginas (cientos de MB en PDFs largos)
+            page.close()
     return {
         "texto": "\n".join(text_content),
         "tablas": tables
     }
 
 
-def download_file_as_dataframe(service, file_id, mime_type="text/csv"):
+def read_excel_from_bytes(raw):
+    """
+    Lee un XLSX en modo read-only (filas en streaming, sin construir el workbook completo).
+    Una hoja → DataFrame; varias → {"tipo": "excel", "texto", "tablas": LazySheets, "hojas"}:
+    de cada hoja solo se leen nombre y dimensiones; sus filas se leen cuando un query plan,
+    el map-reduce o el diff las necesitan, y el prompt usa previews (ver _tables_preview)
+    """
+    hojas = LazySheets(raw)
+    if len(hojas) == 1:
+        return hojas[0]
+    return {
+        "tipo": "excel",
+        "texto": "Sheets: " + ", ".join(f"{name} ({hojas.rows(i)} rows, {hojas.columns(i)} columns)"
+                                        for i, name in enumerate(hojas.names)),
+        "tablas": hojas,
+        "hojas": list(hojas.names),
+    }
+
+
+def download_file_bytes(service, file_id, on_chunk=None, chunksize=DEFAULT_CHUNK_SIZE):
+    """
+    Descarga el contenido binario de un archivo de Drive (o de un backend de helpers.storage).
+    on_chunk(n_bytes) se llama después de cada chunk (p. ej. para cancelar o limitar ancho de banda).
+    """
+    if hasattr(service, "read_bytes"):
+        # helpers.storage (Drive o directorio local, según el id)
+        return service.read_bytes(file_id, on_chunk=on_chunk, chunksize=chunksize)
     request = service.files().get_media(fileId=file_id)
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
+    return download_request(request, on_chunk, chunksize)
+
+
+# ------------------ GOOGLE DOCS / SHEETS ------------------
+GOOGLE_DOC = "application/vnd.google-apps.document"
+GOOGLE_SHEET = "application/vnd.google-apps.spreadsheet"
+GOOGLE_SLIDES = "application/vnd.google-apps.presentation"
+
+# Los archivos nativos no admiten get_media: se exportan en el formato más barato
+# de procesar; PDF solo como último recurso
+EXPORT_FORMATS = {
+    GOOGLE_DOC: ["text/plain", "application/pdf"],
+    GOOGLE_SHEET: ["text/csv", "application/pdf"],
+    GOOGLE_SLIDES: ["text/plain", "application/pdf"],
+}
+
 
-    done = False
-    while not done:
-        status, done = downloader.next_chunk()
+def is_google_native(mime_type):
+    return bool(mime_type) and mime_type.startswith("application/vnd.google-apps.")
 
-    fh.seek(0)
-    raw = fh.read()
 
+def _sheets_service(service):
+    if hasattr(service, "sheets_service"):
+        return service.sheets_service()
+    # cliente de Drive normal: reutiliza su http autorizado
+    return build('sheets', 'v4', http=service._http, cache_discovery=False)
+
+
+def _values_to_dataframe(values):
+    if not values:
+        return pd.DataFrame()
+    width = max(len(row) for row in values)
+    rows = [row + [""] * (width - len(row)) for row in values]
+    # mismos nombres que un XLSX: vacías → "Unnamed: i", repetidas → "name.1"
+    return pd.DataFrame(rows[1:], columns=_header(rows[0]))
+
+
+def read_google_sheet(service, file_id):
+    """Todas las hojas de un Google Sheet como [(título, DataFrame)] con dos llamadas a la Sheets API"""
+    sheets = _sheets_service(service)
+    meta = sheets.spreadsheets().get(spreadsheetId=file_id, fields="sheets.properties.title").execute()
+    titles = [sh["properties"]["title"] for sh in meta.get("sheets", [])]
+    ranges = ["'" + t.replace("'", "''") + "'" for t in titles]
+    response = sheets.spreadsheets().values().batchGet(spreadsheetId=file_id, ranges=ranges).execute()
+    return [
+        (title, _values_to_dataframe(vr.get("values", [])))
+        for title, vr in zip(titles, response.get("valueRanges", []))
+    ]
+
+
+def export_file_bytes(service, file_id, export_mime, on_chunk=None, chunksize=DEFAULT_CHUNK_SIZE):
+    request = service.files().export_media(fileId=file_id, mimeType=export_mime)
+    return download_request(request, on_chunk, chunksize)
+
+
+def export_google_file(service, file_id, mime_type, on_chunk=None, chunksize=DEFAULT_CHUNK_SIZE, verbose=True):
+    """
+    Google Docs/Sheets/Slides → mismo formato que parse_file_bytes.
+    - Docs/Slides: text/plain → {"tipo": "gdoc", "texto", "tablas": []}
+    - Sheets: valores de cada hoja (Sheets API); si falla, CSV exportado (solo la primera hoja)
+    - Cualquier otro: PDF
+    """
+    # los nativos solo existen en Drive: con un helpers.storage se usa su cliente de Drive
+    service = getattr(service, "drive_service", None) or service
+    if mime_type == GOOGLE_SHEET:
+        try:
+            hojas = read_google_sheet(service, file_id)
+            if verbose:
+                print(f"📊 Detectado Google Sheet ({len(hojas)} hojas)")
+            if len(hojas) == 1:
+                return hojas[0][1]
+            return {
+                "tipo": "gsheet",
+                "texto": "Sheets: " + ", ".join(title for title, _ in hojas),
+                "tablas": [df for _, df in hojas],
+                "hojas": [title for title, _ in hojas],
+            }
+        except Exception as e:
+            if verbose:
+                print(f"⚠️ Sheets API no disponible ({e}); exportando como CSV")
+
+    last_error = None
+    for export_mime in EXPORT_FORMATS.get(mime_type, ["application/pdf"]):
+        try:
+            raw = export_file_bytes(service, file_id, export_mime, on_chunk, chunksize)
+        except Exception as e:
+            last_error = e
+            continue
+        if verbose:
+            print(f"📄 Archivo nativo de Google exportado como {export_mime}")
+        if export_mime == "text/plain":
+            return {"tipo": "gdoc", "texto": raw.decode("utf-8-sig", errors="replace"), "tablas": []}
+        return parse_file_bytes(raw, verbose=verbose)
+
+    raise ValueError(f"❌ No se pudo exportar el archivo nativo {mime_type}: {last_error}")
+
+
+def parse_file_bytes(raw, verbose=True):
+    """Detecta el tipo de archivo por contenido y lo convierte en DataFrame o dict {texto, tablas}"""
     # 🔎 Caso 1: ZIP (Excel o Word)
     if zipfile.is_zipfile(io.BytesIO(raw)):
         with zipfile.ZipFile(io.BytesIO(raw)) as z:
             if any(name.startswith("xl/") for name in z.namelist()):
-                print("📊 Detectado archivo Excel")
-                return pd.read_excel(io.BytesIO(raw))
+                if verbose:
+                    print("📊 Detectado archivo Excel")
+                return read_excel_from_bytes(raw)
             elif any(name.startswith("word/") for name in z.namelist()):
-                print("📄 Detectado archivo Word")
+                if verbose:
+                    print("📄 Detectado archivo Word")
                 texto = read_docx_from_bytes(raw)
                 tablas = read_tables_from_docx(raw)
                 return {"tipo": "word", "texto": texto, "tablas": tablas}
@@ -101,7 +258,8 @@ def download_file_as_dataframe(service, file_id, mime_type="text/csv"):
 
     # 🔎 Caso 2: PDF
     if raw[:4] == b"%PDF":
-        print("📑 Detectado archivo PDF")
+        if verbose:
+            print("📑 Detectado archivo PDF")
         return {"tipo": "pdf", **read_pdf_from_bytes(raw)}
 
     # 🔎 Caso 3: CSV
@@ -111,19 +269,360 @@ def download_file_as_dataframe(service, file_id, mime_type="text/csv"):
             fh2 = io.BytesIO(raw)
             return pd.read_csv(fh2, encoding=encoding_try, engine="python")
         except Exception as e:
-            print(f"⚠️ Error leyendo CSV con {encoding_try}: {e}")
+            if verbose:
+                print(f"⚠️ Error leyendo CSV con {encoding_try}: {e}")
 
     raise ValueError("❌ No se pudo leer el archivo ni como CSV, ni como Excel, ni como Word ni como PDF")
 
 
+def get_file_metadata(service, file_id):
+    if hasattr(service, "get_metadata"):
+        return service.get_metadata(file_id)
+    return service.files().get(
+        fileId=file_id, fields="id, mimeType, modifiedTime", supportsAllDrives=True
+    ).execute()
+
+
+def download_file_as_dataframe(service, file_id, mime_type=None, modified_time=None,
+                               on_chunk=None, chunksize=DEFAULT_CHUNK_SIZE, verbose=True):
+    """
+    Descarga y parsea un archivo, pasando por document_cache (clave: file_id + modifiedTime).
+    Si no se conocen mime_type/modified_time se piden a Drive (llamada de metadatos, mucho
+    más barata que la descarga). Los Google Docs/Sheets nativos se exportan (export_google_file).
+    """
+    if mime_type is None or modified_time is None:
+        meta = get_file_metadata(service, file_id)
+        mime_type = mime_type or meta.get("mimeType")
+        modified_time = modified_time or meta.get("modifiedTime")
+
+    doc = document_cache.get(file_id, modified_time)
+    if doc is not None:
+        return doc
+
+    if is_google_native(mime_type):
+        doc = export_google_file(service, file_id, mime_type, on_chunk=on_chunk, chunksize=chunksize, verbose=verbose)
+    else:
+        raw = download_file_bytes(service, file_id, on_chunk=on_chunk, chunksize=chunksize)
+        doc = parse_file_bytes(raw, verbose=verbose)
+    document_cache.put(file_id, modified_time, doc)
+    return doc
+
+
 # ------------------ OPENAI QUERIES ------------------
-def ask_llm_about_dataframe(df_or_doc, question, context_note="Single file analysis"):
+# modelo por tipo de tarea (rápido para preguntas simples, fuerte para comparaciones y contextos largos)
+router = ModelRouter(c.LLM_ROUTES, c.LLM_TASK_ROUTES, long_context_tokens=c.LLM_LONG_CONTEXT_TOKENS,
+                     long_context_route=c.LLM_LONG_CONTEXT_ROUTE, max_samples=c.LLM_LATENCY_SAMPLES)
+
+# tokens/costo por sesión, job y archivo, con presupuestos (ver helpers/usage.py)
+usage_tracker = UsageTracker(c.LLM_ROUTES, session_budget=c.LLM_SESSION_BUDGET, job_budget=c.LLM_JOB_BUDGET,
+                             action=c.LLM_BUDGET_ACTION, downgrade_route=c.LLM_DOWNGRADE_ROUTE,
+                             expected_completion_tokens=c.LLM_EXPECTED_COMPLETION_TOKENS)
+
+# tiempos de las respuestas en streaming (time-to-first-token, total); solo las últimas
+stream_timings = deque(maxlen=c.LLM_LATENCY_SAMPLES)
+_timings_lock = threading.Lock()
+
+# respuestas parciales por chunk (map-reduce); una pregunta repetida reutiliza los chunks sin cambios
+chunk_cache = ChunkCache()
+
+
+def _messages(instructions, content, question):
     """
-    Envía el contenido del archivo (DataFrame, DOCX o PDF) al LLM de OpenAI.
+    Orden pensado para el prompt caching de OpenAI (prefijo idéntico entre llamadas):
+    instrucciones fijas (system) → contenido del documento → pregunta al final.
+    Dos preguntas sobre el mismo documento comparten todo menos el último mensaje.
+    """
+    return [
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": content},
+        {"role": "user", "content": f"Question: {question}"},
+    ]
+
+
+def _prompt_tokens(messages):
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+
+def _route(task, messages):
+    """Ruta del router, ajustada por los presupuestos (puede bajar de modelo o lanzar BudgetExceeded)"""
+    return usage_tracker.admit(router.route(task, messages), _prompt_tokens(messages))
+
+
+def _record(route, task, start, messages, usage=None, answer="", ttft_s=None, error=False):
+    prompt, cached, completion = token_counts(usage, _prompt_tokens(messages), estimate_tokens(answer or ""))
+    if error and usage is None:
+        # the request failed before producing anything billable
+        prompt, completion = 0, 0
+    latency = time.perf_counter() - start
+    router.record(route, task, latency, prompt, completion, cached, ttft_s=ttft_s, error=error)
+    usage_tracker.record(route, task, latency, prompt, completion, cached, error=error)
+
+
+def _chat(messages, task="analyze"):
+    route = _route(task, messages)
+    start = time.perf_counter()
+    try:
+        response = client.chat.completions.create(
+            model=router.model(route),
+            messages=messages,
+            temperature=0.2
+        )
+    except Exception:
+        _record(route, task, start, messages, error=True)
+        raise
+    answer = response.choices[0].message.content
+    _record(route, task, start, messages, usage=getattr(response, "usage", None), answer=answer)
+    return answer
+
+
+def _chat_stream(messages, task="analyze"):
     """
+    Generador con los fragmentos de la respuesta según llegan.
+    Guarda time-to-first-token y duración total en stream_timings.
+    Cerrar el generador (p. ej. Ctrl-C en el CLI) cierra la conexión con OpenAI.
+    """
+    route = _route(task, messages)
+    model = router.model(route)
+    start = time.perf_counter()
+    timing = {"model": model, "route": route, "ttft_s": None, "total_s": None, "cancelled": True}
+    usage, pieces, error = None, [], False
+    try:
+        stream = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.2,
+            stream=True,
+            # el último chunk trae el uso de tokens (sin choices)
+            stream_options={"include_usage": True}
+        )
+    except Exception:
+        _record(route, task, start, messages, error=True)
+        raise
+    try:
+        for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
+            piece = chunk.choices[0].delta.content
+            if piece:
+                if timing["ttft_s"] is None:
+                    timing["ttft_s"] = time.perf_counter() - start
+                pieces.append(piece)
+                yield piece
+        timing["cancelled"] = False
+    except Exception:
+        error = True
+        raise
+    finally:
+        close = getattr(stream, "close", None)
+        if close:
+            close()
+        timing["total_s"] = time.perf_counter() - start
+        with _timings_lock:
+            stream_timings.append(timing)
+        # cancelled streams are billed for what was generated: count it with the estimate
+        _record(route, task, start, messages, usage=usage, answer="".join(pieces),
+                ttft_s=timing["ttft_s"], error=error)
+
+
+MAP_INSTRUCTIONS = f"""You are a data analysis assistant.
+You get one part of a document that was split to fit in the prompt, then a question about it.
+Answer using only this part. Quote exact values (names, numbers, dates) you rely on.
+If this part contains nothing relevant to the question, reply exactly: {NO_INFO}"""
+
+REDUCE_INSTRUCTIONS = """You are a data analysis assistant.
+A question was asked separately about each part of one document. You get the partial
+answers (parts without relevant information were omitted), then the question.
+Combine them into one final answer: merge duplicates, add up totals across parts
+when the question needs it and keep exact values. Answer clearly and concisely."""
+
+ANALYSIS_INSTRUCTIONS = """You are a data analysis assistant.
+You get the content of a document, then a question about it.
+Answer clearly and concisely, based only on the provided data."""
+
+COMPARE_INSTRUCTIONS = """You are a comparison assistant.
+You get two datasets/documents (A and B), or a local diff of their full contents, then a question.
+When a diff is given, anything not listed in it is identical in A and B.
+Provide a structured and concise answer."""
+
+
+def _map_chunk(chunk, question, index, total, context_note="Single file analysis"):
+    content = f"Context: {context_note}\nPart {index} of {total}:\n\n{chunk}"
+    return _chat(_messages(MAP_INSTRUCTIONS, content, question), task="map")
+
+
+def _reduce_partials(partials, question, stream=False):
+    messages = _messages(REDUCE_INSTRUCTIONS, f"Partial answers:\n\n{partials}", question)
+    return _chat_stream(messages, task="reduce") if stream else _chat(messages, task="reduce")
+
+
+def ask_llm_map_reduce(df_or_doc, question, context_note="Single file analysis", stream=False):
+    """
+    Modo map-reduce para documentos que no caben en un prompt: la pregunta se hace a
+    cada chunk en paralelo y las respuestas parciales se combinan en una llamada final.
+    Con stream=True la llamada final devuelve un generador (ver _chat_stream).
+    Se analizan todos los chunks (el costo lo acota el presupuesto por job); si
+    c.LLM_MAX_CHUNKS limita el número, la respuesta empieza avisando cuántos se analizaron.
+    """
+    chunks = split_document(df_or_doc, max_tokens=c.LLM_CHUNK_TOKENS)
+    caveat = None
+    if c.LLM_MAX_CHUNKS and len(chunks) > c.LLM_MAX_CHUNKS:
+        caveat = (f"⚠️ Only the first {c.LLM_MAX_CHUNKS} of {len(chunks)} parts of the document were analyzed; "
+                  f"the answer does not cover the rest.\n\n")
+        print(caveat.strip())
+        context_note = f"{context_note} (only parts 1-{c.LLM_MAX_CHUNKS} of {len(chunks)} were analyzed)"
+        chunks = chunks[:c.LLM_MAX_CHUNKS]
+    print(f"🧩 Map-reduce over {len(chunks)} chunk(s)")
+    map_model = router.model(router.task_routes.get("map", router.default_route))
+    job = usage_tracker.current_job()
+
+    # map y las rondas intermedias de reduce corren en otros hilos: se cuentan en el job de quien llamó
+    def map_fn(chunk, q, i, n):
+        with usage_tracker.bind(job):
+            return _map_chunk(chunk, q, i, n, context_note)
+
+    def reduce_fn(partials, q):
+        with usage_tracker.bind(job):
+            return _reduce_partials(partials, q)
+
+    answer = map_reduce(
+        chunks, question,
+        map_fn=map_fn,
+        reduce_fn=reduce_fn,
+        final_reduce_fn=(lambda partials, q: _reduce_partials(partials, q, stream=True)) if stream else None,
+        cache=chunk_cache,
+        cache_tag=f"{map_model}|{context_note}",
+        max_workers=c.LLM_MAP_WORKERS,
+        max_reduce_tokens=c.LLM_CHUNK_TOKENS,
+    )
+    if caveat is None:
+        return answer
+    if isinstance(answer, str):
+        return caveat + answer
+    return _prefixed(caveat, answer)
+
+
+def _prefixed(first, pieces):
+    yield first
+    yield from pieces
+
+
+PLAN_INSTRUCTIONS = """You are a data analysis assistant that writes query plans for tables.
+You get the schema of one or more tables (row count, and per column its type, null count and
+min/max/mean or most frequent values; never the rows), then a question.
+Reply with ONLY a JSON object, it is run locally with pandas over every row:
+{"table": name, "filters": [{"column": c, "op": op, "value": v}], "group_by": [columns],
+ "aggregations": [{"column": c, "func": f, "as": name}], "sort": [{"column": c, "desc": true}],
+ "limit": n, "select": [columns]}
+op: ==, !=, >, >=, <, <=, in, not_in (list value), between ([low, high], inclusive),
+    contains, startswith (case-insensitive text), isnull, notnull (no value)
+func: sum, mean, median, min, max, count (column "*" counts rows), nunique
+All keys are optional. Dates as "YYYY-MM-DD". When aggregating, sort by group_by columns or
+aggregation names; "select" only applies without aggregations.
+If filtering/aggregating the table can't answer the question, reply exactly: {"table": null}"""
+
+PHRASE_INSTRUCTIONS = """You are a data analysis assistant.
+A query plan was run locally over ALL rows of a table. You get the plan, how many rows it
+matched and its result, then the question. The result is exact: answer from it only, quote
+its values and don't guess about rows that are not shown. Answer clearly and concisely."""
+
+
+def _use_query_plan(df_or_doc, mode):
+    if mode == "plan":
+        return True
+    # solo tablas que no caben en la muestra del preview (head(50))
+    if mode != "auto":
+        return False
+    if isinstance(df_or_doc, pd.DataFrame):
+        return len(df_or_doc) > c.LLM_PLAN_MIN_ROWS
+    return (isinstance(df_or_doc, dict) and df_or_doc.get("tipo") in ("excel", "gsheet")
+            and any(rows > c.LLM_PLAN_MIN_ROWS for rows in _row_counts(df_or_doc)))
+
+
+def plan_query(df_or_doc, question, context_note="Single file analysis"):
+    """
+    Plan validado (ver helpers/query_plan.py) o None si la pregunta no se responde con un query.
+    El modelo solo ve el esquema y estadísticas por columna: el prompt no crece con las filas.
+    """
+    schema = json.dumps(schema_summary(df_or_doc), ensure_ascii=False, default=str)
+    content = f"Context: {context_note}\nSchema:\n{schema}"
+    plan = parse_plan(_chat(_messages(PLAN_INSTRUCTIONS, content, question), task="plan"))
+    if isinstance(plan, dict) and "table" in plan and plan["table"] is None:
+        return None
+    return validate_plan(plan, df_or_doc)
+
+
+def _query_plan_messages(df_or_doc, question, context_note="Single file analysis"):
+    """Mensajes para redactar la respuesta a partir del resultado local, o None (se usa otro modo)"""
+    try:
+        plan = plan_query(df_or_doc, question, context_note)
+        if plan is None:
+            return None
+        result, info = execute_plan(plan, df_or_doc)
+    except (PlanError, TypeError, KeyError, ValueError) as e:
+        print(f"⚠️ Query plan not usable ({e}); falling back to the document content")
+        return None
+    description = describe_plan(plan)
+    print(f"🧮 Query plan: {description} → {info['matched']} of {info['rows']} rows, {len(result)} result row(s)")
+    shown = result.head(c.LLM_PLAN_MAX_RESULT_ROWS)
+    more = f" (first {len(shown)} shown)" if len(result) > len(shown) else ""
+    content = f"""Context: {context_note}
+Plan: {description}
+Rows in table: {info['rows']}, rows matching the filters: {info['matched']}
+Result ({len(result)} rows{more}):
+{_table_text(shown, len(shown))}"""
+    return _messages(PHRASE_INSTRUCTIONS, content, question)
+
+
+def _use_map_reduce(df_or_doc, mode):
+    return mode == "map_reduce" or (mode == "auto" and isinstance(df_or_doc, (pd.DataFrame, dict))
+                                    and document_tokens(df_or_doc) > c.LLM_CHUNK_TOKENS)
+
+
+DOC_TYPE_LABELS = {
+    "pdf": "PDF", "word": "DOCX", "excel": "Excel workbook",
+    "gdoc": "Google Doc", "gsheet": "Google Sheet",
+}
+
+
+def _table_text(df, n_rows):
+    """Primeras n_rows filas para el prompt: serializador compacto (helpers/table_prompt.py) o CSV"""
+    if c.LLM_COMPACT_TABLES:
+        return table_to_prompt(df, n_rows)
+    return df.head(n_rows).to_csv(index=False)
+
+
+def _row_counts(doc):
+    """Filas de cada tabla; en libros perezosos (LazySheets) salen de las dimensiones, sin leer las hojas"""
+    tablas = doc.get("tablas", [])
+    if isinstance(tablas, LazySheets):
+        return [tablas.rows(i) for i in range(len(tablas))]
+    return [len(t) for t in tablas]
+
+
+def _tables_preview(doc, n_rows=10):
+    """Primeras filas de cada tabla; en libros con varias hojas se etiqueta cada hoja"""
+    tablas = doc.get("tablas", [])
+    if not tablas:
+        return "No tables"
+    hojas = doc.get("hojas")
+    parts = []
+    for i in range(len(tablas)):
+        if isinstance(tablas, LazySheets):
+            # solo las primeras filas de la hoja se leen del archivo
+            t = tablas.preview(i, n_rows)
+            label = f"Sheet '{hojas[i]}' ({tablas.rows(i)} rows, {tablas.columns(i)} columns)\n"
+        else:
+            t = tablas[i]
+            label = f"Sheet '{hojas[i]}' ({len(t)} rows)\n" if hojas else ""
+        parts.append(label + _table_text(t, n_rows))
+    return "\n\n".join(parts)
+
+
+def _analysis_messages(df_or_doc, question, context_note="Single file analysis"):
     if isinstance(df_or_doc, pd.DataFrame):
         # Caso Excel/CSV
-        csv_sample = df_or_doc.head(50).to_csv(index=False)
+        csv_sample = _table_text(df_or_doc, 50)
         data_repr = f"CSV/Excel sample (first 50 rows):\n{csv_sample}"
 
     elif isinstance(df_or_doc, dict):
@@ -131,12 +630,10 @@ def ask_llm_about_dataframe(df_or_doc, question, context_note="Single file analy
         if "texto" in df_or_doc and "tablas" in df_or_doc:
             texto = df_or_doc.get("texto", "")
             tablas = df_or_doc.get("tablas", [])
-            tablas_str = "\n\n".join(
-                [t.head(10).to_csv(index=False) for t in tablas]
-            ) if tablas else "No tables"
+            tablas_str = _tables_preview(df_or_doc)
 
-            # Detectamos si es PDF o DOCX solo para etiqueta
-            doc_type = "PDF" if df_or_doc.get("source") == "pdf" else "DOCX"
+            # tipo de documento solo para la etiqueta
+            doc_type = DOC_TYPE_LABELS.get(df_or_doc.get("tipo"), "Document")
             data_repr = f"""{doc_type} detected.
 Text content (first 1000 chars):
 {texto[:1000]}...
@@ -150,43 +647,55 @@ Tables (first 10 rows each):
     else:
         raise ValueError("❌ Tipo de archivo no soportado en ask_llm_about_dataframe")
 
-    prompt = f"""
-    You are a data analysis assistant.
-    Context: {context_note}
-    Here is the document content:
-
-    {data_repr}
+    content = f"Context: {context_note}\nHere is the document content:\n\n{data_repr}"
+    return _messages(ANALYSIS_INSTRUCTIONS, content, question)
 
-    Question: {question}
 
-    Answer clearly and concisely, based only on the provided data.
+def ask_llm_about_dataframe(df_or_doc, question, context_note="Single file analysis", mode="auto"):
     """
-
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.2
-    )
-
-    return response.choices[0].message.content
-
-
-
-def compare_two_dataframes(doc1, doc2, question):
-    """
-    Compara dos documentos que pueden ser:
-      - DataFrame (CSV/Excel)
-      - dict con {"texto":..., "tablas": [...]} (Word o PDF)
+    Envía el contenido del archivo (DataFrame, DOCX o PDF) al LLM de OpenAI.
+    mode: "preview" (muestra del contenido), "map_reduce" (documento completo por chunks),
+    "plan" (el LLM planea un query que se ejecuta localmente sobre todas las filas)
+    o "auto" (plan en tablas más grandes que la muestra, map-reduce si el documento no cabe
+    en un prompt). Si no hay plan aplicable se sigue como en "auto" sin plan.
     """
+    with usage_tracker.job("analyze"):
+        if _use_query_plan(df_or_doc, mode):
+            messages = _query_plan_messages(df_or_doc, question, context_note)
+            if messages is not None:
+                return _chat(messages, task="phrase")
+            mode = "auto" if mode == "plan" else mode
+        if _use_map_reduce(df_or_doc, mode):
+            return ask_llm_map_reduce(df_or_doc, question, context_note)
+        return _chat(_analysis_messages(df_or_doc, question, context_note), task="analyze")
+
+
+def stream_llm_about_dataframe(df_or_doc, question, context_note="Single file analysis", mode="auto"):
+    """Igual que ask_llm_about_dataframe pero devuelve un generador de fragmentos de texto"""
+    with usage_tracker.job("analyze"):
+        if _use_query_plan(df_or_doc, mode):
+            messages = _query_plan_messages(df_or_doc, question, context_note)
+            if messages is not None:
+                yield from _chat_stream(messages, task="phrase")
+                return
+            mode = "auto" if mode == "plan" else mode
+        if _use_map_reduce(df_or_doc, mode):
+            result = ask_llm_map_reduce(df_or_doc, question, context_note, stream=True)
+            if isinstance(result, str):
+                yield result
+            else:
+                yield from result
+            return
+        yield from _chat_stream(_analysis_messages(df_or_doc, question, context_note), task="analyze")
+
+
+def _compare_messages(doc1, doc2, question):
     def summarize_doc(doc, label="Dataset"):
         if isinstance(doc, pd.DataFrame):
-            return f"{label} (CSV/Excel, first 30 rows):\n{doc.head(30).to_csv(index=False)}"
+            return f"{label} (CSV/Excel, first 30 rows):\n{_table_text(doc, 30)}"
         elif isinstance(doc, dict):  # Word o PDF
             texto = doc.get("texto", "")
-            tablas = doc.get("tablas", [])
-            tablas_str = "\n\n".join(
-                [t.head(10).to_csv(index=False) for t in tablas]
-            ) if tablas else "No tables"
+            tablas_str = _tables_preview(doc)
             return f"""{label} (Document):
 Text (first 1000 chars):
 {texto[:1000]}...
@@ -196,30 +705,44 @@ Tables (first 10 rows each):
         else:
             return f"{label}: ❌ Unsupported type {type(doc)}"
 
-    doc1_repr = summarize_doc(doc1, "Dataset A")
-    doc2_repr = summarize_doc(doc2, "Dataset B")
+    # 🔎 Diff local primero: al LLM solo le llega el delta compacto + estadísticas
+    delta = diff_any(doc1, doc2)
+    if delta is not None:
+        if delta["kind"] == "table":
+            schema = (
+                f"Dataset A columns: {[str(col) for col in doc1.columns]}\n"
+                f"Dataset B columns: {[str(col) for col in doc2.columns]}"
+            )
+        else:
+            schema = f"Two documents (A and B) with {len(doc1.get('tablas', []))} and {len(doc2.get('tablas', []))} tables"
 
-    prompt = f"""
-    You are a comparison assistant.
-    Compare the following two datasets/documents:
+        content = f"""A local diff of the FULL contents of two datasets/documents (A and B) was computed.
+Only the differences and summary statistics are shown.
 
-    {doc1_repr}
+{schema}
 
-    {doc2_repr}
+Differences (A → B):
+{format_delta(delta)}"""
+    else:
+        # tipos distintos (tabla vs documento): no hay diff estructural, se envían muestras
+        content = f"{summarize_doc(doc1, 'Dataset A')}\n\n{summarize_doc(doc2, 'Dataset B')}"
+    return _messages(COMPARE_INSTRUCTIONS, content, question)
 
-    Task: Compare them to answer this question:
-    {question}
 
-    Provide a structured and concise answer.
+def compare_two_dataframes(doc1, doc2, question):
     """
+    Compara dos documentos que pueden ser:
+      - DataFrame (CSV/Excel)
+      - dict con {"texto":..., "tablas": [...]} (Word o PDF)
+    """
+    with usage_tracker.job("compare"):
+        return _chat(_compare_messages(doc1, doc2, question), task="compare")
 
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.2
-    )
 
-    return response.choices[0].message.content
+def stream_compare_two_dataframes(doc1, doc2, question):
+    """Igual que compare_two_dataframes pero devuelve un generador de fragmentos de texto"""
+    with usage_tracker.job("compare"):
+        yield from _chat_stream(_compare_messages(doc1, doc2, question), task="compare")
 
 
 # ------------------ MAIN ------------------
@@ -0,0 +1,180 @@
+import datetime as dt
+import json
+import os
+import threading
+
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+
+import const.constants as c
+
+SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+
+
+def _utcnow():
+    # google-auth keeps expiry as naive UTC
+    return dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)
+
+
+class ManagedCredentials(Credentials):
+    """
+    Credentials whose refresh goes through the CredentialManager: one refresh at a
+    time, skipped when another thread already replaced the token this one found
+    stale, token file rewritten only when the token changed.
+    """
+
+    _manager = None
+
+    def refresh(self, request):
+        if self._manager is None:
+            return super().refresh(request)
+        # the transport also calls this after a 401: a token revoked on the server looks valid here
+        self._manager.refresh(request, force=False, creds=self, seen_token=self.token)
+
+    def _base_refresh(self, request):
+        super().refresh(request)
+
+
+class CredentialManager:
+    """
+    Single source of Google credentials for every Drive/Sheets client.
+
+    - token_path is read once; the same Credentials object is shared by all clients
+    - a daemon thread refreshes the token refresh_margin seconds before it expires,
+      so long batch jobs never hit an expired token mid-request
+    - refreshes are serialized with a lock (transport-triggered ones included)
+    - the token file is written atomically (tmp file + os.replace) and only on change
+    """
+
+    def __init__(self, token_path=None, client_secret_path=None, scopes=SCOPES,
+                 refresh_margin=None, retry_seconds=30):
+        self.token_path = token_path or c.TOKEN_PATH
+        self.client_secret_path = client_secret_path or c.CLIENT_SECRET_PATH
+        self.scopes = scopes
+        self.refresh_margin = dt.timedelta(seconds=c.TOKEN_REFRESH_MARGIN if refresh_margin is None
+                                           else refresh_margin)
+        self.retry_seconds = retry_seconds
+        self._creds = None
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.refreshes = 0
+        self.last_error = None
+
+    # --- loading ---
+    def _managed(self, creds):
+        managed = ManagedCredentials.from_authorized_user_info(json.loads(creds.to_json()), self.scopes)
+        managed._manager = self
+        return managed
+
+    def _load(self):
+        creds = None
+        if os.path.exists(self.token_path):
+            creds = ManagedCredentials.from_authorized_user_file(self.token_path, self.scopes)
+            creds._manager = self
+        if creds and (creds.refresh_token or creds.valid):
+            try:
+                if creds.refresh_token and self._needs_refresh(creds):
+                    self.refresh(Request(), force=True, creds=creds)
+                return creds
+            except RefreshError as e:
+                # revoked or expired refresh token: fall back to the consent flow
+                print(f"⚠️ Stored token can no longer be refreshed ({e}), re-authenticating...")
+        flow = InstalledAppFlow.from_client_secrets_file(self.client_secret_path, self.scopes)
+        creds = self._managed(flow.run_local_server(port=0))
+        self._write(creds)
+        return creds
+
+    def credentials(self):
+        """The shared credentials (OAuth flow on first use if there is no token file)"""
+        with self._lock:
+            if self._creds is None:
+                self._creds = self._load()
+                self.start()
+            return self._creds
+
+    # --- refresh ---
+    def _needs_refresh(self, creds):
+        if not creds.token or creds.expiry is None:
+            return not creds.token
+        return creds.expiry - self.refresh_margin <= _utcnow()
+
+    def refresh(self, request=None, force=False, creds=None, seen_token=None):
+        """
+        seen_token: the token the caller found stale (e.g. rejected with a 401); the refresh
+        is skipped only if another thread replaced it while this one waited on the lock.
+        Without it (background thread) it is skipped while the token is not near expiry.
+        """
+        creds = creds or self._creds
+        with self._lock:
+            if not force:
+                if seen_token is not None:
+                    if creds.token != seen_token and creds.valid:
+                        return
+                elif not self._needs_refresh(creds) and creds.valid:
+                    return
+            before = creds.token
+            creds._base_refresh(request or Request())
+            self.refreshes += 1
+            if creds.token != before:
+                self._write(creds)
+
+    def _write(self, creds):
+        folder = os.path.dirname(os.path.abspath(self.token_path))
+        os.makedirs(folder, exist_ok=True)
+        tmp = f"{self.token_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as token:
+            token.write(creds.to_json())
+        try:
+            os.chmod(tmp, 0o600)
+        except OSError:
+            pass
+        os.replace(tmp, self.token_path)
+
+    def _seconds_until_refresh(self):
+        creds = self._creds
+        if creds is None or creds.expiry is None:
+            return self.retry_seconds
+        due = creds.expiry - self.refresh_margin - _utcnow()
+        return max(0.0, due.total_seconds())
+
+    def _run(self):
+        while not self._stop.wait(self._seconds_until_refresh()):
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as e:
+                # network blip: keep the current token (still valid for refresh_margin) and retry
+                self.last_error = e
+                print(f"⚠️ Token refresh failed, retrying in {self.retry_seconds}s: {e}")
+                if self._stop.wait(self.retry_seconds):
+                    break
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="token-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+_default_manager = None
+_default_lock = threading.Lock()
+
+
+def credential_manager():
+    global _default_manager
+    with _default_lock:
+        if _default_manager is None:
+            _default_manager = CredentialManager()
+        return _default_manager
+
+
+def get_credentials():
+    return credential_manager().credentials()
@@ -0,0 +1,293 @@
+import difflib
+
+import pandas as pd
+
+from helpers.excel import _header
+
+KEY_HINTS = ("id", "key", "code", "sku", "item", "number", "no", "name")
+
+
+# ------------------ DATAFRAMES ------------------
+def _norm(col):
+    return str(col).strip().lower()
+
+
+def _norm_names(columns):
+    """Normalized column names made unique in order: 'Sales', 'sales' → 'sales', 'sales.1'"""
+    names, used = [], set()
+    for col in columns:
+        name, n = _norm(col), 0
+        while name in used:
+            n += 1
+            name = f"{_norm(col)}.{n}"
+        used.add(name)
+        names.append(name)
+    return names
+
+
+def align_schemas(a, b):
+    """Match columns by normalized name; returns (common, only_a, only_b, dtype_changes)"""
+    names_a, names_b = _norm_names(a.columns), _norm_names(b.columns)
+    # positions, not labels: a frame may have the same label twice
+    pos_a = {n: i for i, n in enumerate(names_a)}
+    pos_b = {n: i for i, n in enumerate(names_b)}
+    common = [n for n in names_a if n in pos_b]
+    only_a = [a.columns[pos_a[n]] for n in names_a if n not in pos_b]
+    only_b = [b.columns[pos_b[n]] for n in names_b if n not in pos_a]
+    dtype_changes = [
+        (a.columns[pos_a[n]], str(a.iloc[:, pos_a[n]].dtype), str(b.iloc[:, pos_b[n]].dtype))
+        for n in common if a.iloc[:, pos_a[n]].dtype != b.iloc[:, pos_b[n]].dtype
+    ]
+    return common, only_a, only_b, dtype_changes
+
+
+def detect_key_column(a, b, common):
+    """
+    Common column that identifies rows in both frames: unique, no nulls and with
+    overlapping values. Name hints (id, item, sku...) break ties. None if no candidate.
+    """
+    best = None
+    for position, name in enumerate(common):
+        sa, sb = a[name], b[name]
+        if sa.isna().any() or sb.isna().any() or not (sa.is_unique and sb.is_unique):
+            continue
+        if pd.api.types.is_float_dtype(sa) or pd.api.types.is_float_dtype(sb):
+            continue
+        overlap = len(set(sa.astype(str)) & set(sb.astype(str))) / max(1, min(len(sa), len(sb)))
+        if overlap < 0.3:
+            continue
+        hint = any(h == token for token in name.replace("_", " ").split() for h in KEY_HINTS)
+        score = (hint, overlap, -position)
+        if best is None or score > best[0]:
+            best = (score, name)
+    return best[1] if best else None
+
+
+def _row_hashes(df):
+    return pd.util.hash_pandas_object(df, index=False)
+
+
+def _value_text(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return str(value)
+
+
+def _cell_text(df):
+    """
+    Cells as comparable text, "" for nulls. Whole floats lose their ".0": a blank cell turns
+    an int column into float64 in one version, and 1 vs 1.0 is not an edit.
+    """
+    out = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_float_dtype(series):
+            whole = series.notna() & (series % 1 == 0) & (series.abs() < 1e15)
+            text = series.astype(str)
+            text[whole] = series[whole].astype("int64").astype(str)
+            out[col] = text.where(series.notna(), "")
+        elif series.dtype == object:
+            out[col] = series.map(_value_text)
+        else:
+            out[col] = series.astype(str).where(series.notna(), "")
+    return pd.DataFrame(out, index=df.index)
+
+
+def diff_dataframes(a, b, max_rows=10, max_cells=40):
+    """
+    Structural diff of two tables: schema changes, key-based (or whole-row hash) row
+    diff and changed cells. Only samples of the differences are kept, so the result
+    stays small whatever the table size.
+    """
+    common, only_a, only_b, dtype_changes = align_schemas(a, b)
+    # work on normalized column names (columns differing only in case are kept apart)
+    a_n, b_n = a.set_axis(_norm_names(a.columns), axis=1), b.set_axis(_norm_names(b.columns), axis=1)
+    a_c, b_c = _cell_text(a_n[common]), _cell_text(b_n[common])
+
+    key = detect_key_column(a_n, b_n, common)
+    delta = {
+        "rows_a": len(a), "rows_b": len(b),
+        "columns_a": len(a.columns), "columns_b": len(b.columns),
+        "columns_only_in_a": [str(col) for col in only_a],
+        "columns_only_in_b": [str(col) for col in only_b],
+        "dtype_changes": dtype_changes,
+        "key": key,
+    }
+
+    if key:
+        a_k = a_c.set_index(key, drop=False)
+        b_k = b_c.set_index(key, drop=False)
+        removed_keys = a_k.index.difference(b_k.index)
+        added_keys = b_k.index.difference(a_k.index)
+        both = a_k.index.intersection(b_k.index)
+        a_both, b_both = a_k.loc[both], b_k.loc[both]
+        changed_mask = _row_hashes(a_both).values != _row_hashes(b_both).values
+        changed_keys = both[changed_mask]
+
+        cells = []
+        if len(changed_keys):
+            old, new = a_both.loc[changed_keys], b_both.loc[changed_keys]
+            diff_mask = old.ne(new)
+            per_column = diff_mask.sum()
+            delta["changed_cells_per_column"] = {c: int(n) for c, n in per_column.items() if n}
+            for k, row in diff_mask.head(max_cells).iterrows():
+                for col in row.index[row.values]:
+                    cells.append({"key": k, "column": col, "a": old.at[k, col], "b": new.at[k, col]})
+                    if len(cells) >= max_cells:
+                        break
+                if len(cells) >= max_cells:
+                    break
+        delta.update({
+            "added": len(added_keys), "removed": len(removed_keys),
+            "changed": int(changed_mask.sum()), "unchanged": int((~changed_mask).sum()),
+            "added_sample": b_k.loc[added_keys[:max_rows]].to_dict("records"),
+            "removed_sample": a_k.loc[removed_keys[:max_rows]].to_dict("records"),
+            "changed_cells": cells,
+        })
+    else:
+        # no key: rows are only "same" or "different" (added/removed)
+        hashes_a, hashes_b = _row_hashes(a_c), _row_hashes(b_c)
+        added = b_c[~hashes_b.isin(set(hashes_a))]
+        removed = a_c[~hashes_a.isin(set(hashes_b))]
+        delta.update({
+            "added": len(added), "removed": len(removed),
+            "changed": None, "unchanged": int(hashes_a.isin(set(hashes_b)).sum()),
+            "added_sample": added.head(max_rows).to_dict("records"),
+            "removed_sample": removed.head(max_rows).to_dict("records"),
+            "changed_cells": [],
+        })
+    return delta
+
+
+# ------------------ DOCUMENTS ------------------
+def _paragraphs(text):
+    return [line.strip() for line in (text or "").splitlines() if line.strip()]
+
+
+def diff_text(text_a, text_b, max_hunks=30):
+    """Paragraph-level diff (difflib matching); only the changed hunks are kept"""
+    lines_a, lines_b = _paragraphs(text_a), _paragraphs(text_b)
+    matcher = difflib.SequenceMatcher(None, lines_a, lines_b, autojunk=False)
+    hunks = []
+    unchanged = 0
+    n_hunks = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            unchanged += i2 - i1
+            continue
+        n_hunks += 1
+        if len(hunks) < max_hunks:
+            hunks.append({"op": tag, "a": lines_a[i1:i2], "b": lines_b[j1:j2], "at_a": i1 + 1, "at_b": j1 + 1})
+    return {
+        "paragraphs_a": len(lines_a), "paragraphs_b": len(lines_b),
+        "unchanged": unchanged, "similarity": round(matcher.ratio(), 3),
+        "hunks_total": n_hunks, "hunks": hunks,
+    }
+
+
+def _pair_tables(doc_a, doc_b):
+    """[(label, index in A or None, index in B or None)]: workbook sheets by name, other tables by position"""
+    n_a, n_b = len(doc_a.get("tablas", [])), len(doc_b.get("tablas", []))
+    names_a, names_b = doc_a.get("hojas"), doc_b.get("hojas")
+    if not (names_a and names_b):
+        return [(f"Table {i + 1}", i if i < n_a else None, i if i < n_b else None) for i in range(max(n_a, n_b))]
+    # sheet names are unique ignoring case within a workbook
+    index_b = {_norm(name): j for j, name in enumerate(names_b)}
+    pairs = [(f"Sheet '{name}'", i, index_b.get(_norm(name))) for i, name in enumerate(names_a)]
+    matched = {j for _, _, j in pairs}
+    pairs.extend((f"Sheet '{name}'", None, j) for j, name in enumerate(names_b) if j not in matched)
+    return pairs
+
+
+def _positional_header(df):
+    """PDF/DOCX tables have positional columns 0..n-1 and their header in the first row"""
+    if not isinstance(df.columns, pd.RangeIndex) or df.empty:
+        return df
+    header = [None if v is None or pd.isna(v) else " ".join(str(v).split()) for v in df.iloc[0]]
+    return df.iloc[1:].set_axis(_header(header), axis=1).reset_index(drop=True)
+
+
+def _rows(tablas, i):
+    # lazy workbooks (helpers.excel.LazySheets) know their row counts without loading the sheet
+    return tablas.rows(i) if hasattr(tablas, "rows") else len(tablas[i])
+
+
+def diff_documents(doc_a, doc_b, max_hunks=30):
+    """Text diff plus table-by-table diff (sheets paired by name, other tables by position)"""
+    tables_a, tables_b = doc_a.get("tablas", []), doc_b.get("tablas", [])
+    tables = []
+    for label, i, j in _pair_tables(doc_a, doc_b):
+        if i is None:
+            tables.append({"table": label, "only_in": "B", "rows": _rows(tables_b, j)})
+        elif j is None:
+            tables.append({"table": label, "only_in": "A", "rows": _rows(tables_a, i)})
+        else:
+            a, b = _positional_header(tables_a[i]), _positional_header(tables_b[j])
+            tables.append({"table": label, **diff_dataframes(a, b, max_rows=5, max_cells=15)})
+    return {"text": diff_text(doc_a.get("texto", ""), doc_b.get("texto", ""), max_hunks), "tables": tables}
+
+
+def diff_any(doc_a, doc_b):
+    """Diff for two DataFrames or two documents; None when the types can't be diffed locally"""
+    if isinstance(doc_a, pd.DataFrame) and isinstance(doc_b, pd.DataFrame):
+        return {"kind": "table", **diff_dataframes(doc_a, doc_b)}
+    if isinstance(doc_a, dict) and isinstance(doc_b, dict):
+        return {"kind": "document", **diff_documents(doc_a, doc_b)}
+    return None
+
+
+# ------------------ PROMPT FORMAT ------------------
+def _clip(value, limit=120):
+    value = str(value)
+    return value if len(value) <= limit else value[:limit] + "…"
+
+
+def _format_table_delta(d, indent=""):
+    lines = [
+        f"{indent}Rows: A={d['rows_a']} B={d['rows_b']} | added={d['added']} removed={d['removed']} "
+        f"changed={d['changed'] if d['changed'] is not None else 'n/a (no key column)'} unchanged={d['unchanged']}",
+        f"{indent}Key column: {d['key'] or 'none detected (whole-row comparison)'}",
+    ]
+    if d["columns_only_in_a"] or d["columns_only_in_b"]:
+        lines.append(f"{indent}Columns only in A: {d['columns_only_in_a']} | only in B: {d['columns_only_in_b']}")
+    if d["dtype_changes"]:
+        lines.append(f"{indent}Type changes: " + ", ".join(f"{c} {x}→{y}" for c, x, y in d["dtype_changes"]))
+    if d.get("changed_cells_per_column"):
+        lines.append(f"{indent}Changed cells per column: {d['changed_cells_per_column']}")
+    for cell in d["changed_cells"]:
+        lines.append(f"{indent}  ~ [{_clip(cell['key'], 40)}] {cell['column']}: {_clip(cell['a'], 60)} → {_clip(cell['b'], 60)}")
+    for label, rows in (("+ added", d["added_sample"]), ("- removed", d["removed_sample"])):
+        for row in rows:
+            lines.append(f"{indent}  {label}: " + _clip(", ".join(f"{k}={v}" for k, v in row.items() if v != ""), 240))
+    return lines
+
+
+def format_delta(delta, max_chars=8000):
+    """Compact text rendering of diff_any() output for the LLM prompt"""
+    if delta["kind"] == "table":
+        lines = _format_table_delta(delta)
+    else:
+        t = delta["text"]
+        lines = [
+            f"Text: paragraphs A={t['paragraphs_a']} B={t['paragraphs_b']} | unchanged={t['unchanged']} "
+            f"| similarity={t['similarity']} | changed hunks={t['hunks_total']}"
+        ]
+        for h in t["hunks"]:
+            lines.append(f"  [{h['op']} at A:{h['at_a']} B:{h['at_b']}]")
+            lines.extend(f"    - {_clip(x, 300)}" for x in h["a"][:5])
+            lines.extend(f"    + {_clip(x, 300)}" for x in h["b"][:5])
+        if t["hunks_total"] > len(t["hunks"]):
+            lines.append(f"  ... {t['hunks_total'] - len(t['hunks'])} more changed hunks")
+        for tbl in delta["tables"]:
+            if "only_in" in tbl:
+                lines.append(f"{tbl['table']}: only in {tbl['only_in']} ({tbl['rows']} rows)")
+            else:
+                lines.append(f"{tbl['table']}:")
+                lines.extend(_format_table_delta(tbl, indent="  "))
+
+    out = "\n".join(lines)
+    if len(out) > max_chars:
+        out = out[:max_chars] + "\n... (delta truncated)"
+    return out
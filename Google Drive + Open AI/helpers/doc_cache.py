@@ -0,0 +1,150 @@
+import glob
+import hashlib
+import os
+import pickle
+import re
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def estimate_size(doc):
+    """Approximate in-memory size (bytes) of a parsed document"""
+    if isinstance(doc, pd.DataFrame):
+        return int(doc.memory_usage(index=True, deep=True).sum())
+    if isinstance(doc, dict):
+        size = sys.getsizeof(doc.get("texto", ""))
+        tablas = doc.get("tablas", [])
+        if hasattr(tablas, "nbytes"):
+            # lazy workbook (helpers.excel.LazySheets): the file bytes, sheets are read on use
+            return size + tablas.nbytes
+        for table in tablas:
+            size += estimate_size(table)
+        return size
+    return sys.getsizeof(doc)
+
+
+def _slug(value):
+    return re.sub(r"[^A-Za-z0-9_.-]", "-", str(value))
+
+
+def _file_key(file_id):
+    # a hash, not a slug: local ids like "nas:a/b.csv" and "nas:a-b.csv" would share a name
+    return hashlib.sha1(str(file_id).encode("utf-8")).hexdigest()
+
+
+class DocumentCache:
+    """
+    Parsed documents (DataFrame or {texto, tablas}) keyed by (file_id, modifiedTime).
+
+    - memory tier: LRU bounded by the estimated size of the entries (max_memory_bytes)
+    - disk tier: one pickle per file under cache_dir (None = memory only); loading a
+      pickled DataFrame is much faster than re-running pdfplumber/openpyxl/python-docx
+    Entries written with a different parser version are ignored and deleted.
+    """
+
+    def __init__(self, cache_dir=None, max_memory_bytes=256 * 1024 * 1024, version=1):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.version = version
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.stats_counter = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    # --- memory tier ---
+    def _remember(self, key, doc):
+        size = estimate_size(doc)
+        if size > self.max_memory_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory_bytes -= self._memory.pop(key)[1]
+            self._memory[key] = (doc, size)
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, (_, old_size) = self._memory.popitem(last=False)
+                self._memory_bytes -= old_size
+
+    # --- disk tier ---
+    def _path(self, file_id, modified_time):
+        return os.path.join(self.cache_dir, f"{_file_key(file_id)}__{_slug(modified_time)}.pkl")
+
+    def _load(self, file_id, modified_time):
+        path = self._path(file_id, modified_time)
+        try:
+            with open(path, "rb") as fh:
+                entry = pickle.load(fh)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # corrupted or unreadable entry → treat as a miss and drop it
+            self._remove(path)
+            return None
+        if entry.get("version") != self.version:
+            self._remove(path)
+            return None
+        if entry.get("file_id") != file_id or entry.get("modifiedTime") != modified_time:
+            # another file (or version) under this name: a miss, the entry belongs to it
+            return None
+        return entry["doc"]
+
+    def _store(self, file_id, modified_time, doc):
+        # old versions of the same file are no longer useful
+        for old in glob.glob(os.path.join(self.cache_dir, f"{_file_key(file_id)}__*.pkl")):
+            self._remove(old)
+        path = self._path(file_id, modified_time)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump({"version": self.version, "file_id": file_id,
+                         "modifiedTime": modified_time, "doc": doc},
+                        fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    # --- public API ---
+    def get(self, file_id, modified_time):
+        key = (file_id, modified_time)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.stats_counter["memory_hits"] += 1
+                return entry[0]
+        if self.cache_dir and modified_time:
+            doc = self._load(file_id, modified_time)
+            if doc is not None:
+                self.stats_counter["disk_hits"] += 1
+                self._remember(key, doc)
+                return doc
+        self.stats_counter["misses"] += 1
+        return None
+
+    def put(self, file_id, modified_time, doc):
+        self._remember((file_id, modified_time), doc)
+        if self.cache_dir and modified_time:
+            try:
+                self._store(file_id, modified_time, doc)
+            except Exception as e:
+                print(f"⚠️ Could not write document cache for {file_id}: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        if self.cache_dir:
+            for path in glob.glob(os.path.join(self.cache_dir, "*.pkl")):
+                self._remove(path)
+
+    def stats(self):
+        return {**self.stats_counter, "memory_items": len(self._memory), "memory_bytes": self._memory_bytes}
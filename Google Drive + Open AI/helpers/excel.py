@@ -0,0 +1,223 @@
+import io
+import re
+import threading
+from collections.abc import Sequence
+from itertools import islice
+
+import pandas as pd
+from openpyxl import load_workbook
+
+
+def _header(values):
+    """Column names like pd.read_excel: empty → 'Unnamed: i', duplicates → 'name.1'"""
+    names, seen = [], {}
+    for i, v in enumerate(values):
+        name = f"Unnamed: {i}" if v is None or str(v).strip() == "" else v
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _compile(query):
+    """Case-insensitive pattern; the query is used as a regex when valid (as str.contains did)"""
+    if isinstance(query, (list, tuple)):
+        query = "|".join(re.escape(str(q)) for q in query)
+    try:
+        return re.compile(str(query), re.IGNORECASE)
+    except re.error:
+        return re.compile(re.escape(str(query)), re.IGNORECASE)
+
+
+class LazyWorkbook:
+    """
+    Read-only view of an .xlsx built on openpyxl's read_only mode.
+    Opening it only reads the workbook index: sheets are streamed row by row when
+    asked for, so memory grows with the rows actually touched, not with the file.
+    """
+
+    def __init__(self, source):
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        self._wb = load_workbook(source, read_only=True, data_only=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._wb.close()
+
+    @property
+    def sheet_names(self):
+        return list(self._wb.sheetnames)
+
+    def _sheet(self, sheet):
+        if sheet is None:
+            return self._wb[self._wb.sheetnames[0]]
+        if isinstance(sheet, int):
+            return self._wb[self._wb.sheetnames[sheet]]
+        return self._wb[sheet]
+
+    def dimensions(self, sheet=None, exact=False):
+        """
+        (rows, columns) as recorded in the file, header row included, or (None, None) when
+        the writer didn't store them. exact=True counts them by streaming the sheet instead.
+        """
+        ws = self._sheet(sheet)
+        try:
+            if exact and not (ws.max_row and ws.max_column):
+                ws.calculate_dimension(force=True)
+            return ws.max_row, ws.max_column
+        except Exception:
+            return None, None
+
+    def iter_rows(self, sheet=None, min_row=1, max_row=None):
+        """Stream rows as tuples of values (1-based, inclusive range)"""
+        yield from self._sheet(sheet).iter_rows(min_row=min_row, max_row=max_row, values_only=True)
+
+    def load_sheet(self, sheet=None, min_row=2, max_row=None, header_row=1, block_rows=2000):
+        """
+        DataFrame for one sheet (or the data rows min_row..max_row of it) with the
+        header taken from header_row. Trailing empty rows and columns are dropped.
+        Rows go from the stream into typed frames block by block: no list of every row.
+        """
+        header = next(self.iter_rows(sheet, header_row, header_row), ())
+        rows = self.iter_rows(sheet, min_row, max_row)
+        blocks = []
+        while True:
+            block = list(islice(rows, block_rows))
+            if not block:
+                break
+            # rows of sheets without stored dimensions can differ in length: pad per block,
+            # concat aligns the positional columns
+            width = max([len(header)] + [len(r) for r in block])
+            block = [tuple(r) + (None,) * (width - len(r)) for r in block]
+            blocks.append(pd.DataFrame.from_records(block, columns=range(width)))
+        if not blocks:
+            df = pd.DataFrame(columns=range(len(header)))
+        elif len(blocks) == 1:
+            df = blocks[0]
+        else:
+            # a block where a column is all empty comes out as object: re-infer after joining
+            df = pd.concat(blocks, ignore_index=True).infer_objects()
+        del blocks
+        width = df.shape[1]
+        if not width:
+            return pd.DataFrame()
+
+        filled = df.notna()
+        used = filled.any(axis=1).to_numpy()
+        last_row = len(used) - used[::-1].argmax() if used.any() else 0
+        if last_row < len(df):
+            df = df.iloc[:last_row]
+            filled = filled.iloc[:last_row]
+        header = tuple(header) + (None,) * (width - len(header))
+        while width and header[width - 1] is None and not filled.iloc[:, width - 1].any():
+            width -= 1
+        if not width:
+            return pd.DataFrame()
+        df = df.iloc[:, :width] if width < df.shape[1] else df
+        df.columns = _header(header[:width])
+        return df
+
+    def load_all(self):
+        """{sheet name: DataFrame} for every sheet"""
+        return {name: self.load_sheet(name) for name in self.sheet_names}
+
+    def previews(self, n_rows=20):
+        """{sheet name: first n_rows as DataFrame}; only those rows are read"""
+        return {name: self.load_sheet(name, max_row=n_rows + 1) for name in self.sheet_names}
+
+    def search(self, query, max_matches=2, sheets=None):
+        """
+        Stream rows whose cells match query, stopping after max_matches.
+        Returns [(sheet name, header, row)] (row numbers are not needed by callers).
+        """
+        pattern = _compile(query)
+        matches = []
+        for name in sheets or self.sheet_names:
+            rows = self.iter_rows(name)
+            header = next(rows, ())
+            for row in rows:
+                if any(v is not None and pattern.search(str(v)) for v in row):
+                    matches.append((name, header, row))
+                    if len(matches) >= max_matches:
+                        return matches
+        return matches
+
+
+class LazySheets(Sequence):
+    """
+    The sheets of a workbook as a sequence of DataFrames that are only read when used.
+    Parsing keeps the file bytes plus the names and dimensions of the sheets; a sheet
+    is streamed into a DataFrame (LazyWorkbook.load_sheet) when a query plan, map-reduce
+    or diff asks for it, and only the last one read is kept. Previews read just their rows.
+    Pickles as the file bytes (document cache, parse processes).
+    """
+
+    def __init__(self, raw):
+        self._raw = bytes(raw)
+        self._lock = threading.Lock()
+        self._wb = None
+        self._last = None  # (index, DataFrame)
+        self.names = self._workbook().sheet_names
+        self._dimensions = [None] * len(self.names)
+
+    def __getstate__(self):
+        return {"_raw": self._raw, "names": self.names, "_dimensions": self._dimensions}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _lock=threading.Lock(), _wb=None, _last=None)
+
+    def _workbook(self):
+        # opened once: openpyxl reads the index (and sizes unsized sheets) on every open
+        if self._wb is None:
+            self._wb = LazyWorkbook(self._raw)
+        return self._wb
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = range(len(self))[i]  # negative indexes, IndexError
+        with self._lock:
+            if self._last is not None and self._last[0] == i:
+                return self._last[1]
+            self._last = None  # the previous sheet can be freed before the next one is read
+            df = self._workbook().load_sheet(self.names[i])
+            self._last = (i, df)
+            return df
+
+    @property
+    def nbytes(self):
+        """Bytes held while no sheet is loaded (the document cache sizes entries with it)"""
+        return len(self._raw)
+
+    def dimensions(self, i):
+        """(rows, columns) of sheet i, header row included, without loading it into a DataFrame"""
+        if self._dimensions[i] is None:
+            with self._lock:
+                # files written without dimensions (write-only openpyxl, some exporters) are counted by streaming
+                self._dimensions[i] = self._workbook().dimensions(self.names[i], exact=True)
+        return self._dimensions[i]
+
+    def rows(self, i):
+        """Data rows of sheet i (header excluded)"""
+        recorded = self.dimensions(i)[0]
+        return max(0, recorded - 1) if recorded else len(self[i])
+
+    def columns(self, i):
+        return self.dimensions(i)[1] or self[i].shape[1]
+
+    def preview(self, i, n_rows=10):
+        """First n_rows data rows of sheet i; only those rows are read"""
+        with self._lock:
+            return self._workbook().load_sheet(self.names[i], max_row=n_rows + 1)
@@ -0,0 +1,330 @@
+import bisect
+import datetime as dt
+import os
+import pickle
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+MONTHS = {m: i for i, m in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), start=1)}
+
+PERMIT_RE = re.compile(r"\b\d{2}-\d{5}\b")
+AMOUNT_RE = re.compile(r"\$\s?(\d{1,3}(?:,\d{3})+|\d+)(\.\d+)?")
+DATE_RE = re.compile(
+    r"\b(?P<iso>(?P<iy>\d{4})-(?P<im>\d{1,2})-(?P<id>\d{1,2}))\b"
+    r"|\b(?P<num>(?P<nm>\d{1,2})[/-](?P<nd>\d{1,2})[/-](?P<ny>\d{4}|\d{2}))\b"
+    r"|\b(?P<txt>(?P<tm>jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+(?P<td>\d{1,2})"
+    r"(?:st|nd|rd|th)?(?:\s*(?:[–-]|to)\s*(?P<td2>\d{1,2}))?,?\s+(?P<ty>\d{4}))\b",
+    re.IGNORECASE,
+)
+# words right before a date that say what the date is
+EXPIRES_RE = re.compile(r"(expir\w*|exp\.|valid (?:until|through|thru)|good (?:until|through|thru)|renew\w* by)"
+                        r"[^.\n]{0,25}$", re.IGNORECASE)
+ISSUED_RE = re.compile(r"(issued?\w*|effective|date of issue)[^.\n]{0,25}$", re.IGNORECASE)
+
+
+# ------------------ EXTRACTION ------------------
+def _year(value):
+    year = int(value)
+    return year + 2000 if year < 100 else year
+
+
+def _date_from_match(m):
+    """(start, end) dates of a DATE_RE match; end differs for ranges like 'May 20–26, 2025'"""
+    try:
+        if m.group("iso"):
+            d = dt.date(int(m.group("iy")), int(m.group("im")), int(m.group("id")))
+            return d, d
+        if m.group("num"):
+            d = dt.date(_year(m.group("ny")), int(m.group("nm")), int(m.group("nd")))
+            return d, d
+        month, year = MONTHS[m.group("tm").lower()[:3]], int(m.group("ty"))
+        start = dt.date(year, month, int(m.group("td")))
+        end = dt.date(year, month, int(m.group("td2"))) if m.group("td2") else start
+        return start, end
+    except ValueError:
+        # 2-30, 13/45/2025...
+        return None
+
+
+def _date_kind(before, column=""):
+    # the keyword closest to the date wins ("issued 1/5/2025, expires 12/31/2026")
+    expires, issued = EXPIRES_RE.search(before), ISSUED_RE.search(before)
+    if expires and (not issued or expires.start() > issued.start()):
+        return "expires"
+    if issued:
+        return "issued"
+    if "expir" in column:
+        return "expires"
+    if "issue" in column:
+        return "issued"
+    return "date"
+
+
+def extract_entities(text, location, column=""):
+    """
+    Facets found in one piece of text: permits, amounts, dates (with expires/issued when
+    the preceding words or the column name say so). column is a lowercased table header.
+    """
+    found = []
+    for m in PERMIT_RE.finditer(text):
+        found.append({"kind": "permit", "value": m.group(0), "raw": m.group(0), "location": location})
+    for m in AMOUNT_RE.finditer(text):
+        value = float(m.group(1).replace(",", "") + (m.group(2) or ""))
+        found.append({"kind": "amount", "value": value, "raw": m.group(0), "location": location})
+    for m in DATE_RE.finditer(text):
+        dates = _date_from_match(m)
+        if not dates:
+            continue
+        kind = _date_kind(text[max(0, m.start() - 40):m.start()], column)
+        found.append({"kind": kind, "value": dates[0].isoformat(), "end": dates[1].isoformat(),
+                      "raw": m.group(0), "location": location})
+    return found
+
+
+def _cell_entities(value, location, column):
+    if isinstance(value, (dt.date, dt.datetime, pd.Timestamp)) and not pd.isna(value):
+        day = value.date() if isinstance(value, (dt.datetime, pd.Timestamp)) else value
+        kind = _date_kind("", column)
+        return [{"kind": kind, "value": day.isoformat(), "end": day.isoformat(),
+                 "raw": str(value), "location": location}]
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return []
+    text = str(value)
+    if "$" not in text and not any(ch.isdigit() for ch in text):
+        return []
+    return extract_entities(text, location, column)
+
+
+def _table_entities(df, label):
+    found = []
+    for col in df.columns:
+        column = str(col).lower()
+        for row, value in enumerate(df[col].tolist(), start=1):
+            found.extend(_cell_entities(value, f"{label}, row {row}, column '{col}'", column))
+        # dates in the header itself ("Valid through 1/31/2025")
+        found.extend(extract_entities(str(col), f"{label}, header"))
+    return found
+
+
+def document_entities(doc, name=""):
+    """Every facet of a parsed document (DataFrame or {texto, tablas}) plus its file name"""
+    found = extract_entities(name, "file name") if name else []
+    if isinstance(doc, pd.DataFrame):
+        return found + _table_entities(doc, "table")
+    for n, line in enumerate(doc.get("texto", "").splitlines(), start=1):
+        if line.strip():
+            found.extend(extract_entities(line, f"text line {n}"))
+    hojas = doc.get("hojas")
+    for i, table in enumerate(doc.get("tablas", [])):
+        label = f"sheet '{hojas[i]}'" if hojas else f"table {i + 1}"
+        found.extend(_table_entities(table, label))
+    return found
+
+
+# ------------------ INDEX ------------------
+class FacetIndex:
+    """
+    entity → (file, location, normalized value), kept per file id + modifiedTime and
+    persisted as one pickle, so re-indexing only parses changed files. Lookups use
+    per-kind lists sorted by value (bisect), no Drive or LLM call.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._files = {}  # file_id → {"name", "modifiedTime", "entities"}
+        self._sorted = None
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as fh:
+                self._files = pickle.load(fh)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable facet index {self.path}: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with self._lock:
+            with open(tmp, "wb") as fh:
+                pickle.dump(self._files, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+
+    def __len__(self):
+        return len(self._files)
+
+    def is_current(self, file):
+        entry = self._files.get(file["id"])
+        return bool(entry and file.get("modifiedTime") and entry["modifiedTime"] == file["modifiedTime"])
+
+    def put(self, file, entities):
+        with self._lock:
+            self._files[file["id"]] = {
+                "name": file.get("name", ""), "modifiedTime": file.get("modifiedTime"),
+                "entities": entities,
+            }
+            self._sorted = None
+
+    def update(self, files, load_fn=None, workers=4, verbose=True, pipeline=None):
+        """
+        Index the files that are new or changed; forget files no longer listed.
+        Documents come from load_fn(file) (run in `workers` threads) or from a
+        helpers.pipeline.Pipeline.
+        """
+        stale = [f for f in files if not self.is_current(f)]
+        stats = {"files": len(files), "indexed": 0, "reused": len(files) - len(stale), "failed": 0}
+
+        def add(f, doc):
+            # the name alone often carries the permit number or the expiry date
+            self.put(f, document_entities(doc, f.get("name", "")) if doc is not None
+                     else extract_entities(f.get("name", ""), "file name"))
+            return doc is not None
+
+        def index(f):
+            try:
+                doc = load_fn(f)
+            except Exception as e:
+                if verbose:
+                    print(f"⚠️ Skipping {f.get('name', f['id'])}: {e}")
+                doc = None
+            return add(f, doc)
+
+        if stale:
+            if verbose:
+                print(f"🗂️ Indexing {len(stale)} file(s) ({stats['reused']} unchanged)...")
+            if pipeline is not None:
+                done = []
+                for res in pipeline.run(stale):
+                    if res["error"] and verbose:
+                        print(f"⚠️ Skipping {res['item'].get('name', res['item']['id'])}: {res['error']}")
+                    done.append(add(res["item"], res["doc"]))
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    done = list(pool.map(index, stale))
+            stats["indexed"] = sum(done)
+            stats["failed"] = len(done) - sum(done)
+
+        keep = {f["id"] for f in files}
+        with self._lock:
+            for file_id in set(self._files) - keep:
+                del self._files[file_id]
+            self._sorted = None
+        self.save()
+        return stats
+
+    # --- queries ---
+    def _by_kind(self):
+        with self._lock:
+            if self._sorted is None:
+                by_kind = {}
+                for file_id, entry in self._files.items():
+                    for e in entry["entities"]:
+                        by_kind.setdefault(e["kind"], []).append(
+                            {**e, "file_id": file_id, "name": entry["name"]})
+                for rows in by_kind.values():
+                    rows.sort(key=lambda e: e["value"])
+                self._sorted = {k: ([e["value"] for e in rows], rows) for k, rows in by_kind.items()}
+            return self._sorted
+
+    def query(self, kind, lo=None, hi=None):
+        """Entities of one kind with lo <= value <= hi (ISO strings for dates), sorted by value"""
+        keys, rows = self._by_kind().get(kind, ([], []))
+        start = bisect.bisect_left(keys, lo) if lo is not None else 0
+        end = bisect.bisect_right(keys, hi) if hi is not None else len(keys)
+        return rows[start:end]
+
+    def lookup(self, kind, value):
+        return self.query(kind, value, value)
+
+    def expiring_within(self, days, today=None):
+        """Expiration dates between today and today + days, one hit per file and date"""
+        today = today or dt.date.today()
+        hits = self.query("expires", today.isoformat(), (today + dt.timedelta(days=days)).isoformat())
+        return _dedupe(hits)
+
+    def dates_between(self, start, end):
+        """Any dated entity (expires, issued, plain date) overlapping [start, end]"""
+        hits = []
+        for kind in ("expires", "issued", "date"):
+            # ranges start at most a month before the window in practice
+            lo = (dt.date.fromisoformat(start) - dt.timedelta(days=31)).isoformat()
+            hits.extend(e for e in self.query(kind, lo, end) if e["end"] >= start)
+        return _dedupe(sorted(hits, key=lambda e: e["value"]))
+
+
+def _dedupe(hits):
+    seen, out = set(), []
+    for e in hits:
+        key = (e["file_id"], e["kind"], e["value"])
+        if key not in seen:
+            seen.add(key)
+            out.append(e)
+    return out
+
+
+# ------------------ PROMPT OPTIONS ------------------
+EXPIRING_RE = re.compile(r"expir\w*\s+(?:with)?in\s+(?:the\s+)?(?:next\s+)?(\d+)\s+(day|week|month)s?",
+                         re.IGNORECASE)
+AMOUNT_RANGE_RE = re.compile(
+    r"between\s+\$(?P<lo>[\d,.]+)\s+and\s+\$(?P<hi>[\d,.]+)"
+    r"|(?P<op>over|above|more than|greater than|at least|under|below|less than|at most)\s+\$(?P<v>[\d,.]+)",
+    re.IGNORECASE,
+)
+
+
+def _money(text):
+    return float(text.replace(",", "").rstrip("."))
+
+
+def facet_options(prompt, default_expiry_days=90):
+    """Facet filters a prompt asks for: expiring_days, amount_range, date_range"""
+    options = {}
+    m = EXPIRING_RE.search(prompt)
+    if m:
+        n, unit = int(m.group(1)), m.group(2).lower()
+        options["expiring_days"] = n * {"day": 1, "week": 7, "month": 30}[unit]
+    elif re.search(r"expir\w*\s+soon", prompt, re.IGNORECASE):
+        options["expiring_days"] = default_expiry_days
+
+    m = AMOUNT_RANGE_RE.search(prompt)
+    if m:
+        if m.group("lo"):
+            options["amount_range"] = (_money(m.group("lo")), _money(m.group("hi")))
+        elif m.group("op").lower() in ("over", "above", "more than", "greater than", "at least"):
+            options["amount_range"] = (_money(m.group("v")), None)
+        else:
+            options["amount_range"] = (None, _money(m.group("v")))
+
+    for m in DATE_RE.finditer(prompt):
+        if m.group("td2"):
+            # explicit ranges only ("May 20–26, 2025"); single dates stay full-text searches
+            start, end = _date_from_match(m) or (None, None)
+            if start:
+                options["date_range"] = (start.isoformat(), end.isoformat())
+                break
+    return options
+
+
+def run_facet_query(index, options, today=None):
+    """(title, hits) for the facet filters in options; None when there is nothing to run"""
+    if "expiring_days" in options:
+        days = options["expiring_days"]
+        return f"Expiring in the next {days} days", index.expiring_within(days, today)
+    if "amount_range" in options:
+        lo, hi = options["amount_range"]
+        label = f"${lo:,.2f}" if hi is None else f"${hi:,.2f}" if lo is None else f"${lo:,.2f}–${hi:,.2f}"
+        return f"Amounts {'≥ ' if hi is None else '≤ ' if lo is None else ''}{label}", index.query("amount", lo, hi)
+    if "date_range" in options:
+        start, end = options["date_range"]
+        return f"Dates between {start} and {end}", index.dates_between(start, end)
+    return None
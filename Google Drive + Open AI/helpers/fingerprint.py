@@ -0,0 +1,259 @@
+import os
+import pickle
+import re
+import threading
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+# ------------------ SHINGLES ------------------
+def document_text(doc):
+    """Plain text of a DataFrame or {texto, tablas} document, as used for fingerprinting"""
+    if isinstance(doc, pd.DataFrame):
+        return doc.to_csv(index=False, header=False)
+    parts = [doc.get("texto", "")]
+    parts.extend(t.to_csv(index=False, header=False) for t in doc.get("tablas", []))
+    return "\n".join(parts)
+
+
+def shingles(text, k=5):
+    """Sorted unique uint32 hashes of the k-word shingles (lowercased words only)"""
+    words = _WORD.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint32)
+    if len(words) < k:
+        grams = [" ".join(words)]
+    else:
+        grams = (" ".join(words[i:i + k]) for i in range(len(words) - k + 1))
+    # crc32 is stable across processes (hash() is salted), so signatures can be stored
+    hashes = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint32)
+    return np.unique(hashes)
+
+
+def jaccard(a, b):
+    """Exact Jaccard of two sorted unique shingle arrays"""
+    if not len(a) and not len(b):
+        return 1.0
+    inter = len(np.intersect1d(a, b, assume_unique=True))
+    return inter / (len(a) + len(b) - inter)
+
+
+# ------------------ MINHASH ------------------
+class MinHasher:
+    """num_perm universal hashes (a*x + b mod 2^61-1), evaluated vectorized over the shingles"""
+
+    def __init__(self, num_perm=128, seed=1, block=4096):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.block = block
+        self.a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_hashes):
+        sig = np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        x = shingle_hashes.astype(np.uint64)
+        # blocks keep the (shingles x num_perm) matrix small on long documents
+        for start in range(0, len(x), self.block):
+            chunk = x[start:start + self.block, None]
+            values = ((chunk * self.a + self.b) % _MERSENNE) & _MAX_HASH
+            np.minimum(sig, values.min(axis=0), out=sig)
+        return sig
+
+
+def estimated_jaccard(sig_a, sig_b):
+    return float(np.mean(sig_a == sig_b))
+
+
+# ------------------ LSH ------------------
+def lsh_candidates(signatures, bands=32):
+    """
+    Candidate pairs {(id_a, id_b)} whose signatures collide in at least one band.
+    With r = num_perm / bands rows per band, pairs with Jaccard s are found with
+    probability 1 - (1 - s^r)^bands: ~0.99 at s=0.8 for 128 perms / 32 bands.
+    """
+    buckets = defaultdict(list)
+    for file_id, sig in signatures.items():
+        if not len(sig):
+            continue  # file without text (SignatureStore.put_empty)
+        rows = len(sig) // bands
+        for band in range(bands):
+            buckets[(band, sig[band * rows:(band + 1) * rows].tobytes())].append(file_id)
+
+    pairs = set()
+    for ids in buckets.values():
+        if len(ids) < 2:
+            continue
+        for i, a in enumerate(ids):
+            for b in ids[i + 1:]:
+                pairs.add((a, b) if a < b else (b, a))
+    return pairs
+
+
+def _clusters(pairs):
+    """Connected components (union-find) of the verified duplicate pairs"""
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in pairs:
+        parent[find(a)] = find(b)
+    groups = defaultdict(list)
+    for x in parent:
+        groups[find(x)].append(x)
+    return [sorted(g) for g in groups.values()]
+
+
+# ------------------ SIGNATURE STORE ------------------
+class SignatureStore:
+    """
+    {file_id: (modifiedTime, signature, shingles)} persisted as one pickle, so a
+    rescan only downloads and fingerprints files that changed since the last one.
+    """
+
+    def __init__(self, path=None, num_perm=128, shingle_words=5):
+        self.path = path
+        # signatures made with other parameters are not comparable
+        self.params = (num_perm, shingle_words)
+        self._entries = {}
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as fh:
+                data = pickle.load(fh)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable signature store {self.path}: {e}")
+            return
+        if data.get("params") == self.params:
+            self._entries = data["entries"]
+
+    def get(self, file_id, modified_time):
+        entry = self._entries.get(file_id)
+        if entry and modified_time and entry[0] == modified_time:
+            return entry
+        return None
+
+    def put(self, file_id, modified_time, signature, shingle_hashes):
+        with self._lock:
+            self._entries[file_id] = (modified_time, signature, shingle_hashes)
+
+    def put_empty(self, file_id, modified_time):
+        """
+        Negative entry for a file that can't be fingerprinted (no text: scans, images, empty
+        sheets; or unparseable): reused like any other until the file changes
+        """
+        self.put(file_id, modified_time, np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint32))
+
+    def prune(self, keep_ids):
+        """Forget files that are no longer in the scanned folders"""
+        with self._lock:
+            for file_id in set(self._entries) - set(keep_ids):
+                del self._entries[file_id]
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with self._lock:
+            with open(tmp, "wb") as fh:
+                pickle.dump({"params": self.params, "entries": self._entries}, fh,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# ------------------ CONTENT DUPLICATES ------------------
+def find_content_duplicates(files, load_fn, store, hasher=None, threshold=0.8, bands=32,
+                            shingle_words=5, workers=4, verbose=True, pipeline=None):
+    """
+    Clusters of files whose extracted text is near-identical (Jaccard >= threshold).
+
+    files: Drive file dicts (id, name, modifiedTime); load_fn(file) → parsed document
+    (DataFrame or {texto, tablas}) or None, called from `workers` threads. With a
+    helpers.pipeline.Pipeline the documents are downloaded and parsed by it instead.
+    Only files missing from the store, or changed since, are loaded; files without text
+    or that fail to parse are remembered too (put_empty), download errors are retried. Returns
+    (clusters, stats); each cluster is a list of (file, similarity to the first file).
+    """
+    hasher = hasher or MinHasher(num_perm=store.params[0])
+    by_id = {f["id"]: f for f in files}
+    stale = [f for f in files if store.get(f["id"], f.get("modifiedTime")) is None]
+    stats = {"files": len(files), "fingerprinted": 0, "reused": len(files) - len(stale), "failed": 0}
+
+    def add(f, doc):
+        sh = shingles(document_text(doc), shingle_words) if doc is not None else ()
+        if not len(sh):
+            store.put_empty(f["id"], f.get("modifiedTime"))
+            return False
+        store.put(f["id"], f.get("modifiedTime"), hasher.signature(sh), sh)
+        return True
+
+    def fingerprint(f):
+        try:
+            doc = load_fn(f)
+        except Exception as e:
+            if verbose:
+                print(f"⚠️ Skipping {f.get('name', f['id'])}: {e}")
+            doc = None
+        return add(f, doc)
+
+    if stale:
+        if verbose:
+            print(f"🧬 Fingerprinting {len(stale)} file(s) ({stats['reused']} unchanged)...")
+        if pipeline is not None:
+            done = []
+            for res in pipeline.run(stale):
+                if res["error"] and verbose:
+                    print(f"⚠️ Skipping {res['item'].get('name', res['item']['id'])}: {res['error']}")
+                if res["stage"] == "download":
+                    done.append(False)  # network/permission errors: tried again next scan
+                    continue
+                done.append(add(res["item"], res["doc"]))
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                done = list(pool.map(fingerprint, stale))
+        stats["fingerprinted"] = sum(done)
+        stats["failed"] = len(done) - sum(done)
+
+    store.prune(by_id)
+    store.save()
+
+    entries = {fid: store.get(fid, by_id[fid].get("modifiedTime")) for fid in by_id}
+    entries = {fid: e for fid, e in entries.items() if e is not None and len(e[1])}
+    candidates = lsh_candidates({fid: e[1] for fid, e in entries.items()}, bands=bands)
+    verified = {}
+    for a, b in candidates:
+        score = jaccard(entries[a][2], entries[b][2])
+        if score >= threshold:
+            verified[(a, b)] = score
+    stats.update({"candidates": len(candidates), "verified": len(verified)})
+
+    clusters = []
+    for ids in _clusters(verified):
+        first = ids[0]
+        clusters.append([(by_id[first], 1.0)] + [
+            (by_id[fid], round(verified.get((first, fid)) or jaccard(entries[first][2], entries[fid][2]), 3))
+            for fid in ids[1:]
+        ])
+    clusters.sort(key=len, reverse=True)
+    return clusters, stats
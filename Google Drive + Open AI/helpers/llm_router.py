@@ -0,0 +1,123 @@
+import threading
+from collections import deque
+
+from helpers.mapreduce import estimate_tokens
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def cost_usd(prices, prompt_tokens, cached_tokens, completion_tokens):
+    """Cost of one call (or a sum of calls) with prices per 1M tokens"""
+    uncached = prompt_tokens - cached_tokens
+    return (uncached * prices.get("input", 0)
+            + cached_tokens * prices.get("cached_input", prices.get("input", 0))
+            + completion_tokens * prices.get("output", 0)) / 1_000_000
+
+
+class RouteStats:
+    """
+    Calls, latency and tokens of one route; cost is computed from the route's prices.
+    Only the last max_samples latencies are kept, so p50/p95 describe recent calls.
+    """
+
+    def __init__(self, max_samples=10000):
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self.latencies = deque(maxlen=max_samples)
+        self.ttfts = deque(maxlen=max_samples)
+        self.tasks = {}
+
+    def as_dict(self, route):
+        cost = cost_usd(route.get("prices", {}), self.prompt_tokens, self.cached_tokens, self.completion_tokens)
+        return {
+            "model": route["model"], "calls": self.calls, "errors": self.errors,
+            "tasks": dict(self.tasks),
+            "prompt_tokens": self.prompt_tokens, "cached_tokens": self.cached_tokens,
+            "completion_tokens": self.completion_tokens,
+            # share of the prompt tokens served from OpenAI's prefix cache
+            "cache_hit": round(self.cached_tokens / self.prompt_tokens, 3) if self.prompt_tokens else None,
+            "p50_s": _round(_percentile(self.latencies, 0.5)),
+            "p95_s": _round(_percentile(self.latencies, 0.95)),
+            "ttft_p50_s": _round(_percentile(self.ttfts, 0.5)),
+            "cost_usd": round(cost, 6),
+        }
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+class ModelRouter:
+    """
+    Picks the model for each LLM call and keeps per-route latency/token/cost stats.
+
+    routes: {name: {"model", "prices": {"input", "cached_input", "output"} per 1M tokens}}
+    task_routes: {task: route name} for analyze / map / reduce / compare
+    Any prompt above long_context_tokens goes to long_context_route, whatever the task.
+    max_samples bounds the latencies kept per route (a server runs for days).
+    """
+
+    def __init__(self, routes, task_routes, long_context_tokens=None, long_context_route=None,
+                 default_route=None, max_samples=10000):
+        self.routes = routes
+        self.task_routes = task_routes
+        self.long_context_tokens = long_context_tokens
+        self.long_context_route = long_context_route
+        self.default_route = default_route or next(iter(routes))
+        self.max_samples = max_samples
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def route(self, task, messages):
+        """Route name for a task and its messages (list of {"role", "content"})"""
+        name = self.task_routes.get(task, self.default_route)
+        if self.long_context_tokens and self.long_context_route:
+            tokens = sum(estimate_tokens(m["content"]) for m in messages)
+            if tokens > self.long_context_tokens:
+                name = self.long_context_route
+        return name
+
+    def model(self, route):
+        return self.routes[route]["model"]
+
+    def record(self, route, task, latency_s, prompt_tokens=0, completion_tokens=0, cached_tokens=0,
+               ttft_s=None, error=False):
+        with self._lock:
+            st = self._stats.get(route) or self._stats.setdefault(route, RouteStats(self.max_samples))
+            st.calls += 1
+            st.errors += int(error)
+            st.tasks[task] = st.tasks.get(task, 0) + 1
+            st.prompt_tokens += prompt_tokens
+            st.cached_tokens += cached_tokens
+            st.completion_tokens += completion_tokens
+            st.latencies.append(latency_s)
+            if ttft_s is not None:
+                st.ttfts.append(ttft_s)
+
+    def report(self):
+        with self._lock:
+            return {name: st.as_dict(self.routes[name]) for name, st in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def print_report(self):
+        report = self.report()
+        if not report:
+            return
+        print("\n🧭 LLM routes:")
+        print(f"   {'route':<8}{'model':<16}{'calls':>6}{'p50 s':>8}{'p95 s':>8}{'ttft s':>8}"
+              f"{'in tok':>9}{'cached':>8}{'out tok':>9}{'USD':>10}")
+        for name, r in report.items():
+            print(f"   {name:<8}{r['model']:<16}{r['calls']:>6}{r['p50_s'] or 0:>8}{r['p95_s'] or 0:>8}"
+                  f"{r['ttft_p50_s'] or 0:>8}{r['prompt_tokens']:>9}{r['cache_hit'] or 0:>8.0%}"
+                  f"{r['completion_tokens']:>9}{r['cost_usd']:>10.4f}")
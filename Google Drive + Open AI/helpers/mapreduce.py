@@ -0,0 +1,175 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from helpers.excel import LazySheets
+
+NO_INFO = "NO_RELEVANT_INFO"
+
+
+def estimate_tokens(text):
+    # ~4 characters per token (English/Spanish prose and CSV)
+    return len(text) // 4 + 1
+
+
+# ------------------ CHUNKING ------------------
+def _table_lines(df, rows_per_block=500):
+    """CSV lines of a DataFrame, serialized block by block to avoid one huge string"""
+    for start in range(0, len(df), rows_per_block):
+        block = df.iloc[start:start + rows_per_block].to_csv(index=False, header=False)
+        yield from block.splitlines()
+
+
+def _pack(lines, max_tokens, header=""):
+    """Greedy packing of lines into chunks of at most max_tokens (header repeated in each)"""
+    budget = max_tokens - estimate_tokens(header)
+    chunk, used = [], 0
+    for line in lines:
+        cost = estimate_tokens(line)
+        if chunk and used + cost > budget:
+            yield header + "\n".join(chunk)
+            chunk, used = [], 0
+        if cost > budget:
+            # a single huge paragraph/row: hard-split it
+            step = max(1, budget * 4)
+            for i in range(0, len(line), step):
+                yield header + line[i:i + step]
+            continue
+        chunk.append(line)
+        used += cost
+    if chunk:
+        yield header + "\n".join(chunk)
+
+
+def split_document(doc, max_tokens=3000):
+    """
+    Token-bounded text chunks of a DataFrame or {texto, tablas} document.
+    Tables keep their header row in every chunk so each chunk is self-describing.
+    """
+    if isinstance(doc, pd.DataFrame):
+        header = "CSV columns: " + ",".join(str(col) for col in doc.columns) + "\n"
+        return list(_pack(_table_lines(doc), max_tokens, header))
+
+    chunks = []
+    text_lines = [line for line in doc.get("texto", "").splitlines() if line.strip()]
+    chunks.extend(_pack(text_lines, max_tokens, "Document text:\n"))
+    hojas = doc.get("hojas")
+    for i, table in enumerate(doc.get("tablas", []), start=1):
+        label = f"Sheet '{hojas[i - 1]}'" if hojas else f"Table {i}"
+        header = f"{label}, columns: " + ",".join(str(col) for col in table.columns) + "\n"
+        chunks.extend(_pack(_table_lines(table), max_tokens, header))
+    return chunks
+
+
+def document_tokens(doc, rows=None):
+    """
+    Cheap size estimate used to choose between the preview prompt and map-reduce.
+    rows: row count of the whole table when doc is only its first rows.
+    """
+    if isinstance(doc, pd.DataFrame):
+        rows = len(doc) if rows is None else rows
+        sample = doc.head(200).to_csv(index=False)
+        per_row = len(sample) / max(1, min(len(doc), 200))
+        return int(per_row * rows / 4)
+    total = len(doc.get("texto", "")) // 4
+    tablas = doc.get("tablas", [])
+    if isinstance(tablas, LazySheets):
+        # estimated from a preview and the recorded dimensions, without reading the sheets
+        return total + sum(document_tokens(tablas.preview(i, 200), tablas.rows(i)) for i in range(len(tablas)))
+    for table in tablas:
+        total += document_tokens(table)
+    return total
+
+
+# ------------------ CHUNK RESULT CACHE ------------------
+class ChunkCache:
+    """
+    LRU of map answers keyed by hash(model, question, chunk). A map answer is the answer to
+    the question on that chunk (there is no question-independent pass), so the question is
+    part of the key: asking it again reuses every chunk whose text did not change, e.g.
+    after the file was edited, and a different question maps the chunks again.
+    """
+
+    def __init__(self, max_items=4096):
+        self.max_items = max_items
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(*parts):
+        h = hashlib.sha1()
+        for part in parts:
+            h.update(part.encode("utf-8", "replace"))
+            h.update(b"\x00")
+        return h.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+
+# ------------------ MAP-REDUCE ------------------
+def map_reduce(chunks, question, map_fn, reduce_fn, cache=None, cache_tag="",
+               max_workers=4, max_reduce_tokens=3000, final_reduce_fn=None):
+    """
+    map_fn(chunk, question, index, total) -> partial answer (or NO_INFO)
+    reduce_fn(partials, question) -> combined answer
+    final_reduce_fn: used for the last reduce only (e.g. a streaming call); defaults to reduce_fn
+    Map calls run concurrently (max_workers); partials that don't fit in one reduce
+    prompt are reduced in groups, round after round, until they fit in one.
+    map_fn/reduce_fn run in pool threads: callers bind any per-thread context themselves.
+    """
+    total = len(chunks)
+
+    def run_map(args):
+        index, chunk = args
+        key = ChunkCache.key(cache_tag, question.strip().lower(), chunk) if cache else None
+        if key:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        answer = map_fn(chunk, question, index, total)
+        if key:
+            cache.put(key, answer)
+        return answer
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        partials = list(pool.map(run_map, enumerate(chunks, start=1)))
+
+    partials = [
+        f"[Part {i}/{total}] {p.strip()}" for i, p in enumerate(partials, start=1)
+        if p and NO_INFO not in p
+    ]
+    if not partials:
+        return "The document does not contain information relevant to this question."
+    if total == 1:
+        return partials[0].split("] ", 1)[1]
+
+    # intermediate rounds until what is left fits in one reduce prompt
+    while len(partials) > 1:
+        groups = list(_pack(partials, max_reduce_tokens))
+        if len(groups) == 1:
+            break
+        if len(groups) >= len(partials):
+            # partials too long to share a prompt: pair them so every round shrinks the list
+            groups = ["\n".join(partials[i:i + 2]) for i in range(0, len(partials), 2)]
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            partials = list(pool.map(lambda g: reduce_fn(g, question), groups))
+    return (final_reduce_fn or reduce_fn)("\n".join(partials), question)
@@ -0,0 +1,312 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import helpers.analyzer as analyzer
+
+STOP = object()
+
+
+# ------------------ PARSE WORKER (runs in the process pool) ------------------
+def _parse_worker(payload):
+    """
+    payload: ("bytes", raw) or ("shm", name, size). Large files travel through shared
+    memory so the parent doesn't pickle and pipe megabytes of raw content.
+    """
+    if payload[0] == "shm":
+        shm = shared_memory.SharedMemory(name=payload[1])
+        try:
+            raw = bytes(shm.buf[:payload[2]])
+        finally:
+            shm.close()
+    else:
+        raw = payload[1]
+    return analyzer.parse_file_bytes(raw, verbose=False)
+
+
+# ------------------ METRICS ------------------
+class StageStats:
+    """Per-stage counters: busy = time doing work, blocked = time waiting on a full downstream queue"""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.errors = 0
+        self.busy_s = 0.0
+        self.blocked_s = 0.0
+        self.bytes = 0
+        self.queue_peak = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, error=False, n_bytes=0):
+        with self._lock:
+            self.items += 1
+            self.errors += int(error)
+            self.busy_s += seconds
+            self.bytes += n_bytes
+
+    def blocked(self, seconds, queue_size):
+        with self._lock:
+            self.blocked_s += seconds
+            self.queue_peak = max(self.queue_peak, queue_size)
+
+    def as_dict(self, wall_s):
+        return {
+            "workers": self.workers, "items": self.items, "errors": self.errors,
+            "busy_s": round(self.busy_s, 3), "blocked_s": round(self.blocked_s, 3),
+            # share of the stage's worker capacity that was used
+            "utilization": round(self.busy_s / (wall_s * self.workers), 3) if wall_s and self.workers else None,
+            "items_per_s": round(self.items / wall_s, 2) if wall_s else None,
+            "mb": round(self.bytes / 1024 / 1024, 2),
+            "queue_peak": self.queue_peak,
+        }
+
+
+# ------------------ PIPELINE ------------------
+class Pipeline:
+    """
+    download (I/O threads) → parse (process pool) → LLM (asyncio) with bounded queues
+    between stages: when parsing falls behind, downloads wait instead of piling raw
+    bytes in memory, and the same for LLM calls behind parsing.
+
+    - service must be safe to use from several threads (ThreadLocalDriveService, or a
+      helpers.storage.Storage over one / over local roots only); with a plain client,
+      use download_workers=1
+    - parse_workers=0 parses in threads (no process pool), e.g. when spawning is not possible;
+      jobs of fewer than pool_min_items files are also parsed in threads: each spawned
+      worker re-imports pandas/pdfplumber/openai, which costs more than parsing a few files
+    - results go through analyzer.document_cache like download_file_as_dataframe
+    - llm_fn(item, doc) → answer may be a plain function (run in a thread) or a coroutine function
+    """
+
+    def __init__(self, service, download_workers=8, parse_workers=None, llm_concurrency=4,
+                 queue_size=8, shm_threshold=1024 * 1024, pool_min_items=8):
+        self.service = service
+        self.download_workers = download_workers
+        self.parse_workers = (os.cpu_count() or 1) if parse_workers is None else parse_workers
+        self.llm_concurrency = llm_concurrency
+        self.queue_size = queue_size
+        self.shm_threshold = shm_threshold
+        self.pool_min_items = pool_min_items
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.last_metrics = None
+
+    # --- process pool ---
+    def _process_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: forking a process that already runs threads can deadlock
+                self._pool = ProcessPoolExecutor(max_workers=self.parse_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _parse(self, raw, in_pool=True):
+        if not (self.parse_workers and in_pool):
+            return analyzer.parse_file_bytes(raw, verbose=False)
+        pool = self._process_pool()
+        if len(raw) < self.shm_threshold:
+            return pool.submit(_parse_worker, ("bytes", raw)).result()
+        shm = shared_memory.SharedMemory(create=True, size=len(raw))
+        try:
+            shm.buf[:len(raw)] = raw
+            return pool.submit(_parse_worker, ("shm", shm.name, len(raw))).result()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    # --- run ---
+    def run(self, items, llm_fn=None):
+        """
+        Generator of results in completion order:
+        {"item", "doc", "answer", "error", "stage"} (stage = where it failed, if it did).
+        Closing the generator early cancels the pending work.
+        """
+        items = list(items)
+        # a few files (e.g. compare): parsing in threads beats starting the process pool
+        in_pool = bool(self.parse_workers) and len(items) >= self.pool_min_items
+        parse_threads = self.parse_workers if in_pool else max(1, min(self.parse_workers, len(items)))
+        stats = {
+            "download": StageStats("download", self.download_workers),
+            "parse": StageStats("parse", parse_threads),
+        }
+        if llm_fn:
+            stats["llm"] = StageStats("llm", self.llm_concurrency)
+        cancel = threading.Event()
+        todo = queue.Queue()
+        for item in items:
+            todo.put(item)
+        parse_q = queue.Queue(self.queue_size)
+        llm_q = queue.Queue(self.queue_size) if llm_fn else None
+        out_q = queue.Queue()
+        after_parse = llm_q or out_q
+
+        def put(q, value, st):
+            start = time.perf_counter()
+            while not cancel.is_set():
+                try:
+                    q.put(value, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            st.blocked(time.perf_counter() - start, q.qsize())
+
+        def result(item, doc=None, error=None, stage=None):
+            return {"item": item, "doc": doc, "answer": None, "error": error, "stage": stage}
+
+        def downloader():
+            st = stats["download"]
+            while not cancel.is_set():
+                try:
+                    item = todo.get_nowait()
+                except queue.Empty:
+                    return
+                start = time.perf_counter()
+                try:
+                    mime, modified = item.get("mimeType"), item.get("modifiedTime")
+                    doc = analyzer.document_cache.get(item["id"], modified)
+                    if doc is None and analyzer.is_google_native(mime):
+                        # exports come back already parsed
+                        doc = analyzer.export_google_file(self.service, item["id"], mime, verbose=False)
+                        analyzer.document_cache.put(item["id"], modified, doc)
+                    if doc is not None:
+                        st.record(time.perf_counter() - start)
+                        put(after_parse, result(item, doc), st)
+                        continue
+                    raw = analyzer.download_file_bytes(self.service, item["id"])
+                except Exception as e:
+                    st.record(time.perf_counter() - start, error=True)
+                    out_q.put(result(item, error=f"{type(e).__name__}: {e}", stage="download"))
+                    continue
+                st.record(time.perf_counter() - start, n_bytes=len(raw))
+                put(parse_q, (item, raw), st)
+
+        def parser():
+            st = stats["parse"]
+            while True:
+                job = parse_q.get()
+                if job is STOP or cancel.is_set():
+                    return
+                item, raw = job
+                start = time.perf_counter()
+                try:
+                    doc = self._parse(raw, in_pool)
+                    analyzer.document_cache.put(item["id"], item.get("modifiedTime"), doc)
+                except Exception as e:
+                    st.record(time.perf_counter() - start, error=True, n_bytes=len(raw))
+                    out_q.put(result(item, error=f"{type(e).__name__}: {e}", stage="parse"))
+                    continue
+                st.record(time.perf_counter() - start, n_bytes=len(raw))
+                put(after_parse, result(item, doc), st)
+
+        async def llm_loop():
+            st = stats["llm"]
+            loop = asyncio.get_running_loop()
+            sem = asyncio.Semaphore(self.llm_concurrency)
+            is_coroutine = asyncio.iscoroutinefunction(llm_fn)
+            tasks = set()
+
+            async def call(res):
+                start = time.perf_counter()
+                try:
+                    if is_coroutine:
+                        res["answer"] = await llm_fn(res["item"], res["doc"])
+                    else:
+                        res["answer"] = await loop.run_in_executor(calls, llm_fn, res["item"], res["doc"])
+                    st.record(time.perf_counter() - start)
+                except Exception as e:
+                    res.update(error=f"{type(e).__name__}: {e}", stage="llm")
+                    st.record(time.perf_counter() - start, error=True)
+                finally:
+                    sem.release()
+                out_q.put(res)
+
+            with ThreadPoolExecutor(max_workers=self.llm_concurrency + 1) as calls:
+                while True:
+                    # only take the next document when a call slot is free (backpressure)
+                    await sem.acquire()
+                    res = await loop.run_in_executor(calls, llm_q.get)
+                    if res is STOP or cancel.is_set():
+                        sem.release()
+                        break
+                    task = asyncio.create_task(call(res))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                if tasks:
+                    await asyncio.gather(*tasks)
+
+        def supervise():
+            # each stage is told to stop once the previous one has drained
+            for t in downloaders:
+                t.join()
+            for _ in parsers:
+                put(parse_q, STOP, stats["parse"])
+            for t in parsers:
+                t.join()
+            if llm_fn:
+                put(llm_q, STOP, stats["llm"])
+                llm_thread.join()
+            out_q.put(STOP)
+
+        downloaders = [threading.Thread(target=downloader, daemon=True) for _ in range(self.download_workers)]
+        parsers = [threading.Thread(target=parser, daemon=True) for _ in range(parse_threads)]
+        llm_thread = threading.Thread(target=lambda: asyncio.run(llm_loop()), daemon=True) if llm_fn else None
+        threads = downloaders + parsers + ([llm_thread] if llm_thread else [])
+        wall_start = time.perf_counter()
+        for t in threads:
+            t.start()
+        supervisor = threading.Thread(target=supervise, daemon=True)
+        supervisor.start()
+
+        try:
+            while True:
+                res = out_q.get()
+                if res is STOP:
+                    break
+                yield res
+        finally:
+            cancel.set()
+            # unblock stages waiting on a queue
+            for q, n in ((parse_q, len(parsers)), (llm_q, 1)):
+                for _ in range(n if q is not None else 0):
+                    try:
+                        q.put_nowait(STOP)
+                    except queue.Full:
+                        pass
+            wall = time.perf_counter() - wall_start
+            self.last_metrics = {"wall_s": round(wall, 3), "items": len(items),
+                                 "stages": {name: s.as_dict(wall) for name, s in stats.items()}}
+
+    def documents(self, items):
+        """{file_id: doc or None}, failures reported on stdout"""
+        docs = {}
+        for res in self.run(items):
+            if res["error"]:
+                print(f"⚠️ {res['item'].get('name', res['item']['id'])}: {res['error']} ({res['stage']})")
+            docs[res["item"]["id"]] = res["doc"]
+        return docs
+
+    def metrics(self):
+        return self.last_metrics
+
+    def print_metrics(self):
+        m = self.last_metrics
+        if not m:
+            return
+        print(f"\n⚙️ Pipeline: {m['items']} item(s) in {m['wall_s']} s")
+        print(f"   {'stage':<10}{'workers':>8}{'items':>7}{'errors':>7}{'busy s':>9}{'blocked s':>10}{'util':>7}{'MB':>8}")
+        for name, s in m["stages"].items():
+            print(f"   {name:<10}{s['workers']:>8}{s['items']:>7}{s['errors']:>7}{s['busy_s']:>9}"
+                  f"{s['blocked_s']:>10}{s['utilization'] or 0:>7}{s['mb']:>8}")
@@ -0,0 +1,90 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers.analyzer import download_file_as_dataframe
+
+
+class PrefetchCancelled(Exception):
+    pass
+
+
+class Prefetcher:
+    """
+    Downloads and parses the top-K search results in the background while the user
+    reads the list, so `analyze 1` / `compare 1 2` only wait for the LLM.
+
+    - top_k: how many results to prefetch
+    - max_file_bytes: skip results bigger than this (by Drive `size`)
+    - max_bytes: memory cap, total raw bytes kept per search
+    - bandwidth: optional bytes/s limit per download
+    A new start() (new search) or cancel() aborts downloads at the next chunk.
+    """
+
+    def __init__(self, service, top_k=2, max_file_bytes=20 * 1024 * 1024,
+                 max_bytes=50 * 1024 * 1024, bandwidth=None, workers=2, chunksize=1024 * 1024):
+        self.service = service
+        self.top_k = top_k
+        self.max_file_bytes = max_file_bytes
+        self.max_bytes = max_bytes
+        self.bandwidth = bandwidth
+        self.chunksize = chunksize
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._futures = {}
+
+    def start(self, items):
+        """Cancel the previous search's work and prefetch the first top_k items"""
+        self.cancel()
+        cancel = self._cancel
+        budget = self.max_bytes
+        with self._lock:
+            for item in items[:self.top_k]:
+                size = int(item.get("size", 0) or 0)
+                if size > self.max_file_bytes or size > budget:
+                    continue
+                budget -= size
+                self._futures[item["id"]] = self.executor.submit(self._fetch, item, cancel)
+
+    def cancel(self):
+        with self._lock:
+            self._cancel.set()
+            self._cancel = threading.Event()
+            for future in self._futures.values():
+                future.cancel()
+            self._futures = {}
+
+    def get(self, file_id, timeout=None):
+        """
+        Prefetched document for file_id, waiting if it is still being fetched.
+        Returns None if it was not prefetched or failed (caller downloads as usual).
+        """
+        with self._lock:
+            future = self._futures.get(file_id)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            return None
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False)
+
+    def _fetch(self, item, cancel):
+        file_id = item["id"]
+        start = time.monotonic()
+
+        def on_chunk(n_bytes):
+            if cancel.is_set():
+                raise PrefetchCancelled(file_id)
+            if self.bandwidth:
+                ahead = n_bytes / self.bandwidth - (time.monotonic() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+        return download_file_as_dataframe(self.service, file_id, mime_type=item.get("mimeType"),
+                                          modified_time=item.get("modifiedTime"),
+                                          on_chunk=on_chunk, chunksize=self.chunksize, verbose=False)
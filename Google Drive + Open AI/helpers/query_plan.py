@@ -0,0 +1,331 @@
+import json
+import re
+
+import pandas as pd
+
+FILTER_OPS = {"==", "!=", ">", ">=", "<", "<=", "in", "not_in", "between", "contains", "startswith",
+              "isnull", "notnull"}
+AGG_FUNCS = {"sum", "mean", "median", "min", "max", "count", "nunique"}
+NUMERIC_FUNCS = {"sum", "mean", "median", "min", "max"}
+PLAN_KEYS = {"table", "filters", "group_by", "aggregations", "sort", "limit", "select"}
+MAX_LIMIT = 1000
+
+_NUMBER_JUNK = re.compile(r"[$€£,%\s]")
+
+
+class PlanError(ValueError):
+    """The model's plan can't be run on this table (unknown column, operator, etc.)"""
+
+
+# ------------------ SCHEMA ------------------
+def _numeric(series):
+    """Numbers, also from text like '$1,200.50' or '35%' (spreadsheets exported as text)"""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series
+    cleaned = series.astype("string").str.replace(_NUMBER_JUNK, "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce")
+
+
+def _dates(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    # dates repeat a lot (one per day): parse each distinct value once
+    text = series.astype("string")
+    uniques = text.dropna().unique()
+    parsed = pd.to_datetime(pd.Series(uniques, dtype="string"), errors="coerce", format="mixed")
+    return pd.to_datetime(text.map(dict(zip(uniques, parsed))))
+
+
+def _mostly(converted, original, share=0.8):
+    present = original.notna().sum()
+    return present > 0 and converted.notna().sum() >= share * present
+
+
+def column_stats(series, max_values=8):
+    """Type and summary of one column, small enough for a prompt whatever the row count"""
+    stats = {"nulls": int(series.isna().sum())}
+    values = series.dropna()
+    # the type is guessed on a sample; only the chosen conversion runs over the whole column
+    sample = values.head(1000)
+    if len(sample) and _mostly(_numeric(sample), sample):
+        numbers = _numeric(values)
+        stats.update(type="number", min=_py(numbers.min()), max=_py(numbers.max()),
+                     mean=round(float(numbers.mean()), 4))
+        return stats
+    if len(sample) and not pd.api.types.is_numeric_dtype(sample) and _mostly(_dates(sample), sample):
+        dates = _dates(values)
+        stats.update(type="date", min=str(dates.min().date()), max=str(dates.max().date()))
+        return stats
+    text = values.astype(str)
+    top = text.value_counts().head(max_values)
+    stats.update(type="text", distinct=int(text.nunique()), top_values=list(top.index))
+    return stats
+
+
+def _py(value):
+    value = value.item() if hasattr(value, "item") else value
+    return round(value, 4) if isinstance(value, float) else value
+
+
+def _table_names(df_or_doc):
+    """Names of the tables of a DataFrame or a parsed workbook/document"""
+    if isinstance(df_or_doc, pd.DataFrame):
+        return ["data"]
+    tablas = df_or_doc.get("tablas", [])
+    return list(df_or_doc.get("hojas") or [f"Table {i}" for i in range(1, len(tablas) + 1)])
+
+
+def _table(df_or_doc, name):
+    """One table by name; sheets of a lazy workbook (helpers.excel.LazySheets) are read here"""
+    if isinstance(df_or_doc, pd.DataFrame):
+        return df_or_doc
+    return df_or_doc["tablas"][_table_names(df_or_doc).index(name)]
+
+
+def schema_summary(df_or_doc, max_values=8):
+    """What the planner sees: per table its row count and per-column stats, never the rows"""
+    summary = {}
+    for name in _table_names(df_or_doc):
+        # one table at a time: a lazy workbook never has every sheet loaded together
+        df = _table(df_or_doc, name)
+        summary[name] = {"rows": len(df),
+                         "columns": {str(col): column_stats(df[col], max_values) for col in df.columns}}
+    return summary
+
+
+# ------------------ VALIDATION ------------------
+def parse_plan(text):
+    """The JSON object in the model's reply (code fences and surrounding prose are ignored)"""
+    if not text:
+        raise PlanError("Empty plan")
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise PlanError("No JSON object in the reply")
+    try:
+        return json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise PlanError(f"Invalid JSON: {e}") from None
+
+
+def _column(df, name):
+    for col in df.columns:
+        if str(col) == str(name):
+            return col
+    lowered = str(name).strip().lower()
+    for col in df.columns:
+        if str(col).strip().lower() == lowered:
+            return col
+    raise PlanError(f"Unknown column '{name}'")
+
+
+def _section(plan, key, entry_types):
+    """A list section of the plan whose entries are all of entry_types ([] when absent)"""
+    entries = plan.get(key)
+    if entries is None:
+        return []
+    if not isinstance(entries, list):
+        raise PlanError(f"'{key}' must be a list")
+    for entry in entries:
+        if not isinstance(entry, entry_types):
+            raise PlanError(f"Invalid entry in '{key}': {entry!r}")
+    return entries
+
+
+def validate_plan(plan, df_or_doc):
+    """
+    Normalized copy of the plan with real column labels, or PlanError. The plan is
+    plain data (no expressions), so nothing the model writes is ever evaluated.
+    """
+    if not isinstance(plan, dict):
+        raise PlanError("The plan must be a JSON object")
+    unknown = set(plan) - PLAN_KEYS
+    if unknown:
+        raise PlanError(f"Unknown plan keys: {sorted(unknown)}")
+    tables = _table_names(df_or_doc)
+    table = plan.get("table") or next(iter(tables), None)
+    if table not in tables:
+        raise PlanError(f"Unknown table '{table}'")
+    df = _table(df_or_doc, table)
+
+    filters = []
+    for f in _section(plan, "filters", dict):
+        op = f.get("op")
+        if op not in FILTER_OPS:
+            raise PlanError(f"Unknown filter op '{op}'")
+        value = f.get("value")
+        if op in ("in", "not_in") and not isinstance(value, list):
+            value = [value]
+        if op == "between" and not (isinstance(value, list) and len(value) == 2):
+            raise PlanError("'between' needs [low, high]")
+        if op not in ("isnull", "notnull") and value is None:
+            raise PlanError(f"Filter on '{f.get('column')}' has no value")
+        filters.append({"column": _column(df, f.get("column")), "op": op, "value": value})
+
+    group_by = [_column(df, col) for col in _section(plan, "group_by", (str, int, float))]
+
+    aggregations = []
+    for a in _section(plan, "aggregations", dict):
+        func = a.get("func")
+        if func not in AGG_FUNCS:
+            raise PlanError(f"Unknown aggregation '{func}'")
+        col = a.get("column") or "*"
+        if col == "*" and func != "count":
+            raise PlanError(f"'{func}' needs a column")
+        col = col if col == "*" else _column(df, col)
+        aggregations.append({"column": col, "func": func,
+                             "as": str(a.get("as") or (f"{func}_{col}" if col != "*" else "count"))})
+    if group_by and not aggregations:
+        aggregations.append({"column": "*", "func": "count", "as": "count"})
+
+    outputs = [str(g) for g in group_by] + [a["as"] for a in aggregations]
+    if len(set(outputs)) < len(outputs):
+        raise PlanError(f"Result column names collide: {outputs}")
+    select = [_column(df, col) for col in _section(plan, "select", (str, int, float))] if not aggregations else []
+    sort = []
+    for s in _section(plan, "sort", (dict, str)):
+        s = {"column": s} if isinstance(s, str) else s
+        name = s.get("column")
+        col = name if name in outputs else _column(df, name) if not aggregations else None
+        if col is None:
+            raise PlanError(f"Can't sort by '{name}': it is not in the result")
+        sort.append({"column": col, "desc": bool(s.get("desc"))})
+
+    limit = plan.get("limit")
+    if limit is not None:
+        if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+            raise PlanError("'limit' must be a positive integer")
+        limit = min(limit, MAX_LIMIT)
+
+    return {"table": table, "filters": filters, "group_by": group_by, "aggregations": aggregations,
+            "sort": sort, "limit": limit, "select": select}
+
+
+# ------------------ EXECUTION ------------------
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _comparable(series, value):
+    """Column and value converted to a common type: number, date or lowercase text"""
+    values = value if isinstance(value, list) else [value]
+    if all(_is_number(v) for v in values):
+        return _numeric(series), value
+    if all(isinstance(v, str) for v in values):
+        numbers = pd.to_numeric(pd.Series([_NUMBER_JUNK.sub("", v) for v in values]), errors="coerce")
+        if numbers.notna().all() and _mostly(_numeric(series.head(1000)), series.head(1000)):
+            converted = numbers.tolist()
+            return _numeric(series), converted if isinstance(value, list) else converted[0]
+        dates = pd.to_datetime(pd.Series(values), errors="coerce", format="mixed")
+        if dates.notna().all() and not pd.api.types.is_numeric_dtype(series):
+            col = _dates(series)
+            if _mostly(col, series):
+                converted = list(dates)
+                return col, converted if isinstance(value, list) else converted[0]
+    lowered = [str(v).strip().lower() for v in values]
+    return series.astype("string").str.strip().str.lower(), lowered if isinstance(value, list) else lowered[0]
+
+
+def _mask(df, f):
+    series, op, value = df[f["column"]], f["op"], f["value"]
+    if op == "isnull":
+        return series.isna()
+    if op == "notnull":
+        return series.notna()
+    if op in ("contains", "startswith"):
+        text = series.astype("string").str.lower()
+        needle = str(value).lower()
+        hit = text.str.contains(needle, regex=False) if op == "contains" else text.str.startswith(needle)
+        return hit.fillna(False).astype(bool)
+    col, value = _comparable(series, value)
+    if op == "in":
+        return col.isin(value).fillna(False).astype(bool)
+    if op == "not_in":
+        return (~col.isin(value)).fillna(False).astype(bool)
+    if op == "between":
+        return col.between(value[0], value[1]).fillna(False).astype(bool)
+    compare = {"==": col.eq, "!=": col.ne, ">": col.gt, ">=": col.ge, "<": col.lt, "<=": col.le}[op]
+    return compare(value).fillna(False).astype(bool)
+
+
+def _agg_input(series, func):
+    if func not in NUMERIC_FUNCS:
+        return series
+    numbers = _numeric(series)
+    if func in ("min", "max") and not _mostly(numbers, series.dropna()):
+        # min/max also make sense for dates
+        dates = _dates(series)
+        return dates if _mostly(dates, series.dropna()) else series
+    return numbers
+
+
+def _sort_key(series):
+    """Sort order of a column: text numbers and dates by value, as in filters ('$300' < '$1,200')"""
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    sample = series.dropna().head(1000)
+    if len(sample) and _mostly(_numeric(sample), sample):
+        return _numeric(series)
+    if len(sample) and _mostly(_dates(sample), sample):
+        return _dates(series)
+    return series
+
+
+def execute_plan(plan, df_or_doc):
+    """
+    Runs a validated plan over the whole table with vectorized pandas.
+    Returns (result DataFrame, {"table", "rows", "matched"}).
+    """
+    df = _table(df_or_doc, plan["table"])
+    mask = pd.Series(True, index=df.index)
+    for f in plan["filters"]:
+        mask &= _mask(df, f)
+    filtered = df[mask]
+    info = {"table": plan["table"], "rows": len(df), "matched": int(mask.sum())}
+
+    aggs = plan["aggregations"]
+    if aggs:
+        work = pd.DataFrame({str(g): filtered[g] for g in plan["group_by"]}, index=filtered.index)
+        named = {}
+        for i, a in enumerate(aggs):
+            if a["column"] == "*":
+                named[a["as"]] = ("__one", "size")
+                work["__one"] = 1
+            else:
+                key = f"__agg{i}"
+                work[key] = _agg_input(filtered[a["column"]], a["func"])
+                named[a["as"]] = (key, a["func"])
+        if plan["group_by"]:
+            result = work.groupby([str(g) for g in plan["group_by"]], dropna=False, sort=False).agg(**named)
+            result = result.reset_index()
+        else:
+            row = {}
+            for name, (key, func) in named.items():
+                row[name] = len(work) if func == "size" else work[key].agg(func)
+            result = pd.DataFrame([row])
+    else:
+        result = filtered[plan["select"]] if plan["select"] else filtered
+
+    if plan["sort"]:
+        by = [str(s["column"]) if aggs else s["column"] for s in plan["sort"]]
+        result = result.sort_values(by, ascending=[not s["desc"] for s in plan["sort"]], kind="stable",
+                                    key=_sort_key)
+    if plan["limit"]:
+        result = result.head(plan["limit"])
+    return result, info
+
+
+def describe_plan(plan):
+    """One-line human readable plan, shown to the user and to the phrasing call"""
+    parts = [f"table '{plan['table']}'"]
+    for f in plan["filters"]:
+        value = "" if f["op"] in ("isnull", "notnull") else f" {f['value']}"
+        parts.append(f"where {f['column']} {f['op']}{value}")
+    if plan["group_by"]:
+        parts.append("group by " + ", ".join(str(g) for g in plan["group_by"]))
+    if plan["aggregations"]:
+        parts.append(", ".join(f"{a['func']}({a['column']}) as {a['as']}" for a in plan["aggregations"]))
+    if plan["sort"]:
+        parts.append("sort by " + ", ".join(f"{s['column']}{' desc' if s['desc'] else ''}" for s in plan["sort"]))
+    if plan["limit"]:
+        parts.append(f"limit {plan['limit']}")
+    return "; ".join(parts)
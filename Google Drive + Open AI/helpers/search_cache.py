@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class SearchCache:
+    """
+    Search + ranking results keyed by the final Drive `q` string (and options), kept
+    while Drive reports no change.
+
+    Instead of re-running files().list, changes.getStartPageToken (one tiny call) is
+    polled: the token only moves when something in Drive changed, and then the whole
+    cache is dropped. With start() a daemon thread polls every poll_interval seconds, so
+    lookups never touch the network; without it, get() polls when the last check is
+    older than poll_interval. max_age bounds how long an entry can live regardless.
+    With a helpers.storage.Storage as service, local roots add their own change tokens.
+    """
+
+    def __init__(self, service, max_items=256, poll_interval=10.0, max_age=3600.0, drive_ids=()):
+        # service is only used to poll; give it a client no other thread uses (httplib2)
+        self.service = service
+        self.max_items = max_items
+        self.poll_interval = poll_interval
+        self.max_age = max_age
+        self.drive_ids = list(drive_ids)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._token = None
+        self._checked_at = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self.counters = {"hits": 0, "misses": 0, "invalidations": 0, "polls": 0, "poll_errors": 0}
+
+    # --- change token ---
+    def _current_token(self):
+        if hasattr(self.service, "change_token"):
+            # helpers.storage: Drive token(s) plus one per local root
+            return self.service.change_token(self.drive_ids)
+        changes = self.service.changes()
+        tokens = [changes.getStartPageToken(supportsAllDrives=True).execute().get("startPageToken")]
+        # changes in shared drives are tracked per drive
+        for drive_id in self.drive_ids:
+            tokens.append(changes.getStartPageToken(supportsAllDrives=True, driveId=drive_id)
+                          .execute().get("startPageToken"))
+        return tuple(tokens)
+
+    def poll(self):
+        """Read the change token(s); drop every entry if storage changed. True if it did."""
+        try:
+            token = self._current_token()
+        except Exception as e:
+            # can't tell whether Drive changed: don't trust the cache
+            self.counters["poll_errors"] += 1
+            print(f"⚠️ Could not read the storage change token: {e}")
+            token = None
+        with self._lock:
+            self.counters["polls"] += 1
+            self._checked_at = time.monotonic()
+            changed = token is None or token != self._token
+            if changed and self._data:
+                self._data.clear()
+                self.counters["invalidations"] += 1
+            self._token = token
+            return changed
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            self.poll()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            # first token now, so lookups can hit before the first background poll
+            self.poll()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="search-cache-poll", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # --- entries ---
+    def get(self, key):
+        polling = self._thread is not None and self._thread.is_alive()
+        if not polling and time.monotonic() - self._checked_at >= self.poll_interval:
+            self.poll()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.max_age and self._token is not None:
+                self._data.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry[1]
+            self._data.pop(key, None)
+            self.counters["misses"] += 1
+            return None
+
+    @property
+    def token(self):
+        return self._token
+
+    def put(self, key, value, token):
+        """
+        token: self.token read before running the search. The value is discarded when that
+        token was unknown (no poll yet, or the poll failed) or a change was seen meanwhile.
+        """
+        with self._lock:
+            if token is None or token != self._token:
+                return
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def refresh(self):
+        """Explicit refresh (CLI 'refresh'): drop everything and re-read the change token"""
+        with self._lock:
+            self._data.clear()
+        self.poll()
+
+    def stats(self):
+        return {**self.counters, "items": len(self._data)}
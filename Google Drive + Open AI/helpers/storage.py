@@ -0,0 +1,459 @@
+import datetime
+import io
+import mimetypes
+import mmap
+import os
+import re
+import threading
+
+from googleapiclient.http import MediaIoBaseDownload, DEFAULT_CHUNK_SIZE
+
+try:  # optional: OS-level change notifications (inotify / FSEvents / ReadDirectoryChangesW)
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+DRIVE_FIELDS = "id, name, mimeType, modifiedTime, size, parents"
+
+# mimetypes only knows some office formats on some platforms
+_EXTRA_MIME_TYPES = {
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    ".doc": "application/msword",
+    ".xls": "application/vnd.ms-excel",
+    ".ppt": "application/vnd.ms-powerpoint",
+    ".csv": "text/csv",
+    ".txt": "text/plain",
+    ".pdf": "application/pdf",
+}
+_MIME_FILTER_RE = re.compile(r"mimeType\s*=\s*'([^']+)'")
+
+
+# ------------------ QUERY TERMS ------------------
+def query_terms(query, mode="AND"):
+    """(keywords, joiner) from a search query: the same rules for Drive and local searches"""
+    if isinstance(query, list):
+        return query, "and" if mode.upper() == "AND" else "or"
+    if " OR " in query:
+        return [w.strip() for w in query.split("OR") if w.strip()], "or"
+    keywords = [w.strip() for w in query.replace("/", " ").split() if len(w.strip()) > 2]
+    return keywords, "or" if mode.upper() == "OR" else "and"
+
+
+def mime_filter_types(mime_filters):
+    """Set of allowed MIME types from a list or a Drive-style "mimeType='...'" string (None = any)"""
+    if not mime_filters:
+        return None
+    if isinstance(mime_filters, list):
+        return set(mime_filters)
+    return set(_MIME_FILTER_RE.findall(mime_filters)) or None
+
+
+def build_drive_query(query, folder_id=None, mime_filters=None, mode="AND", options=None):
+    """Final Drive `q` string for search_drive (see its docstring for the arguments)"""
+    # --- 1. detect joiner y keywords ---
+    raw_keywords, joiner = query_terms(query, mode)
+    joiner = f" {joiner} "
+
+    # --- 2. construct conditions ---
+    if raw_keywords:
+        name_conditions = joiner.join([f"name contains '{k}'" for k in raw_keywords])
+        text_conditions = joiner.join([f"fullText contains '{k}'" for k in raw_keywords])
+    else:
+        name_conditions = f"name contains '{query}'"
+        text_conditions = f"fullText contains '{query}'"
+
+    # --- 3. folder filter ---
+    folder_filter = f" and '{folder_id}' in parents" if folder_id else ""
+
+    # --- 4. Filtro de MIME ---
+    if mime_filters:
+        if isinstance(mime_filters, list):
+            mime_filter_str = "(" + " or ".join([f"mimeType='{m}'" for m in mime_filters]) + ") and "
+        else:
+            mime_filter_str = f"{mime_filters} and "
+    else:
+        mime_filter_str = ""
+
+    # --- 5. Query final ---
+    q = f"{mime_filter_str}trashed=false and (({name_conditions}) or ({text_conditions})){folder_filter}"
+
+    # ✅ Si hay fechas detectadas, añadirlas como condiciones extra
+    if options and "dates" in options:
+        for d in options["dates"]:
+            q += f" and (name contains '{d}' or fullText contains '{d}')"
+
+    return q
+
+
+def download_request(request, on_chunk=None, chunksize=DEFAULT_CHUNK_SIZE):
+    """Runs a get_media/export_media request in chunks; on_chunk(bytes so far) after each one"""
+    fh = io.BytesIO()
+    downloader = MediaIoBaseDownload(fh, request, chunksize=chunksize)
+
+    done = False
+    while not done:
+        status, done = downloader.next_chunk()
+        if on_chunk:
+            on_chunk(fh.tell())
+
+    return fh.getvalue()
+
+
+# ------------------ DRIVE ------------------
+class DriveBackend:
+    """
+    Google Drive through a v3 client (googleapiclient, ThreadLocalDriveService or the
+    bench fake). Items are the dicts files().list returns.
+    """
+
+    def __init__(self, service):
+        self.service = service
+
+    def list_children(self, folder_id):
+        items, page_token = [], None
+        while True:
+            results = self.service.files().list(
+                q=f"'{folder_id}' in parents and trashed=false",
+                fields=f"nextPageToken, files({DRIVE_FIELDS})",
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True,
+                pageToken=page_token
+            ).execute()
+            items.extend(results.get("files", []))
+            page_token = results.get("nextPageToken", None)
+            if page_token is None:
+                return items
+
+    def search(self, query, folder_id=None, mime_filters=None, mode="AND", options=None):
+        results, page_token = [], None
+        q = build_drive_query(query, folder_id, mime_filters, mode, options)
+        print("[DEBUG] Final query sent to Drive:", q)
+
+        while True:
+            response = self.service.files().list(
+                q=q,
+                fields="nextPageToken, files(id, name, mimeType, modifiedTime, size)",
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True,
+                pageToken=page_token
+            ).execute()
+            results.extend(response.get("files", []))
+            page_token = response.get("nextPageToken", None)
+            if not page_token:
+                return results
+
+    def get_metadata(self, file_id):
+        return self.service.files().get(fileId=file_id, fields=DRIVE_FIELDS, supportsAllDrives=True).execute()
+
+    def read_bytes(self, file_id, on_chunk=None, chunksize=DEFAULT_CHUNK_SIZE):
+        request = self.service.files().get_media(fileId=file_id)
+        return download_request(request, on_chunk, chunksize)
+
+    def open(self, file_id):
+        # Drive has no random access worth using here: the whole file, in memory
+        return io.BytesIO(self.read_bytes(file_id))
+
+    def change_token(self, drive_ids=()):
+        changes = self.service.changes()
+        tokens = [changes.getStartPageToken(supportsAllDrives=True).execute().get("startPageToken")]
+        # changes in shared drives are tracked per drive
+        for drive_id in drive_ids:
+            tokens.append(changes.getStartPageToken(supportsAllDrives=True, driveId=drive_id)
+                          .execute().get("startPageToken"))
+        return tuple(tokens)
+
+
+# ------------------ LOCAL DIRECTORY ------------------
+class MappedFile(io.RawIOBase):
+    """Read-only, seekable stream over an mmap of a local file (pandas/openpyxl/zipfile accept it)"""
+
+    def __init__(self, path):
+        super().__init__()
+        with open(path, "rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            # mmap can't map an empty file
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        # one slice instead of RawIOBase's 8 KB readinto loop
+        end = len(self._map) if size is None or size < 0 else self._pos + size
+        data = self._map[self._pos:end]
+        self._pos += len(data)
+        return data
+
+    readall = read
+
+    def readinto(self, buffer):
+        data = self._map[self._pos:self._pos + len(buffer)]
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._map)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def __len__(self):
+        return len(self._map)
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap) and not self._map.closed:
+            self._map.close()
+        super().close()
+
+
+class _ChangeCounter(FileSystemEventHandler):
+    def __init__(self, backend):
+        self.backend = backend
+
+    def on_any_event(self, event):
+        # opened/closed events (newer watchdog) come from our own reads
+        if event.event_type in ("created", "deleted", "modified", "moved"):
+            with self.backend._lock:
+                self.backend._generation += 1
+
+
+class LocalBackend:
+    """
+    A local directory (e.g. the NAS mirror of the SOP share) with Drive-shaped items.
+
+    - ids are "<name>:<relative/path>" ("<name>:" is the root), so they never collide
+      with Drive ids and c.FOLDER_IDS values can point inside the directory
+    - items carry id, name, mimeType (folders: the Drive folder type), modifiedTime
+      (RFC 3339, like Drive), size and parents, so ranking/snippets/caches work unchanged
+    - search: name contains, like Drive; fullText only for plain-text files up to
+      fulltext_max_bytes (office/PDF content is compressed, so those match by name)
+    - reads go through mmap: no copy into Python until a chunk is requested
+    - change_token(): a counter bumped by watchdog events when it's installed (and
+      watch=True), otherwise a signature of every path/mtime/size under the root
+    """
+
+    def __init__(self, name, root, watch=True, fulltext_max_bytes=5 * 1024 * 1024):
+        self.name = name
+        self.root = os.path.realpath(root)
+        self.fulltext_max_bytes = fulltext_max_bytes
+        self._watch = watch and Observer is not None
+        self._observer = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    # --- ids ---
+    def file_id(self, path):
+        rel = os.path.relpath(path, self.root)
+        return f"{self.name}:" + ("" if rel == "." else rel.replace(os.sep, "/"))
+
+    def path(self, file_id):
+        prefix, _, rel = file_id.partition(":")
+        if prefix != self.name:
+            raise KeyError(f"'{file_id}' is not in the local root '{self.name}'")
+        path = os.path.realpath(os.path.join(self.root, *[p for p in rel.split("/") if p]))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise KeyError(f"'{file_id}' is outside the local root '{self.name}'")
+        return path
+
+    def _item(self, path, st=None):
+        st = st or os.stat(path)
+        is_dir = os.path.isdir(path)
+        if is_dir:
+            mime = FOLDER_MIME
+        else:
+            ext = os.path.splitext(path)[1].lower()
+            mime = _EXTRA_MIME_TYPES.get(ext) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+        modified = datetime.datetime.fromtimestamp(st.st_mtime, datetime.timezone.utc)
+        item = {
+            "id": self.file_id(path),
+            "name": os.path.basename(path) or self.name,
+            "mimeType": mime,
+            "modifiedTime": modified.strftime("%Y-%m-%dT%H:%M:%S.") + f"{modified.microsecond // 1000:03d}Z",
+            "parents": [self.file_id(os.path.dirname(path))] if path != self.root else [],
+        }
+        if not is_dir:
+            item["size"] = str(st.st_size)
+        return item
+
+    def _entries(self, directory):
+        """(path, stat) of the visible entries of a directory (dotfiles are skipped, like trash)"""
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if not entry.name.startswith("."):
+                        yield entry.path, entry.stat()
+        except FileNotFoundError:
+            return
+
+    def _walk(self, directory):
+        for path, st in self._entries(directory):
+            yield path, st
+            if os.path.isdir(path):
+                yield from self._walk(path)
+
+    # --- backend interface ---
+    def list_children(self, folder_id):
+        return [self._item(path, st) for path, st in self._entries(self.path(folder_id))]
+
+    def search(self, query, folder_id=None, mime_filters=None, mode="AND", options=None):
+        """Same semantics as the Drive query: (name match or text match) in folder_id's direct children"""
+        keywords, joiner = query_terms(query, mode)
+        keywords = [str(k).lower() for k in keywords] or [str(query).lower()]
+        dates = [str(d).lower() for d in (options or {}).get("dates", [])]
+        allowed = mime_filter_types(mime_filters)
+        candidates = self._entries(self.path(folder_id)) if folder_id else self._walk(self.root)
+        combine = all if joiner == "and" else any
+
+        results = []
+        for path, st in candidates:
+            item = self._item(path, st)
+            if item["mimeType"] == FOLDER_MIME or (allowed and item["mimeType"] not in allowed):
+                continue
+            name = item["name"].lower()
+            text = _LazyText(path, item["mimeType"], st.st_size, self.fulltext_max_bytes)
+            if not (combine(k in name for k in keywords) or combine(text.contains(k) for k in keywords)):
+                continue
+            if all(d in name or text.contains(d) for d in dates):
+                results.append(item)
+        print(f"[DEBUG] Local search in {self.name}:{' ' + folder_id if folder_id else ''} → {len(results)} file(s)")
+        return results
+
+    def get_metadata(self, file_id):
+        return self._item(self.path(file_id))
+
+    def open(self, file_id):
+        return MappedFile(self.path(file_id))
+
+    def read_bytes(self, file_id, on_chunk=None, chunksize=DEFAULT_CHUNK_SIZE):
+        with self.open(file_id) as fh:
+            if on_chunk is None:
+                return fh.read()
+            # chunked, so prefetch can still cancel / throttle local reads
+            out = bytearray()
+            while True:
+                chunk = fh.read(chunksize)
+                if not chunk:
+                    return bytes(out)
+                out += chunk
+                on_chunk(len(out))
+
+    def change_token(self, drive_ids=()):
+        if self._watch and self._start_watching():
+            with self._lock:
+                return ("watch", self.name, self._generation)
+        return ("scan", self.name, hash(tuple((p, st.st_mtime_ns, st.st_size) for p, st in self._walk(self.root))))
+
+    def _start_watching(self):
+        with self._lock:
+            if self._observer is None:
+                try:
+                    observer = Observer()
+                    observer.daemon = True
+                    observer.schedule(_ChangeCounter(self), self.root, recursive=True)
+                    observer.start()
+                    self._observer = observer
+                except Exception as e:
+                    # e.g. inotify watch limit reached: fall back to scanning
+                    print(f"⚠️ Could not watch {self.root} ({e}); detecting changes by scanning")
+                    self._watch = False
+                    return False
+            return True
+
+    def stop(self):
+        with self._lock:
+            if self._observer is not None:
+                self._observer.stop()
+                self._observer = None
+
+
+class _LazyText:
+    """Lowercased content of a plain-text file, read (mmap) only if a name match didn't decide"""
+
+    def __init__(self, path, mime_type, size, max_bytes):
+        self.path = path
+        self.searchable = (mime_type.startswith("text/") or mime_type == "application/json") and size <= max_bytes
+        self._text = None
+
+    def contains(self, term):
+        if not self.searchable:
+            return False
+        if self._text is None:
+            with MappedFile(self.path) as fh:
+                self._text = fh.read().decode("utf-8", errors="ignore").lower()
+        return term in self._text
+
+
+# ------------------ ROUTER ------------------
+class Storage:
+    """
+    One entry point for every file/folder id: "<name>:..." ids go to that local
+    backend, anything else to Drive. Search without a folder covers every backend.
+
+    Passed wherever a Drive service used to be (helpers.analyzer dispatches on
+    read_bytes/get_metadata); drive_service is the raw client for Google-native exports.
+    """
+
+    def __init__(self, drive_service=None, local=None):
+        self.drive = DriveBackend(drive_service) if drive_service is not None else None
+        self.local = dict(local or {})
+
+    @property
+    def drive_service(self):
+        return self.drive.service if self.drive is not None else None
+
+    def backend(self, file_id):
+        prefix, sep, _ = str(file_id).partition(":")
+        if sep and prefix in self.local:
+            return self.local[prefix]
+        if self.drive is None:
+            raise KeyError(f"No storage backend for '{file_id}' (Drive is disabled)")
+        return self.drive
+
+    def backends(self):
+        return ([self.drive] if self.drive is not None else []) + list(self.local.values())
+
+    def list_children(self, folder_id):
+        return self.backend(folder_id).list_children(folder_id)
+
+    def search(self, query, folder_id=None, mime_filters=None, mode="AND", options=None):
+        if folder_id:
+            return self.backend(folder_id).search(query, folder_id, mime_filters, mode, options)
+        results = []
+        for backend in self.backends():
+            results.extend(backend.search(query, None, mime_filters, mode, options))
+        return results
+
+    def get_metadata(self, file_id):
+        return self.backend(file_id).get_metadata(file_id)
+
+    def open(self, file_id):
+        return self.backend(file_id).open(file_id)
+
+    def read_bytes(self, file_id, on_chunk=None, chunksize=DEFAULT_CHUNK_SIZE):
+        return self.backend(file_id).read_bytes(file_id, on_chunk=on_chunk, chunksize=chunksize)
+
+    def change_token(self, drive_ids=()):
+        return tuple(backend.change_token(drive_ids) for backend in self.backends())
+
+
+def local_backends(roots, watch=True, fulltext_max_bytes=5 * 1024 * 1024):
+    """{name: LocalBackend} from {name: directory}; missing directories are reported and skipped"""
+    backends = {}
+    for name, root in (roots or {}).items():
+        if not os.path.isdir(root):
+            print(f"⚠️ Local root '{name}' not found: {root}")
+            continue
+        backends[name] = LocalBackend(name, root, watch=watch, fulltext_max_bytes=fulltext_max_bytes)
+    return backends
@@ -0,0 +1,220 @@
+import csv
+import datetime
+import io
+import re
+
+import numpy as np
+import pandas as pd
+
+from helpers.mapreduce import estimate_tokens
+from helpers.query_plan import column_stats
+
+try:  # optional: exact counts with the gpt-4o / gpt-4o-mini encoding
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:  # not installed, or the encoding file can't be downloaded
+    _ENCODING = None
+
+DITTO = "^"
+SUMMARY_NOTE = "Over all {rows} rows, min/max/mean: "
+_SPACES = re.compile(r"\s+")
+
+
+def count_tokens(text):
+    """Tokens of a prompt fragment: tiktoken when installed, otherwise the ~4 chars/token estimate"""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+# ------------------ CLEANING ------------------
+def _blank(df):
+    """2-D bool array: cell is null, NaN or only whitespace (pdfplumber fills tables with None)"""
+    blank = df.isna().to_numpy(copy=True)
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        if col.dtype == object or pd.api.types.is_string_dtype(col):
+            blank[:, i] |= col.astype("string").str.strip().eq("").fillna(True).to_numpy(dtype=bool)
+    return blank
+
+
+def _visible_rows(df, max_rows, block=1000):
+    """
+    (first max_rows rows with at least one value, whether more follow), read block by
+    block so a long table is never scanned whole
+    """
+    picked, found = [], 0
+    for start in range(0, len(df), block):
+        part = df.iloc[start:start + block]
+        part = part[~_blank(part).all(axis=1)]
+        picked.append(part)
+        found += len(part)
+        if found > max_rows:
+            break
+    rows = pd.concat(picked) if picked else df.head(0)
+    return rows.head(max_rows), len(rows) > max_rows
+
+
+def _cell(value):
+    if value is None or value is pd.NA or value is pd.NaT:
+        return ""
+    if isinstance(value, (float, np.floating)):
+        return "" if np.isnan(value) else _number(float(value))
+    if isinstance(value, (pd.Timestamp, datetime.datetime)):
+        return value.date().isoformat() if value.time() == datetime.time() else value.isoformat(sep=" ")
+    # cell line breaks (PDF/DOCX tables) would force CSV quoting
+    return _SPACES.sub(" ", str(value)).strip()
+
+
+def _number(value):
+    """
+    Whole numbers without ".0"; otherwise 6 significant digits but never fewer than
+    2 decimals (money keeps its cents), which drops float noise like 0.30000000000000004
+    """
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    if abs(value) < 1:
+        return f"{value:.6g}"
+    decimals = max(2, 6 - len(str(int(abs(value)))))
+    return f"{value:.{decimals}f}".rstrip("0").rstrip(".")
+
+
+def _label(col):
+    return _cell(col) or "?"
+
+
+def _has_header(df):
+    # PDF/DOCX tables come with positional columns 0..n-1: their header is the first row
+    return not isinstance(df.columns, pd.RangeIndex)
+
+
+def _looks_numeric(values):
+    present = [v for v in values if v]
+    if not present:
+        return False
+    numbers = pd.to_numeric(pd.Series(present).str.replace(r"[$€£,%\s]", "", regex=True), errors="coerce")
+    return numbers.notna().mean() >= 0.8
+
+
+# ------------------ PREPARATION ------------------
+def _prepare(df, max_rows):
+    """Rows/columns to show plus the notes that replace what was dropped or collapsed"""
+    if _has_header(df):
+        rows, truncated = _visible_rows(df, max_rows)
+        labels = [_label(col) for col in df.columns]
+        body = df
+    else:
+        # the header row is one of the max_rows, as in head(max_rows)
+        rows, truncated = _visible_rows(df, max_rows)
+        if len(rows) > 1:
+            labels = [_cell(v) or f"col {i + 1}" for i, v in enumerate(rows.iloc[0])]
+            body = df.drop(index=rows.index[:1])
+            rows = rows.iloc[1:]
+        else:
+            # a single row (key/value lines of DOCX/PDF tables) is data, not a header
+            labels = [f"col {i + 1}" for i in range(df.shape[1])]
+            body = df
+    positions = list(range(df.shape[1]))
+    grid = [[_cell(v) for v in row] for row in rows.itertuples(index=False, name=None)]
+    notes = []
+
+    # columns without a value in the rows shown: dropped, and named if the table has values further down
+    empty = [i for i in positions if all(not r[i] for r in grid)]
+    later = [i for i in empty if not _blank(body.iloc[:, [i]]).all()] if truncated else []
+    if later:
+        notes.append("Empty in the rows shown: " + ", ".join(labels[i] for i in later))
+    keep = [i for i in positions if i not in empty]
+
+    # the same value in every row shown → one note instead of a column
+    constants = []
+    if len(grid) > 1:
+        constants = [i for i in keep if len({r[i] for r in grid}) == 1]
+        if constants and len(constants) < len(keep):
+            notes.append("Same in every row shown: "
+                         + "; ".join(f"{labels[i]}={grid[0][i] or '(empty)'}" for i in constants))
+            keep = [i for i in keep if i not in constants]
+        else:
+            constants = []
+
+    # numbers over the whole table when only part of it is shown
+    if truncated:
+        summaries = []
+        for i in keep + constants:
+            if not _looks_numeric([r[i] for r in grid]):
+                continue
+            stats = column_stats(body.iloc[:, i])
+            if stats["type"] == "number":
+                summaries.append(f"{labels[i]} {_cell(stats['min'])}/{_cell(stats['max'])}/{_cell(stats['mean'])}"
+                                 + (f" ({stats['nulls']} null)" if stats["nulls"] else ""))
+        if summaries:
+            notes.append(SUMMARY_NOTE.format(rows=len(body)) + "; ".join(summaries))
+
+    return {
+        "truncated": truncated,
+        "total_rows": len(body),
+        "total_columns": df.shape[1],
+        "dropped_columns": len(empty),
+        "header": [labels[i] for i in keep],
+        "grid": [[r[i] for i in keep] for r in grid],
+        "notes": notes,
+    }
+
+
+# ------------------ LAYOUTS ------------------
+def _csv(lines):
+    out = io.StringIO()
+    csv.writer(out, lineterminator="\n").writerows(lines)
+    return out.getvalue()
+
+
+def _ditto(grid):
+    out, previous = [], None
+    for row in grid:
+        out.append([DITTO if previous is not None and v and v == previous[i] else v for i, v in enumerate(row)])
+        previous = row
+    return out
+
+
+def _render(prep, layout):
+    header, grid = prep["header"], prep["grid"]
+    # what the model must know to read the rows; a complete plain CSV needs no line at all
+    facts = []
+    if prep["truncated"]:
+        facts.append(f"{len(grid)} of {prep['total_rows']} rows")
+    if prep["dropped_columns"]:
+        facts.append(f"{prep['total_columns'] - prep['dropped_columns']} of {prep['total_columns']} columns")
+    if layout == "ditto":
+        facts.append(f"{DITTO} = same value as the row above")
+    elif layout == "columns":
+        facts.append("one line per column: name, then its value in each row")
+    lines = ([f"[{'; '.join(facts)}]"] if facts else []) + prep["notes"]
+    if not header:
+        return "\n".join(lines or ["[empty table]"]) + "\n"
+    if layout == "columns":
+        body = _csv([[name, *(row[i] for row in grid)] for i, name in enumerate(header)])
+    else:
+        body = _csv([header] + (_ditto(grid) if layout == "ditto" else grid))
+    return "".join(line + "\n" for line in lines) + body
+
+
+def table_layouts(df, max_rows=50):
+    """Every applicable layout of the table as {layout: prompt text} (the report compares them)"""
+    prep = _prepare(df, max_rows)
+    layouts = {"rows": _render(prep, "rows")}
+    # a literal "^" in the data would be ambiguous
+    if len(prep["grid"]) > 1 and not any(DITTO in row for row in prep["grid"]):
+        layouts["ditto"] = _render(prep, "ditto")
+    if prep["header"] and prep["grid"]:
+        layouts["columns"] = _render(prep, "columns")
+    return layouts
+
+
+def table_to_prompt(df, max_rows=50):
+    """
+    Compact prompt text for the first max_rows non-empty rows of a table: empty rows and
+    columns dropped, constant columns collapsed into one note, numeric columns summarized
+    (min/max/mean/nulls) over the whole table when it is truncated, floats without noise
+    (see _number), and the layout (rows / ditto / columns) with the fewest tokens.
+    """
+    layouts = table_layouts(df, max_rows)
+    return min(layouts.values(), key=count_tokens)
@@ -0,0 +1,263 @@
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from helpers.llm_router import cost_usd
+
+_job = contextvars.ContextVar("llm_usage_job", default=None)
+_job_ids = itertools.count(1)
+
+
+class BudgetExceeded(RuntimeError):
+    """The call would go over a session/job budget and could not be downgraded"""
+
+
+def token_counts(usage, prompt_estimate=0, completion_estimate=0):
+    """(prompt, cached, completion) from response.usage, or the estimates when it's missing"""
+    if usage is None:
+        return prompt_estimate, 0, completion_estimate
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (getattr(usage, "prompt_tokens", None) or prompt_estimate,
+            getattr(details, "cached_tokens", None) or 0,
+            getattr(usage, "completion_tokens", None) or completion_estimate)
+
+
+class _Totals:
+    __slots__ = ("calls", "errors", "prompt_tokens", "cached_tokens", "completion_tokens", "latency_s", "cost_usd")
+
+    def __init__(self):
+        self.calls = self.errors = self.prompt_tokens = self.cached_tokens = self.completion_tokens = 0
+        self.latency_s = self.cost_usd = 0.0
+
+    def add(self, call):
+        self.calls += 1
+        self.errors += int(call["error"])
+        self.prompt_tokens += call["prompt_tokens"]
+        self.cached_tokens += call["cached_tokens"]
+        self.completion_tokens += call["completion_tokens"]
+        self.latency_s += call["latency_s"]
+        self.cost_usd += call["cost_usd"]
+
+    @property
+    def tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    def as_dict(self):
+        return {"calls": self.calls, "errors": self.errors, "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens, "completion_tokens": self.completion_tokens,
+                "latency_s": round(self.latency_s, 3), "cost_usd": round(self.cost_usd, 6)}
+
+
+class UsageTracker:
+    """
+    Token/cost accounting of every LLM call, aggregated per session (this process),
+    job (one analyze/compare/batch) and file, with optional budgets.
+
+    - jobs are opened with `with tracker.job("analyze", files=[name]):`; nested jobs reuse
+      the outer one, so a CLI command and the analyzer entry point count as one job
+    - the job lives in a contextvar: worker threads must enter it with tracker.bind(job)
+    - budgets: {"usd": x, "tokens": n} (None = unlimited) for the session and for each job.
+      admit() runs before each call with its estimated cost; over budget the call moves
+      to downgrade_route when action == "downgrade" and that fits, otherwise
+      BudgetExceeded is raised and nothing is sent
+    """
+
+    def __init__(self, routes, session_budget=None, job_budget=None, action="downgrade",
+                 downgrade_route="fast", expected_completion_tokens=500, max_calls=10000, max_jobs=1000):
+        self.routes = routes
+        self.session_budget = session_budget or {}
+        self.job_budget = job_budget or {}
+        self.action = action
+        self.downgrade_route = downgrade_route
+        self.expected_completion_tokens = expected_completion_tokens
+        self.max_jobs = max_jobs
+        self.session_id = time.strftime("%Y%m%d_%H%M%S") + f"_{os.getpid()}"
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._reset()
+        # the most recent calls, for the exported file
+        self.calls = deque(maxlen=max_calls)
+
+    def _reset(self):
+        self.session = _Totals()
+        self.jobs = OrderedDict()
+        self.by_file = {}
+        self.by_model = {}
+        self.by_task = {}
+        self.downgrades = 0
+        self.aborts = 0
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+            self.calls.clear()
+
+    # --- jobs ---
+    @contextmanager
+    def job(self, kind, files=()):
+        current = _job.get()
+        if current is not None:
+            current["files"].extend(f for f in files if f not in current["files"])
+            yield current
+            return
+        job = {"id": next(_job_ids), "kind": kind, "files": list(files), "started": time.time()}
+        with self._lock:
+            self.jobs[job["id"]] = {"job": job, "totals": _Totals()}
+            while len(self.jobs) > self.max_jobs:
+                self.jobs.popitem(last=False)
+        token = _job.set(job)
+        try:
+            yield job
+        finally:
+            _job.reset(token)
+            with self._lock:
+                entry = self.jobs.get(job["id"])
+                if entry is not None and not entry["totals"].calls:
+                    del self.jobs[job["id"]]
+
+    @contextmanager
+    def bind(self, job):
+        """Run in job (e.g. inside a worker thread, which doesn't inherit the contextvar)"""
+        token = _job.set(job)
+        try:
+            yield job
+        finally:
+            _job.reset(token)
+
+    @staticmethod
+    def current_job():
+        return _job.get()
+
+    # --- budgets ---
+    def _over(self, budget, totals, cost, tokens):
+        usd, max_tokens = budget.get("usd"), budget.get("tokens")
+        if usd is not None and totals.cost_usd + cost > usd:
+            return f"${totals.cost_usd:.4f} spent of ${usd:.4f}"
+        if max_tokens is not None and totals.tokens + tokens > max_tokens:
+            return f"{totals.tokens} tokens used of {max_tokens}"
+        return None
+
+    def _exceeded(self, route, prompt_tokens):
+        tokens = prompt_tokens + self.expected_completion_tokens
+        cost = cost_usd(self.routes[route].get("prices", {}), prompt_tokens, 0, self.expected_completion_tokens)
+        job = _job.get()
+        with self._lock:
+            reason = self._over(self.session_budget, self.session, cost, tokens)
+            if reason:
+                return f"session budget ({reason})"
+            entry = self.jobs.get(job["id"]) if job else None
+            if entry is not None:
+                reason = self._over(self.job_budget, entry["totals"], cost, tokens)
+                if reason:
+                    return f"job budget ({reason})"
+        return None
+
+    def admit(self, route, prompt_tokens):
+        """Route to use for a call of ~prompt_tokens, or BudgetExceeded"""
+        reason = self._exceeded(route, prompt_tokens)
+        if reason is None:
+            return route
+        if self.action == "downgrade" and route != self.downgrade_route \
+                and self._exceeded(self.downgrade_route, prompt_tokens) is None:
+            with self._lock:
+                self.downgrades += 1
+            print(f"💸 Over the {reason}: using the '{self.downgrade_route}' route instead of '{route}'")
+            return self.downgrade_route
+        with self._lock:
+            self.aborts += 1
+        raise BudgetExceeded(f"LLM call not sent: it would exceed the {reason}")
+
+    # --- accounting ---
+    def record(self, route, task, latency_s, prompt_tokens, completion_tokens, cached_tokens=0, error=False):
+        model = self.routes[route]["model"]
+        job = _job.get()
+        call = {
+            "ts": round(time.time(), 3), "session": self.session_id, "job": job["id"] if job else None,
+            "job_kind": job["kind"] if job else None, "files": list(job["files"]) if job else [],
+            "task": task, "route": route, "model": model, "latency_s": round(latency_s, 4),
+            "prompt_tokens": prompt_tokens, "cached_tokens": cached_tokens,
+            "completion_tokens": completion_tokens, "error": error,
+            "cost_usd": round(cost_usd(self.routes[route].get("prices", {}),
+                                       prompt_tokens, cached_tokens, completion_tokens), 8),
+        }
+        with self._lock:
+            self.calls.append(call)
+            self.session.add(call)
+            entry = self.jobs.get(job["id"]) if job is not None else None
+            if entry is not None:
+                entry["totals"].add(call)
+            # a call counts for every file of its job (compare → both files)
+            for name in call["files"]:
+                self.by_file.setdefault(name, _Totals()).add(call)
+            self.by_model.setdefault(model, _Totals()).add(call)
+            self.by_task.setdefault(task, _Totals()).add(call)
+
+    # --- reporting ---
+    def summary(self):
+        with self._lock:
+            return {
+                "session": self.session_id,
+                "started": self.started,
+                "totals": self.session.as_dict(),
+                "budgets": {"session": self.session_budget, "job": self.job_budget, "action": self.action},
+                "downgrades": self.downgrades,
+                "aborts": self.aborts,
+                "jobs": [{"id": e["job"]["id"], "kind": e["job"]["kind"], "files": e["job"]["files"],
+                          **e["totals"].as_dict()} for e in self.jobs.values()],
+                "files": {name: t.as_dict() for name, t in self.by_file.items()},
+                "models": {name: t.as_dict() for name, t in self.by_model.items()},
+                "tasks": {name: t.as_dict() for name, t in self.by_task.items()},
+            }
+
+    def print_summary(self):
+        s = self.summary()
+        t = s["totals"]
+        if not t["calls"]:
+            return
+        print(f"\n💰 LLM usage: {t['calls']} call(s), {t['prompt_tokens']} prompt + {t['completion_tokens']} "
+              f"completion tokens ({t['cached_tokens']} cached), ${t['cost_usd']:.4f}"
+              + (f", {s['downgrades']} downgraded" if s["downgrades"] else "")
+              + (f", {s['aborts']} blocked by budget" if s["aborts"] else ""))
+        for job in s["jobs"]:
+            files = ", ".join(job["files"]) or "-"
+            print(f"   #{job['id']:<4}{job['kind']:<10}{job['calls']:>4} call(s) "
+                  f"{job['prompt_tokens'] + job['completion_tokens']:>8} tok  ${job['cost_usd']:.4f}  {files}")
+
+    def export(self, path):
+        """
+        Writes the summary and the recent calls: JSON, or the Prometheus text format
+        (node_exporter textfile collector) when path ends in .prom.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            if path.endswith(".prom"):
+                fh.write(self._prometheus())
+            else:
+                with self._lock:
+                    calls = list(self.calls)
+                json.dump({**self.summary(), "calls": calls}, fh, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+        return path
+
+    def _prometheus(self):
+        s = self.summary()
+        lines = []
+        metrics = (("calls", "llm_calls_total"), ("errors", "llm_errors_total"),
+                   ("prompt_tokens", "llm_prompt_tokens_total"), ("cached_tokens", "llm_cached_tokens_total"),
+                   ("completion_tokens", "llm_completion_tokens_total"), ("cost_usd", "llm_cost_usd_total"),
+                   ("latency_s", "llm_latency_seconds_total"))
+        for key, name in metrics:
+            lines.append(f"# TYPE {name} counter")
+            for model, t in s["models"].items():
+                lines.append(f'{name}{{session="{s["session"]}",model="{model}"}} {t[key]}')
+        lines.append("# TYPE llm_budget_downgrades_total counter")
+        lines.append(f'llm_budget_downgrades_total{{session="{s["session"]}"}} {s["downgrades"]}')
+        lines.append("# TYPE llm_budget_aborts_total counter")
+        lines.append(f'llm_budget_aborts_total{{session="{s["session"]}"}} {s["aborts"]}')
+        return "\n".join(lines) + "\n"
@@ -1,20 +1,25 @@
 # ------------------ IMPORTS ------------------
 import os
-from io import BytesIO
 import pandas as pd
-from googleapiclient.http import MediaIoBaseDownload
 from rapidfuzz import process
 import const.constants as c
 import re
-from helpers.analyzer import get_credentials, download_file_as_dataframe, ask_llm_about_dataframe, compare_two_dataframes
+import time
+import datetime
+from helpers.analyzer import get_credentials, download_file_as_dataframe, ask_llm_about_dataframe, compare_two_dataframes, ThreadLocalDriveService
+from helpers.analyzer import stream_llm_about_dataframe, stream_compare_two_dataframes, router as llm_router
+from helpers.analyzer import usage_tracker, BudgetExceeded
+from helpers.prefetch import Prefetcher
+from helpers.excel import LazyWorkbook
+from helpers.fingerprint import SignatureStore, find_content_duplicates
+from helpers.facets import FacetIndex, facet_options, run_facet_query
+from helpers.pipeline import Pipeline
+from helpers.search_cache import SearchCache
+from helpers.storage import Storage, build_drive_query, local_backends
+from helpers.analyzer import get_file_metadata
 from googleapiclient.discovery import build
 from rapidfuzz import fuzz, distance
 
-# Libraries for Google OAuth authentication
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-
 def validate_folders():
     print("\n[VALIDATING PROMPT MAP FOLDERS]")
     for key, entry in c.prompt_map.items():
@@ -29,45 +34,71 @@ def validate_folders():
 
 # validate_folders()
 
-# ------------------ CONFIG ------------------
-SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
-
-
+# Built lazily by init_drive_service() so the module can be imported (e.g. by the
+# bench harness) without running the OAuth flow.
+creds = None
+drive_service = None
+storage = None
+search_cache = None
 
-# ------------------ AUTHENTICATION ------------------
-def get_credentials():
-    creds = None
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
 
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file('client_secret.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
-    return creds
+def init_drive_service(service=None):
+    """
+    Build the global Drive client and the storage router (Drive + c.LOCAL_ROOTS) used by
+    search/list/download helpers (and the search cache).
+    If a service is given (e.g. a fake for offline benchmarks) it is used as-is; with
+    c.DRIVE_ENABLED = False and no service only the local roots are used.
+    """
+    global creds, drive_service, storage, search_cache
+    if service is None and c.DRIVE_ENABLED:
+        creds = get_credentials()
+        service = build('drive', 'v3', credentials=creds)
+    drive_service = service
+    local = local_backends(c.LOCAL_ROOTS, watch=c.LOCAL_WATCH, fulltext_max_bytes=c.LOCAL_FULLTEXT_MAX_BYTES)
+    storage = Storage(service, local)
+    # the cache polls from its own thread: it needs its own client when it has one
+    search_cache = SearchCache(
+        Storage(ThreadLocalDriveService(creds) if creds else service, local),
+        max_items=c.SEARCH_CACHE_MAX_ITEMS,
+        poll_interval=c.SEARCH_CACHE_POLL_SECONDS,
+        max_age=c.SEARCH_CACHE_MAX_AGE,
+        drive_ids=c.SEARCH_CACHE_DRIVE_IDS,
+    )
+    return drive_service
 
 
-creds = get_credentials()
-drive_service = build('drive', 'v3', credentials=creds)
+def shared_storage():
+    """Storage router safe to use from worker threads (per-thread Drive clients, same local roots)"""
+    return Storage(ThreadLocalDriveService(creds) if creds else drive_service, storage.local)
 
 
 # ------------------ EXTRACT SNIPPETS ------------------
 def extract_snippet(file_bytes, mime_type, query):
     try:
         if mime_type == "text/csv":
-            df = pd.read_csv(file_bytes, dtype=str, encoding="utf-8", errors="ignore")
-        else:
-            df = pd.read_excel(file_bytes, dtype=str, engine="openpyxl")
+            df = pd.read_csv(file_bytes, dtype=str, encoding="utf-8", encoding_errors="ignore")
 
-        df = df.dropna(axis=1, how="all")
-        df = df.loc[:, ~df.columns.astype(str).str.contains("^Unnamed")]
+            df = df.dropna(axis=1, how="all")
+            df = df.loc[:, ~df.columns.astype(str).str.contains("^Unnamed")]
 
-        mask = df.apply(lambda row: row.astype(str).str.contains(query, case=False, na=False).any(), axis=1)
-        matches = df[mask]
+            mask = df.apply(lambda row: row.astype(str).str.contains(query, case=False, na=False).any(), axis=1)
+            matches = df[mask]
+        else:
+            # Excel: streaming de filas (read-only), se para en el segundo match
+            with LazyWorkbook(file_bytes) as wb:
+                found = wb.search(query, max_matches=2)
+            if found:
+                sheet, header, _ = found[0]
+                rows = [row for name, _, row in found if name == sheet]
+                width = max(len(header), *(len(r) for r in rows))
+                matches = pd.DataFrame(
+                    [tuple(r) + (None,) * (width - len(r)) for r in rows],
+                    columns=[h if h is not None else f"Unnamed: {i}" for i, h in
+                             enumerate(tuple(header) + (None,) * (width - len(header)))],
+                ).dropna(axis=1, how="all")
+                matches = matches.loc[:, ~matches.columns.astype(str).str.contains("^Unnamed")]
+            else:
+                matches = pd.DataFrame()
 
         if not matches.empty:
             fragment = matches.head(2).to_string(index=False)
@@ -81,27 +112,13 @@ def extract_snippet(file_bytes, mime_type, query):
 # ------------------ LIST FILES (RECURSIVE) ------------------
 def list_files_recursive(folder_id):
     all_files = []
-    page_token = None
 
-    while True:
-        results = drive_service.files().list(
-            q=f"'{folder_id}' in parents and trashed=false",
-            fields="nextPageToken, files(id, name, mimeType, modifiedTime, size, parents)",
-            includeItemsFromAllDrives=True,
-            supportsAllDrives=True,
-            pageToken=page_token
-        ).execute()
-
-        items = results.get('files', [])
-        for item in items:
-            if item["mimeType"] == "application/vnd.google-apps.folder":
-                all_files.extend(list_files_recursive(item["id"]))
-            else:
-                all_files.append(item)
-
-        page_token = results.get('nextPageToken', None)
-        if page_token is None:
-            break
+    # Drive folder id o "<root>:<path>" de un directorio local (ver helpers/storage.py)
+    for item in storage.list_children(folder_id):
+        if item["mimeType"] == "application/vnd.google-apps.folder":
+            all_files.extend(list_files_recursive(item["id"]))
+        else:
+            all_files.append(item)
 
     return all_files
 
@@ -109,75 +126,19 @@ def list_files_recursive(folder_id):
 # ------------------ SEARCH ------------------
 def search_drive(query, folder_id=None, mime_filters=None, mode="AND", options=None):
     """
-    Search for files in Google Drive with multiple keyword support.
+    Search for files in Google Drive (or a local root, see helpers/storage.py) with multiple keyword support.
 - United States AND by default.
 - If the query contains an explicit 'OR' → switches to OR.
 - If query is a list → terms and mode (AND/OR) are respected.
-- If folder_id is None → searches the entire Drive (and applies a MIME post-filter).
+- If folder_id is None → searches the entire Drive and every local root (and applies a MIME post-filter).
 - mime_filters can be:
 - None
 - str (e.g., "mimeType='application/pdf'")
 - list (e.g., ["application/pdf", "image/png"])
     """
 
-    results = []
-    page_token = None
-
-    # --- 1. detect joiner y keywords ---
-    if isinstance(query, list):
-        raw_keywords = query
-        joiner = " and " if mode.upper() == "AND" else " or "
-    elif " OR " in query:
-        raw_keywords = [w.strip() for w in query.split("OR") if w.strip()]
-        joiner = " or "
-    else:
-        raw_keywords = [w.strip() for w in query.replace("/", " ").split() if len(w.strip()) > 2]
-        joiner = " or " if mode.upper() == "OR" else " and "
-
-    # --- 2. construct conditions ---
-    if raw_keywords:
-        name_conditions = joiner.join([f"name contains '{k}'" for k in raw_keywords])
-        text_conditions = joiner.join([f"fullText contains '{k}'" for k in raw_keywords])
-    else:
-        name_conditions = f"name contains '{query}'"
-        text_conditions = f"fullText contains '{query}'"
-
-    # --- 3. folder filter ---
-    folder_filter = f" and '{folder_id}' in parents" if folder_id else ""
-
-    # --- 4. Filtro de MIME ---
-    if mime_filters:
-        if isinstance(mime_filters, list):
-            mime_filter_str = "(" + " or ".join([f"mimeType='{m}'" for m in mime_filters]) + ") and "
-        else:
-            mime_filter_str = f"{mime_filters} and "
-    else:
-        mime_filter_str = ""
-
-    # --- 5. Query final ---
-    q = f"{mime_filter_str}trashed=false and (({name_conditions}) or ({text_conditions})){folder_filter}"
-
-    # ✅ Si hay fechas detectadas, añadirlas como condiciones extra
-    if options and "dates" in options:
-        for d in options["dates"]:
-            q += f" and (name contains '{d}' or fullText contains '{d}')"
-
-    print("[DEBUG] Final query sent to Drive:", q)
-
-    # --- 6. Execute by page ---
-    while True:
-        response = drive_service.files().list(
-            q=q,
-            fields="nextPageToken, files(id, name, mimeType, modifiedTime, size)",
-            includeItemsFromAllDrives=True,
-            supportsAllDrives=True,
-            pageToken=page_token
-        ).execute()
-
-        results.extend(response.get("files", []))
-        page_token = response.get("nextPageToken", None)
-        if not page_token:
-            break
+    # --- 6. Execute (Drive pages through files().list, local roots walk the directory) ---
+    results = storage.search(query, folder_id, mime_filters, mode, options)
 
     # --- 7. Filter only if is global ---
     if folder_id is None:
@@ -190,6 +151,9 @@ def search_drive(query, folder_id=None, mime_filters=None, mode="AND", options=N
             "application/vnd.ms-excel",
             "application/vnd.openxmlformats-officedocument.presentationml.presentation",
             "application/vnd.ms-powerpoint",
+            "application/vnd.google-apps.document",
+            "application/vnd.google-apps.spreadsheet",
+            "application/vnd.google-apps.presentation",
         }
         results = [f for f in results if f["mimeType"] in ALLOWED_MIME_TYPES]
 
@@ -240,6 +204,40 @@ def rank_results(results, query):
 
 
 
+def _freeze(value):
+    """Hashable cache key from nested lists/dicts"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def search_and_rank(query, folder_id=None, mime_filters=None, mode="AND", options=None):
+    """
+    search_drive + min_size filter + rank_results, memoized in search_cache by the final
+    Drive q string: repeats are served from memory until Drive reports a change.
+    Returns (results, ranked).
+    """
+    options = options or {}
+    q = build_drive_query(query, folder_id, mime_filters, mode)
+    key = (q, folder_id is None, _freeze(query), options.get("min_size"))
+    cached = search_cache.get(key) if search_cache is not None else None
+    token = search_cache.token if search_cache is not None else None
+    if cached is not None:
+        print("[DEBUG] Search cache hit (Drive unchanged):", q)
+        return cached
+
+    results = search_drive(query, folder_id, mime_filters, mode)
+    if "min_size" in options:
+        min_size = options["min_size"]
+        print(f"[DEBUG] Filtering results: keeping only >= {min_size / 1024 / 1024:.2f} MB")
+        results = [f for f in results if int(f.get("size", 0)) >= min_size]
+    ranked = rank_results(results, query) if results else []
+    if search_cache is not None:
+        search_cache.put(key, (results, ranked), token)
+    return results, ranked
+
 
 # ------------------ PROMPT INTERPRETER ------------------
 STOPWORDS = {"list", "show", "open", "the", "a", "an", "of", "in", "on", "to", "for"}
@@ -264,6 +262,16 @@ def parse_size_from_prompt(user_prompt: str):
     return None
 
 
+DUPLICATE_MIME_TYPES = {
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/pdf",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "text/csv",
+    "application/vnd.google-apps.document",
+    "application/vnd.google-apps.spreadsheet",
+}
+
+
 def group_near_duplicates(files, threshold=85):
     groups = []
     used = set()
@@ -284,6 +292,57 @@ def group_near_duplicates(files, threshold=85):
     return groups
 
 
+def make_pipeline(service, threaded):
+    """Download/parse pipeline for multi-file jobs; several download threads only with per-thread clients"""
+    return Pipeline(
+        service,
+        download_workers=c.PIPELINE_DOWNLOAD_WORKERS if threaded else 1,
+        parse_workers=c.PIPELINE_PARSE_WORKERS,
+        llm_concurrency=c.PIPELINE_LLM_CONCURRENCY,
+        queue_size=c.PIPELINE_QUEUE_SIZE,
+        pool_min_items=c.PIPELINE_POOL_MIN_FILES,
+    )
+
+
+def content_duplicate_groups(files, pipeline, verbose=True):
+    """
+    Near-duplicates by extracted text (MinHash/LSH, verified with Jaccard); finds renamed
+    copies that group_near_duplicates misses. Signatures persist between scans.
+    """
+    store = SignatureStore(c.DUP_SIGNATURE_PATH, num_perm=c.DUP_NUM_PERM, shingle_words=c.DUP_SHINGLE_WORDS)
+    files = [f for f in files if int(f.get("size", 0)) <= c.DUP_MAX_FILE_BYTES]
+    return find_content_duplicates(
+        files, None, store, threshold=c.DUP_JACCARD_THRESHOLD, bands=c.DUP_BANDS,
+        shingle_words=c.DUP_SHINGLE_WORDS, verbose=verbose, pipeline=pipeline,
+    )
+
+
+def update_facet_index(index, pipeline, verbose=True):
+    """(Re)index permits, amounts and dates of the files under c.FACET_FOLDERS; only changed files are parsed"""
+    files = []
+    for f_id in c.FACET_FOLDERS:
+        files.extend(list_files_recursive(f_id))
+    files = [f for f in files if f["mimeType"] in DUPLICATE_MIME_TYPES
+             and int(f.get("size", 0)) <= c.FACET_MAX_FILE_BYTES]
+    return index.update(files, verbose=verbose, pipeline=pipeline)
+
+
+def print_facet_hits(title, hits, limit=50):
+    print(f"\n📌 {title}: {len(hits)} match(es) in the facet index")
+    today = datetime.date.today()
+    for e in hits[:limit]:
+        value = e["value"]
+        if e["kind"] == "expires":
+            days = (datetime.date.fromisoformat(value) - today).days
+            value = f"expires {value} (in {days} days)"
+        elif e["kind"] == "amount":
+            value = f"${value:,.2f}"
+        else:
+            value = f"{e['kind']} {value}" + (f" → {e['end']}" if e.get("end", value) != value else "")
+        print(f"   - {e['name']} | ID: {e['file_id']} | {value} | {e['location']}")
+    if len(hits) > limit:
+        print(f"   ... {len(hits) - limit} more")
+
 
 def interpret_prompt(user_prompt):
     normalized_prompt = normalize_prompt(user_prompt)
@@ -380,11 +439,17 @@ def interpret_prompt(user_prompt):
         print(f"[DEBUG] Date(s) detected → {date_match}")
         options["dates"] = date_match
 
+    # expiry windows, amount ranges, date ranges → answered from the facet index
+    facets = facet_options(user_prompt, c.FACET_EXPIRY_DAYS)
+    if facets:
+        print(f"[DEBUG] Facet filter(s) detected → {facets}")
+        options.update(facets)
+
     return query, folder, mime_filter, options, mode
 
 
 
-def resolve_path(file, drive_service, stop_root=None):
+def resolve_path(file, storage, stop_root=None):
     path_parts = [file["name"]]
     parents = file.get("parents", [])
 
@@ -393,11 +458,7 @@ def resolve_path(file, drive_service, stop_root=None):
         if stop_root and parent_id == stop_root:
             break
         try:
-            parent = drive_service.files().get(
-                fileId=parent_id,
-                fields="id, name, parents",
-                supportsAllDrives=True
-            ).execute()
+            parent = storage.get_metadata(parent_id)
         except Exception as e:
             # parent does not exist
             path_parts.append(f"[missing:{parent_id}]")
@@ -410,64 +471,212 @@ def resolve_path(file, drive_service, stop_root=None):
             break
 
     return "/".join(reversed(path_parts))
+def apply_result_limit(ranked, user_prompt):
+    """
+    Keep only the N most recent results when the prompt asks for it
+    ("three most recent...", "latest...", "top 5...").
+    """
+    number_map = {
+        "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+        "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10
+    }
+    limit = None
+    for word, num in number_map.items():
+        if word in user_prompt.lower():
+            limit = num
+            break
+    match = re.search(r"\b\d+\b", user_prompt)
+    if match:
+        limit = int(match.group())
+    if ("most recent" in user_prompt.lower() or "latest" in user_prompt.lower()) and not limit:
+        limit = 3
+
+    if limit:
+        ranked = sorted(ranked, key=lambda x: x[1].get("modifiedTime", ""), reverse=True)
+        ranked = ranked[:limit]
+        print(f"⚡ Filter applied: Keeping only {limit} most recent files")
+    return ranked
+
+
 #--------------------------------CLI---------------------
 
+def render_stream(pieces, title):
+    """
+    Print an LLM answer as it arrives. Ctrl-C stops this answer only (the stream is
+    closed) and the session continues.
+    """
+    print(f"\n{title}\n", end="", flush=True)
+    start = time.perf_counter()
+    first_token = None
+    try:
+        for piece in pieces:
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            print(piece, end="", flush=True)
+    except KeyboardInterrupt:
+        pieces.close()
+        print("\n⏹️ Answer cancelled")
+    print("\n")
+    if first_token is not None:
+        print(f"⏱️ First token: {first_token:.2f}s | Total: {time.perf_counter() - start:.2f}s")
+
+
 def interactive_cli():
     print("🚀 Drive Deep Search")
-    creds = get_credentials()
-    drive_service = build('drive', 'v3', credentials=creds)
+    init_drive_service()
+
+    # worker threads need their own Drive clients (httplib2 is not thread-safe)
+    shared = shared_storage()
+    prefetcher = Prefetcher(
+        shared,
+        top_k=c.PREFETCH_TOP_K,
+        max_file_bytes=c.PREFETCH_MAX_FILE_BYTES,
+        max_bytes=c.PREFETCH_MAX_BYTES,
+        bandwidth=c.PREFETCH_BANDWIDTH,
+    )
+
+    pipeline = make_pipeline(shared, threaded=bool(creds) or not storage.drive)
+
+    # repeat searches come from memory; a background poll of the Drive change token invalidates them
+    search_cache.start()
+
+    # permits / amounts / expiry dates, refreshed with 'reindex' (built on first use)
+    facet_index = FacetIndex(c.FACET_INDEX_PATH)
+
+    def load_document(file_id, ranked=()):
+        doc = prefetcher.get(file_id)
+        if doc is None:
+            # mimeType/modifiedTime from the search results save a metadata call
+            item = next((item for _, item in ranked if item["id"] == file_id), {})
+            doc = download_file_as_dataframe(storage, file_id, mime_type=item.get("mimeType"),
+                                             modified_time=item.get("modifiedTime"))
+        return doc
+
+    def pipeline_item(file_id, ranked=()):
+        # the search result has name/mimeType/modifiedTime; otherwise one metadata call
+        item = next((item for _, item in ranked if item["id"] == file_id), None)
+        return item or {"id": file_id, **get_file_metadata(storage, file_id)}
+
+    def load_documents(file_ids, ranked=()):
+        """Several documents at once: prefetched ones first, the rest through the pipeline"""
+        docs = {fid: prefetcher.get(fid) for fid in file_ids}
+        missing = [pipeline_item(fid, ranked) for fid in dict.fromkeys(f for f, doc in docs.items() if doc is None)]
+        if missing:
+            docs.update(pipeline.documents(missing))
+        return [docs[fid] for fid in file_ids]
+
+    def analyze_files(file_ids, question, ranked=()):
+        """
+        The same question over several files: downloads, parsing and LLM calls overlap in
+        the pipeline (at most PIPELINE_LLM_CONCURRENCY calls at once); answers print as they finish
+        """
+        def ask(item, doc):
+            # one usage job per file (the LLM stage runs in its own threads)
+            with usage_tracker.job("analyze", files=[item.get("name", item["id"])]):
+                return ask_llm_about_dataframe(doc, question, context_note=f"File: {item.get('name', item['id'])}")
+
+        items = [pipeline_item(fid, ranked) for fid in dict.fromkeys(file_ids)]
+        for res in pipeline.run(items, llm_fn=ask):
+            name = res["item"].get("name", res["item"]["id"])
+            if res["error"]:
+                print(f"\n⚠️ {name}: {res['error']} ({res['stage']})")
+            else:
+                print(f"\n📌 {name}:\n{res['answer']}")
+        pipeline.print_metrics()
+
+    def shutdown():
+        prefetcher.shutdown()
+        pipeline.shutdown()
+        llm_router.print_report()
+        usage_tracker.print_summary()
+        if usage_tracker.session.calls and c.LLM_USAGE_EXPORT_PATH:
+            print(f"📈 LLM usage saved to {usage_tracker.export(c.LLM_USAGE_EXPORT_PATH)}")
+
+    def file_label(file_id, ranked):
+        item = next((item for _, item in ranked if item["id"] == file_id), None)
+        return item["name"] if item else file_id
 
     while True:
         # --- 1. Primera fase: búsqueda ---
-        user_prompt = input("\n> Enter your search (or 'exit'): ").strip()
+        user_prompt = input("\n> Enter your search ('refresh' to re-run searches, 'exit' to quit): ").strip()
         if not user_prompt:
             continue
         if user_prompt.lower() in ("exit", "quit"):
             print("👋 Bye.")
+            shutdown()
             break
+        if user_prompt.lower() == "refresh":
+            search_cache.refresh()
+            print("🔄 Search cache cleared")
+            continue
+        if user_prompt.lower() == "reindex":
+            stats = update_facet_index(facet_index, pipeline)
+            if stats["indexed"] or stats["failed"]:
+                pipeline.print_metrics()
+            print(f"✅ Facet index: {stats['indexed']} file(s) indexed, {stats['reused']} unchanged, "
+                  f"{stats['failed']} unreadable")
+            continue
+
+        # nueva búsqueda → descartar el prefetch anterior
+        prefetcher.cancel()
 
         # Usa el mismo parser que tu main
         query, folder, mime_filter, options, mode = interpret_prompt(user_prompt)
 
+        # --- CASO FACETAS (vencimientos, montos, rangos de fechas) ---
+        facet_only = "expiring_days" in options or "amount_range" in options
+        facet_query = run_facet_query(facet_index, options) if not options.get("duplicates") else None
+        if facet_query and (facet_only or len(facet_index)):
+            if not len(facet_index):
+                print("🗂️ Facet index is empty, building it (run 'reindex' later to refresh)...")
+                update_facet_index(facet_index, pipeline)
+                facet_query = run_facet_query(facet_index, options)
+            title, hits = facet_query
+            print_facet_hits(title, hits)
+            # a date range can also name a file ("weekly report for May 20–26"): keep searching
+            if facet_only:
+                continue
+
         # --- CASO DUPLICADOS ---
         if options.get("duplicates"):
             print("\n[DEBUG] Searching for duplicates...")
-            # Aquí va tu lógica de duplicados igual que en tu versión original
+            target_folders = [folder] if folder else c.FALLBACK_DRIVES
+            all_files = []
+            for f_id in target_folders:
+                all_files.extend(list_files_recursive(f_id))
+            all_files = [f for f in all_files if f["mimeType"] in DUPLICATE_MIME_TYPES]
+            print(f"[DEBUG] Retrieved {len(all_files)} files total from {len(target_folders)} folder(s).")
+            if not all_files:
+                print("❌ No files found in target folders.")
+                continue
+
+            groups = group_near_duplicates(all_files, threshold=85)
+            for g in groups:
+                print("\n🔁 Duplicate group (title):")
+                for f in g:
+                    print(f"   - {f['name']} | ID: {f['id']} | Last modified: {f.get('modifiedTime', 'N/A')}")
+
+            clusters, stats = content_duplicate_groups(all_files, pipeline)
+            if stats["fingerprinted"] or stats["failed"]:
+                pipeline.print_metrics()
+            for cluster in clusters:
+                print("\n🧬 Duplicate group (content):")
+                for f, similarity in cluster:
+                    print(f"   - {f['name']} | ID: {f['id']} | Similarity: {similarity:.0%} "
+                          f"| Last modified: {f.get('modifiedTime', 'N/A')}")
+            print(f"\n✅ {len(groups)} title group(s), {len(clusters)} content group(s) "
+                  f"({stats['fingerprinted']} fingerprinted, {stats['reused']} unchanged, {stats['failed']} unreadable)")
             continue
 
         # --- FLUJO NORMAL ---
-        results = search_drive(query, folder, mime_filter, mode)
-
-        # Filtro por tamaño
-        if "min_size" in options:
-            min_size = options["min_size"]
-            print(f"[DEBUG] Filtering results: keeping only >= {min_size / 1024 / 1024:.2f} MB")
-            results = [f for f in results if int(f.get("size", 0)) >= min_size]
+        # búsqueda + ranking (memo hasta que Drive cambie) + filtro por tamaño
+        results, ranked = search_and_rank(query, folder, mime_filter, mode, options)
 
-        ranked = []
         if results:
-            ranked = rank_results(results, query)
-
-            # detectar límite top-N
-            number_map = {
-                "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
-                "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10
-            }
-            limit = None
-            for word, num in number_map.items():
-                if word in user_prompt.lower():
-                    limit = num
-                    break
-            match = re.search(r"\b\d+\b", user_prompt)
-            if match:
-                limit = int(match.group())
-            if ("most recent" in user_prompt.lower() or "latest" in user_prompt.lower()) and not limit:
-                limit = 3
-
-            if limit:
-                ranked.sort(key=lambda x: x[1].get("modifiedTime", ""), reverse=True)
-                ranked = ranked[:limit]
-                print(f"⚡ Filter applied: Keeping only {limit} most recent files")
+            ranked = apply_result_limit(ranked, user_prompt)
+
+            # descarga/parseo en segundo plano mientras el usuario lee la lista
+            prefetcher.start([item for _, item in ranked])
 
             # imprimir resultados
             for score, item in ranked:
@@ -483,14 +692,9 @@ def interactive_cli():
                     "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
                 ]:
                     try:
-                        request = drive_service.files().get_media(fileId=item['id'])
-                        fh = BytesIO()
-                        downloader = MediaIoBaseDownload(fh, request)
-                        done = False
-                        while not done:
-                            status, done = downloader.next_chunk()
-                        fh.seek(0)
-                        snippet = extract_snippet(fh, item["mimeType"], query)
+                        # Drive: descarga completa; directorio local: lectura por mmap
+                        with storage.open(item["id"]) as fh:
+                            snippet = extract_snippet(fh, item["mimeType"], query)
                         print(f"   🔎 Snippet:\n{snippet}")
                     except Exception as e:
                         print(f"⚠️ Error downloading file: {e}")
@@ -509,6 +713,7 @@ def interactive_cli():
 
             if cmd == "exit":
                 print("👋 Exiting...")
+                shutdown()
                 return
 
             elif cmd == "back":
@@ -518,27 +723,41 @@ def interactive_cli():
             elif cmd == "help":
                 print("""
 Available commands:
-  analyze  -> Analyze a single file from the search results
+  analyze  -> Analyze a file from the search results (several: numbers separated by commas)
   compare  -> Compare two files from the search results
   back     -> Go back to new search
   exit     -> Quit the program
 """)
 
             elif cmd == "analyze":
-                file_id = input("📂 Enter the Google Drive File ID (or number from results): ").strip()
-                if file_id.isdigit():
-                    idx = int(file_id) - 1
-                    if 0 <= idx < len(ranked):
-                        file_id = ranked[idx][1]["id"]
-                    else:
-                        print("⚠️ Invalid selection")
-                        continue
+                choices = [c.strip() for c in input(
+                    "📂 Enter the Google Drive File ID(s) (or numbers from results, e.g. 1,3): ").split(",") if c.strip()]
+                file_ids = []
+                for choice in choices:
+                    if choice.isdigit():
+                        idx = int(choice) - 1
+                        if not 0 <= idx < len(ranked):
+                            break
+                        choice = ranked[idx][1]["id"]
+                    file_ids.append(choice)
+                if not file_ids or len(file_ids) != len(choices):
+                    print("⚠️ Invalid selection")
+                    continue
                 question = input("❓ Enter your question for the agent: ").strip()
+                if len(file_ids) > 1:
+                    try:
+                        analyze_files(file_ids, question, ranked)
+                    except Exception as e:
+                        print(f"⚠️ Error analyzing files: {e}")
+                    continue
+                file_id = file_ids[0]
                 try:
-                    df = download_file_as_dataframe(drive_service, file_id)
-                    answer = ask_llm_about_dataframe(df, question)
+                    df = load_document(file_id, ranked)
                     print("\n📄 Detectado archivo analizable")
-                    print("\n📌 Answer:\n", answer, "\n")
+                    with usage_tracker.job("analyze", files=[file_label(file_id, ranked)]):
+                        render_stream(stream_llm_about_dataframe(df, question), "📌 Answer:")
+                except BudgetExceeded as e:
+                    print(f"💸 {e}")
                 except Exception as e:
                     print(f"⚠️ Error analyzing file: {e}")
 
@@ -558,10 +777,15 @@ Available commands:
 
                 question = input("❓ Enter your comparison question: ").strip()
                 try:
-                    df1 = download_file_as_dataframe(drive_service, file_id1)
-                    df2 = download_file_as_dataframe(drive_service, file_id2)
-                    comparison = compare_two_dataframes(df1, df2, question)
-                    print("\n📌 Comparison:\n", comparison, "\n")
+                    # both files download/parse in parallel
+                    df1, df2 = load_documents([file_id1, file_id2], ranked)
+                    if df1 is None or df2 is None:
+                        continue
+                    labels = [file_label(file_id1, ranked), file_label(file_id2, ranked)]
+                    with usage_tracker.job("compare", files=labels):
+                        render_stream(stream_compare_two_dataframes(df1, df2, question), "📌 Comparison:")
+                except BudgetExceeded as e:
+                    print(f"💸 {e}")
                 except Exception as e:
                     print(f"⚠️ Error comparing files: {e}")
 
@@ -649,7 +873,7 @@ if __name__ == "__main__":
 #                 for g in groups:
 #                     print("\n🔁 Duplicate group:")
 #                     for f in g:
-#                         path = resolve_path(f, drive_service, stop_root="17kUIyMg19PJ_E0Pewo9PZZeLw9z2pxPD")
+#                         path = resolve_path(f, storage, stop_root="17kUIyMg19PJ_E0Pewo9PZZeLw9z2pxPD")
 #                         print(f"   - {f['name']} | ID: {f['id']} | Path: {path} | Last modified: {f.get('modifiedTime', 'N/A')}")
 #
 #                 print(f"\n✅ Total duplicate groups found: {len(groups)}")
@@ -0,0 +1,303 @@
+"""
+Drive Deep Search as a long-running local service.
+
+Keeps the Drive/OpenAI clients, search results and parsed documents warm across
+requests, coalesces identical in-flight requests and serves many users at once.
+
+    python server.py --port 8765
+    python server.py --fake          # offline, on the bench fake backends
+
+Endpoints (JSON in, JSON out):
+    POST /search   {"prompt": "..."}  facet filters (expiring, amounts, date ranges) are
+                   answered from the facet index built by the CLI's 'reindex'
+    POST /analyze  {"file_id": "...", "question": "..."}
+    POST /compare  {"file_id1": "...", "file_id2": "...", "question": "..."}
+    GET  /health
+    GET  /usage    LLM tokens/cost per session, job and file
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import const.constants as c
+import helpers.analyzer as analyzer
+import main_v4_prompts as app
+from helpers.facets import FacetIndex, run_facet_query
+
+MAX_BODY_BYTES = 1024 * 1024
+MAX_FACET_HITS = 50
+
+
+# ------------------ SERVICE ------------------
+class SearchService:
+    """
+    Request handlers on top of interpret_prompt / search_drive / download_file_as_dataframe
+    and the LLM helpers. Blocking work runs in a thread pool; identical requests that
+    arrive while one is running share its result.
+    """
+
+    def __init__(self, storage, workers=16):
+        # helpers.storage.Storage: Drive and/or local roots, safe across the pool's threads
+        self.storage = storage
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="drive-search")
+        self._inflight = {}
+        self.stats = {"requests": 0, "coalesced": 0, "errors": 0}
+        # read-only here; the CLI's 'reindex' rewrites the pickle and the next search reloads it
+        self._facets, self._facets_mtime = FacetIndex(), None
+        self._facets_lock = threading.Lock()
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def coalesce(self, key, make_coro):
+        """Await make_coro() once per key; concurrent callers with the same key share it"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(make_coro())
+        self._inflight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def document(self, file_id):
+        return await self.coalesce(("doc", file_id), lambda: self._run(self._load_document, file_id))
+
+    # --- blocking helpers (run in the pool) ---
+    def _facet_index(self):
+        path = c.FACET_INDEX_PATH
+        mtime = os.path.getmtime(path) if path and os.path.exists(path) else None
+        with self._facets_lock:
+            if mtime != self._facets_mtime:
+                self._facets, self._facets_mtime = FacetIndex(path if mtime else None), mtime
+            return self._facets
+
+    def _search(self, prompt):
+        query, folder, mime_filter, options, mode = app.interpret_prompt(prompt)
+        if options.get("duplicates"):
+            # a duplicate scan lists and fingerprints whole folders: not a request-sized job
+            raise ValueError("Duplicate scans are not served by /search; run them from the CLI")
+
+        response = {"query": query, "folder": folder}
+        # same rules as the CLI: expiry/amount filters are answered only from the facet index,
+        # a date range also keeps searching (it can name a file)
+        facet_only = "expiring_days" in options or "amount_range" in options
+        index = self._facet_index()
+        facet_query = run_facet_query(index, options)
+        if facet_query and (facet_only or len(index)):
+            if not len(index):
+                raise ValueError("The facet index is empty; run 'reindex' from the CLI to build it")
+            title, hits = facet_query
+            response["facets"] = {"title": title, "total": len(hits), "hits": hits[:MAX_FACET_HITS]}
+            if facet_only:
+                return {**response, "results": []}
+
+        # memoized by the Drive q string until the Drive change token moves; options carry min_size
+        results, ranked = app.search_and_rank(query, folder, mime_filter, mode, options)
+        ranked = app.apply_result_limit(ranked, prompt) if results else []
+        response["results"] = [
+            {"score": round(score, 2), **{k: item.get(k) for k in ("id", "name", "mimeType", "modifiedTime", "size")}}
+            for score, item in ranked
+        ]
+        return response
+
+    def _load_document(self, file_id):
+        # document_cache (memory + disk, keyed by modifiedTime) keeps parsed files warm
+        return analyzer.download_file_as_dataframe(self.storage, file_id, verbose=False)
+
+    def _ask(self, doc, question, file_id):
+        # one usage job per request, so budgets apply per analyze/compare
+        with analyzer.usage_tracker.job("analyze", files=[file_id]):
+            return analyzer.ask_llm_about_dataframe(doc, question)
+
+    def _compare(self, doc1, doc2, question, file_id1, file_id2):
+        with analyzer.usage_tracker.job("compare", files=[file_id1, file_id2]):
+            return analyzer.compare_two_dataframes(doc1, doc2, question)
+
+    # --- endpoints ---
+    async def search(self, body):
+        prompt = _required(body, "prompt")
+        return await self.coalesce(("search", prompt), lambda: self._run(self._search, prompt))
+
+    async def analyze(self, body):
+        file_id, question = _required(body, "file_id"), _required(body, "question")
+
+        async def work():
+            doc = await self.document(file_id)
+            return {"answer": await self._run(self._ask, doc, question, file_id)}
+
+        return await self.coalesce(("analyze", file_id, question), work)
+
+    async def compare(self, body):
+        file_id1, file_id2 = _required(body, "file_id1"), _required(body, "file_id2")
+        question = _required(body, "question")
+
+        async def work():
+            doc1, doc2 = await asyncio.gather(self.document(file_id1), self.document(file_id2))
+            return {"comparison": await self._run(self._compare, doc1, doc2, question, file_id1, file_id2)}
+
+        return await self.coalesce(("compare", file_id1, file_id2, question), work)
+
+    async def health(self, body):
+        return {
+            **self.stats,
+            "inflight": len(self._inflight),
+            "search_cache": app.search_cache.stats(),
+            "storage": (["drive"] if self.storage.drive else []) + list(self.storage.local),
+            "doc_cache": analyzer.document_cache.stats(),
+            "llm_routes": analyzer.router.report(),
+        }
+
+    async def usage(self, body):
+        return analyzer.usage_tracker.summary()
+
+
+def _required(body, key):
+    if not isinstance(body, dict):
+        raise ValueError("Request body must be a JSON object")
+    value = body.get(key)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"Missing field '{key}'")
+    return value.strip()
+
+
+# ------------------ HTTP ------------------
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large", 429: "Too Many Requests",
+           500: "Internal Server Error"}
+
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_BYTES:
+        raise OverflowError("Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path.split("?", 1)[0], headers, body
+
+
+async def _write_response(writer, status, payload, keep_alive):
+    data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        f"Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + data)
+    await writer.drain()
+
+
+def make_handler(service):
+    routes = {
+        ("POST", "/search"): service.search,
+        ("POST", "/analyze"): service.analyze,
+        ("POST", "/compare"): service.compare,
+        ("GET", "/health"): service.health,
+        ("GET", "/usage"): service.usage,
+    }
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except OverflowError as e:
+                    await _write_response(writer, 413, {"error": str(e)}, False)
+                    break
+                except (ValueError, asyncio.IncompleteReadError):
+                    await _write_response(writer, 400, {"error": "Malformed request"}, False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                handler = routes.get((method, path))
+                if handler is None:
+                    status, payload = 404, {"error": f"No route for {method} {path}"}
+                else:
+                    service.stats["requests"] += 1
+                    try:
+                        status, payload = 200, await handler(json.loads(body or b"{}"))
+                    except ValueError as e:
+                        status, payload = 400, {"error": str(e)}
+                    except analyzer.BudgetExceeded as e:
+                        status, payload = 429, {"error": str(e)}
+                    except Exception as e:
+                        service.stats["errors"] += 1
+                        status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                await _write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    return handle
+
+
+async def serve(service, host, port):
+    server = await asyncio.start_server(make_handler(service), host, port)
+    print(f"🚀 Drive Deep Search server listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+# ------------------ MAIN ------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive Deep Search server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=16, help="threads for Drive/parse/LLM work")
+    parser.add_argument("--search-ttl", type=float, default=c.SEARCH_CACHE_MAX_AGE,
+                        help="max seconds to keep search results (they are dropped sooner if Drive changes)")
+    parser.add_argument("--fake", action="store_true", help="serve the bench fake Drive/OpenAI backends")
+    args = parser.parse_args(argv)
+
+    if args.fake:
+        from bench.corpus import build_corpus
+        from bench.fakes import FakeDriveService, FakeOpenAI
+
+        folders, files = build_corpus()
+        drive_service = FakeDriveService(files, folders)
+        analyzer.client = FakeOpenAI()
+    elif c.DRIVE_ENABLED:
+        drive_service = analyzer.ThreadLocalDriveService(app.get_credentials())
+    else:
+        drive_service = None  # local roots only
+    app.init_drive_service(drive_service)
+
+    app.search_cache.max_age = args.search_ttl
+    app.search_cache.start()
+
+    service = SearchService(app.storage, workers=args.workers)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        print("👋 Bye.")
+    finally:
+        analyzer.usage_tracker.print_summary()
+        if analyzer.usage_tracker.session.calls and c.LLM_USAGE_EXPORT_PATH:
+            print(f"📈 LLM usage saved to {analyzer.usage_tracker.export(c.LLM_USAGE_EXPORT_PATH)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import pandas as pd
+
+from helpers.diff import diff_dataframes
+
+
+def test_int_and_float_versions_of_a_column_are_equal():
+    # a blank cell makes pandas read the whole column as float64
+    a = pd.DataFrame({"Item": ["Beer", "Wine", "Gin", "Rum"], "Qty": [1, 2, 3, 4]})
+    b = pd.DataFrame({"Item": ["Beer", "Wine", "Gin", "Rum"], "Qty": [1.0, 2.0, 3.0, 4.0]})
+    delta = diff_dataframes(a, b)
+    assert delta["changed"] == 0
+    assert delta["changed_cells"] == []
+
+
+def test_blank_cell_and_real_edit_are_reported():
+    a = pd.DataFrame({"Item": ["Beer", "Wine", "Gin", "Rum"], "Qty": [1, 2, 3, 4]})
+    b = pd.DataFrame({"Item": ["Beer", "Wine", "Gin", "Rum"], "Qty": [1, None, 3, 5.5]})
+    delta = diff_dataframes(a, b)
+    assert delta["changed"] == 2
+    assert {(c["key"], c["a"], c["b"]) for c in delta["changed_cells"]} == {("Wine", "2", ""), ("Rum", "4", "5.5")}
+
+
+def test_columns_differing_only_in_case_are_both_compared():
+    a = pd.DataFrame({"ID": [1, 2], "Sales": [10, 20], "sales": [1, 2]})
+    b = pd.DataFrame({"ID": [1, 2], "Sales": [10, 20], "sales": [1, 9]})
+    assert diff_dataframes(a, b)["changed_cells_per_column"] == {"sales.1": 1}
@@ -0,0 +1,21 @@
+import pandas as pd
+
+from helpers.doc_cache import DocumentCache
+
+
+def test_local_ids_with_the_same_slug_get_their_own_entries(tmp_path):
+    cache = DocumentCache(cache_dir=str(tmp_path), version=1)
+    cache.put("nas:a/b.csv", "2025-05-20T10:00:00", pd.DataFrame({"x": [1]}))
+    cache.put("nas:a-b.csv", "2025-05-20T10:00:00", pd.DataFrame({"x": [2]}))
+
+    fresh = DocumentCache(cache_dir=str(tmp_path), version=1)  # disk tier only
+    assert fresh.get("nas:a/b.csv", "2025-05-20T10:00:00")["x"].tolist() == [1]
+    assert fresh.get("nas:a-b.csv", "2025-05-20T10:00:00")["x"].tolist() == [2]
+
+
+def test_new_version_of_a_file_replaces_the_old_one(tmp_path):
+    cache = DocumentCache(cache_dir=str(tmp_path), version=1)
+    cache.put("id1", "t1", pd.DataFrame({"x": [1]}))
+    cache.put("id1", "t2", pd.DataFrame({"x": [2]}))
+    assert len(list(tmp_path.glob("*.pkl"))) == 1
+    assert DocumentCache(cache_dir=str(tmp_path), version=1).get("id1", "t1") is None
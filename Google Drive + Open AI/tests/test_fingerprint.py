@@ -0,0 +1,40 @@
+import pandas as pd
+
+from helpers.fingerprint import SignatureStore, find_content_duplicates
+
+TEXT = "Bartender role description: greet guests, check IDs, pour drinks and close the register at night."
+
+DOCS = {
+    "a": {"texto": TEXT, "tablas": []},
+    "b": {"texto": TEXT + " Updated.", "tablas": []},
+    "scan": {"texto": "", "tablas": []},  # scanned PDF: no text layer
+    "empty": pd.DataFrame(),
+    "broken": None,
+}
+
+
+def scan(store, loaded):
+    files = [{"id": fid, "name": fid, "modifiedTime": "2025-05-20"} for fid in DOCS]
+
+    def load(f):
+        loaded.append(f["id"])
+        if f["id"] == "broken":
+            raise ValueError("not a PDF")
+        return DOCS[f["id"]]
+
+    return find_content_duplicates(files, load, store, threshold=0.7, verbose=False)
+
+
+def test_rescan_loads_no_unchanged_file(tmp_path):
+    path = str(tmp_path / "signatures.pkl")
+    first = []
+    clusters, stats = scan(SignatureStore(path), first)
+    assert sorted(first) == sorted(DOCS)
+    assert stats["fingerprinted"] == 2 and stats["failed"] == 3
+    assert [sorted(f["id"] for f, _ in c) for c in clusters] == [["a", "b"]]
+
+    second = []
+    clusters, stats = scan(SignatureStore(path), second)
+    assert second == []
+    assert stats["reused"] == len(DOCS)
+    assert [sorted(f["id"] for f, _ in c) for c in clusters] == [["a", "b"]]
@@ -0,0 +1,107 @@
+import pandas as pd
+import pytest
+
+from helpers.query_plan import PlanError, execute_plan, parse_plan, validate_plan
+
+
+@pytest.fixture
+def sales():
+    return pd.DataFrame({
+        "Category": ["Beer", "Wine", "Beer", "Spirits", "Wine"],
+        "Sales": ["$300", "$1,200", "$950", "$45", "$2,000.50"],
+        "Date": ["2025-05-19", "2025-05-20", "2025-06-01", "2025-06-02", "2025-07-15"],
+        "Qty": [3, 12, 9, 1, 20],
+    })
+
+
+def run(plan, table):
+    return execute_plan(validate_plan(plan, table), table)
+
+
+# ------------------ VALIDATION ------------------
+@pytest.mark.parametrize("plan", [
+    {"filters": ["Sales > 5"]},
+    {"filters": {"column": "Sales", "op": ">", "value": 5}},
+    {"aggregations": ["sum(Sales)"]},
+    {"aggregations": {"column": "Sales", "func": "sum"}},
+    {"sort": [["Sales"]]},
+    {"sort": "Sales"},
+    {"group_by": "Category"},
+    {"group_by": [{"column": "Category"}]},
+    {"select": [["Category"]]},
+])
+def test_malformed_sections_raise_plan_error(plan, sales):
+    with pytest.raises(PlanError):
+        validate_plan(plan, sales)
+
+
+@pytest.mark.parametrize("plan", [
+    "SELECT * FROM data",
+    {"code": "df.drop(columns=['Sales'])"},
+    {"table": "other"},
+    {"filters": [{"column": "Sales", "op": "eval", "value": "1"}]},
+    {"filters": [{"column": "missing", "op": "==", "value": 1}]},
+    {"aggregations": [{"column": "Sales", "func": "apply"}]},
+    {"limit": "10; import os"},
+    {"group_by": ["Category"], "aggregations": [{"column": "Sales", "func": "sum", "as": "Category"}]},
+    {"aggregations": [{"column": "Sales", "func": "sum", "as": "x"}, {"column": "Qty", "func": "sum", "as": "x"}]},
+])
+def test_invalid_plans_raise_plan_error(plan, sales):
+    with pytest.raises(PlanError):
+        validate_plan(plan, sales)
+
+
+def test_parse_plan_ignores_fences_and_prose():
+    assert parse_plan('Here it is:\n```json\n{"limit": 2}\n```') == {"limit": 2}
+    with pytest.raises(PlanError):
+        parse_plan("no plan")
+
+
+def test_values_are_data_not_code(sales):
+    # a value that looks like code is compared as text and matches nothing
+    result, info = run({"filters": [{"column": "Category", "op": "==", "value": "__import__('os').getcwd()"}]},
+                       sales)
+    assert info["matched"] == 0
+    assert result.empty
+
+
+# ------------------ EXECUTION ------------------
+def test_sort_text_numbers_by_value(sales):
+    result, _ = run({"sort": [{"column": "Sales", "desc": True}], "limit": 3, "select": ["Sales"]}, sales)
+    assert result["Sales"].tolist() == ["$2,000.50", "$1,200", "$950"]
+
+
+def test_sort_text_dates_by_value():
+    df = pd.DataFrame({"Expires": ["12/1/2025", "1/31/2025", "3/5/2025"]})
+    result, _ = run({"sort": ["Expires"]}, df)
+    assert result["Expires"].tolist() == ["1/31/2025", "3/5/2025", "12/1/2025"]
+
+
+def test_filters_coerce_text_numbers_and_dates(sales):
+    _, info = run({"filters": [{"column": "Sales", "op": ">", "value": 500}]}, sales)
+    assert info["matched"] == 3
+    _, info = run({"filters": [{"column": "Date", "op": "between", "value": ["2025-06-01", "2025-06-30"]}]}, sales)
+    assert info["matched"] == 2
+
+
+def test_group_by_aggregates_over_every_row(sales):
+    plan = {"group_by": ["category"], "aggregations": [{"column": "Sales", "func": "sum", "as": "total"}],
+            "sort": [{"column": "total", "desc": True}]}
+    result, info = run(plan, sales)
+    assert info == {"table": "data", "rows": 5, "matched": 5}
+    assert result["Category"].tolist() == ["Wine", "Beer", "Spirits"]
+    assert result["total"].tolist() == pytest.approx([3200.5, 1250, 45])
+
+
+def test_count_rows_and_limit(sales):
+    result, _ = run({"aggregations": [{"func": "count"}]}, sales)
+    assert result["count"].tolist() == [5]
+    result, _ = run({"limit": 2}, sales)
+    assert len(result) == 2
+
+
+def test_workbook_tables_by_sheet_name(sales):
+    doc = {"tipo": "gsheet", "texto": "", "tablas": [sales, sales.head(2)], "hojas": ["May", "June"]}
+    result, info = run({"table": "June", "aggregations": [{"func": "count"}]}, doc)
+    assert info["rows"] == 2
+    assert result["count"].tolist() == [2]
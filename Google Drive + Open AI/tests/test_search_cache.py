@@ -0,0 +1,38 @@
+from helpers.search_cache import SearchCache
+
+
+class FakeStorage:
+    def __init__(self):
+        self.token, self.fail = ("t1",), False
+
+    def change_token(self, drive_ids):
+        if self.fail:
+            raise ConnectionError("offline")
+        return self.token
+
+
+def test_results_are_cached_while_the_token_is_unchanged():
+    cache = SearchCache(FakeStorage())
+    cache.poll()
+    cache.put("q", "results", cache.token)
+    assert cache.get("q") == "results"
+
+
+def test_unknown_token_is_not_cached():
+    storage = FakeStorage()
+    cache = SearchCache(storage, poll_interval=3600)
+    storage.fail = True
+    cache.poll()
+    cache.put("q", "results", cache.token)  # token is None: Drive may have changed
+    assert cache.stats()["items"] == 0
+
+
+def test_change_seen_during_the_search_discards_the_results():
+    storage = FakeStorage()
+    cache = SearchCache(storage, poll_interval=3600)
+    cache.poll()
+    token = cache.token
+    storage.token = ("t2",)
+    cache.poll()
+    cache.put("q", "stale", token)
+    assert cache.get("q") is None
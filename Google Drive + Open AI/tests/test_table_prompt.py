@@ -0,0 +1,22 @@
+import pandas as pd
+
+from helpers.table_prompt import table_to_prompt
+
+
+def test_single_row_without_header_is_kept_as_data():
+    # key/value line of a DOCX/PDF table: positional columns, no header row
+    text = table_to_prompt(pd.DataFrame([["Permit No", "23-28424", "Expires 1/31/2025"]]))
+    assert "Permit No" in text
+    assert "23-28424" in text
+    assert "Expires 1/31/2025" in text
+    assert "0 of 3 columns" not in text
+
+
+def test_first_row_is_the_header_of_positional_tables():
+    df = pd.DataFrame([["Permit", "Fee"], ["23-28424", "$150.00"], ["23-28425", "$250.00"]])
+    assert table_to_prompt(df).splitlines()[0] == "Permit,Fee"
+
+
+def test_named_columns_keep_every_row():
+    text = table_to_prompt(pd.DataFrame({"Item": ["Beer"], "Qty": [3]}))
+    assert text.splitlines() == ["Item,Qty", "Beer,3"]